@@ -18,28 +18,54 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 import os
 import sys
-import subprocess
+import time
+import socket
+import traceback
+import concurrent.futures
 
-import dbfconvert
 import converter
+import parallelConvert
+import arrowCopy
+import featureClassJoin
+import schemaInference
+import recordCache
+import geometryTransform
+import optimizeGeoPackage
+import fastBuild
+import outputSession
+import consolidate
+import instrumentation
+import conversionManifest
+import generateMetaFiles
+import tileIndex
+import tileSubset
+import pipeline
+import scheduler
+import archiveInput
+import tileWatcher
+import workQueue
+import verifyConversion
 
 try:
     from osgeo import ogr, osr, gdal
 except:
     sys.exit('ERROR: cannot find GDAL/OGR modules')
 
-import sqlite3
-
-version_num = int(gdal.VersionInfo('VERSION_NUM'))
-print("GDAL Version " + str(version_num))
-
 #import debugpy
 #debugpy.listen(("0.0.0.0", 5678))
 #print("Waiting for client to attach...")
 #debugpy.wait_for_client()
 
-if version_num < 2020300:
-    sys.exit('ERROR: Python bindings of GDAL 2.2.3 or later required due to GeoPackage performance issues.')
+#Importing this module has no side effects, so translateCDB, watchCDB and
+#convertShapeFile can be called from other programs. The command line goes
+#through main.
+def checkGDALVersion():
+    version_num = int(gdal.VersionInfo('VERSION_NUM'))
+    print("GDAL Version " + str(version_num))
+    if version_num < 2020300:
+        print('ERROR: Python bindings of GDAL 2.2.3 or later required due to GeoPackage performance issues.')
+        return False
+    return True
 
 def cleanPath(path):
     cleanPath = path.replace("\\",'/')
@@ -50,27 +76,80 @@ def getOutputLayerName(shpFilename):
     return filenameOnly
 
 def getFilenameComponents(shpFilename):
-    components = {}
-    filenameOnly = os.path.basename(shpFilename)
-    baseName,ext = os.path.splitext(filenameOnly)
-    filenameParts = baseName.split("_")
-    datasetCode = filenameParts[1]
-    components['datasetcode'] = datasetCode
-    componentSelector1 = filenameParts[2]
-    components['selector1'] = componentSelector1
-    componentSelector2 = filenameParts[3]
-    components['selector2'] = componentSelector2
-    lod = filenameParts[4]
-    components['lod'] = lod
-    uref = filenameParts[5]
-    components['uref'] = uref
-    rref = filenameParts[6]
-    components['rref'] = rref
-
-    return components
-
-
-def copyFeaturesFromShapeToGeoPackage(shpFilename, gpkgFilename, flattenFCAttrs, removeConverted):
+    return converter.getFilenameComponents(shpFilename)
+
+#Conversion settings, passed around as a dictionary so they can be handed to
+#worker processes as is.
+#  useArrow            copy features in batches through the GDAL Arrow stream
+#                      interface when the GDAL build supports it (see arrowCopy.py)
+#  missingCNAMPolicy   what to do with features whose CNAM isn't in the feature
+#                      class table (see featureClassJoin.py)
+#  fastBuild           load without a spatial index and with relaxed SQLite
+#                      settings, then build the index and ANALYZE (see fastBuild.py)
+#  vacuum              VACUUM each GeoPackage once it is written
+#  consolidate         None for a GeoPackage per tile, or one of
+#                      consolidate.consolidateModes to merge tiles
+#  atomic              write each GeoPackage to a temporary file first (see
+#                      convertShapeFileAtomically); set by translateCDB for --resume
+#  instrument          collect per-tile stage metrics (see instrumentation.py)
+#  profileDir          where to keep the cProfile output of the slowest
+#  profileCount        profileCount tiles, 0 for no profiling
+#  recordCacheBytes    memory for the feature class tables a worker keeps for
+#                      other tiles, 0 for none (see recordCache.py)
+#  optimize            index the join keys of each GeoPackage once it is
+#                      written, then ANALYZE and VACUUM (see optimizeGeoPackage.py)
+#  optimizeViews       also create the feature/extended attribute views
+#  quantize            snap coordinates to a grid set by the tile's LOD
+#  simplify            simplify lines and polygons to a tolerance set by the
+#                      tile's LOD (see geometryTransform.py)
+defaultOptions = {
+    'useArrow': True,
+    'missingCNAMPolicy': 'null',
+    'fastBuild': False,
+    'vacuum': False,
+    'consolidate': None,
+    'atomic': False,
+    'instrument': False,
+    'profileDir': None,
+    'profileCount': 0,
+    'recordCacheBytes': recordCache.defaultCacheBytes,
+    'optimize': False,
+    'optimizeViews': False,
+    'quantize': False,
+    'simplify': False,
+}
+
+def getOptions(options=None):
+    mergedOptions = dict(defaultOptions)
+    if(options != None):
+        mergedOptions.update(options)
+    return mergedOptions
+
+#Counters for one converted tile, returned by convertShapeFile
+def createTileStats():
+    tileStats = {}
+    tileStats['features'] = 0
+    tileStats['missingCNAM'] = 0
+    tileStats['recordCacheHits'] = 0
+    tileStats['recordCacheMisses'] = 0
+    return tileStats
+
+def writeTransformedFeatures(outLayer, transformPlan, features):
+    if(len(features) == 0):
+        return
+    geometryTransform.transformFeatures(transformPlan, features)
+    for feature in features:
+        outLayer.CreateFeature(feature)
+
+#tileStats, if given, gets the counters for the copy (see createTileStats)
+#session, if given, is the open output session to write to (see outputSession.py);
+#otherwise gpkgFilename is opened and closed here.
+#provenance, if given, is a list of (field name, value) pairs set on every feature
+#outLayerName overrides the layer name from getOutputLayerName
+def copyFeaturesFromShapeToGeoPackage(shpFilename, gpkgFilename, flattenFCAttrs, removeConverted, options=None, tileStats=None, session=None, provenance=None, outLayerName=None):
+    options = getOptions(options)
+    if(tileStats == None):
+        tileStats = createTileStats()
     hasCNAM = False
     dbfFCFilename = None
     dbfEAFilename = None
@@ -82,10 +161,24 @@ def copyFeaturesFromShapeToGeoPackage(shpFilename, gpkgFilename, flattenFCAttrs,
             return None
 
     convertedFields = []
-    fClassRecords = {}
+    fClassTable = recordCache.createFeatureClassTable()
+    fClassSchema = []
     layerComponents = getFilenameComponents(shpFilename)
-    if(dbfFCFilename != None and os.path.isfile(dbfFCFilename)):
-        fClassRecords = dbfconvert.readDBF(dbfFCFilename)
+    if(dbfFCFilename != None and archiveInput.isFile(dbfFCFilename)):
+        with instrumentation.stage('dbfRead') as stageMetrics:
+            #shared with the other tiles this worker converts (see recordCache.py)
+            fClassTable, cached = recordCache.getFeatureClassTable(dbfFCFilename, options['recordCacheBytes'])
+            if(cached):
+                tileStats['recordCacheHits'] += 1
+            else:
+                tileStats['recordCacheMisses'] += 1
+            #read either way, to look it up by its content
+            stageMetrics['files'] += 1
+            stageMetrics['bytesRead'] += archiveInput.getFileSize(dbfFCFilename)
+            stageMetrics['rows'] += len(fClassTable['rows'])
+        if(len(fClassTable['rows']) > 0):
+            #scanned when the table was read (see schemaInference.py)
+            fClassSchema = fClassTable['schema']
 
     dataSource = ogr.Open(shpFilename)
     if(dataSource==None):
@@ -96,93 +189,124 @@ def copyFeaturesFromShapeToGeoPackage(shpFilename, gpkgFilename, flattenFCAttrs,
         print("Unable to read layer from " + shpFilename)
         return 0
     layerDefinition = layer.GetLayerDefn()
+    inputLayerDefinition = layerDefinition
     srs = osr.SpatialReference()
     srs.ImportFromEPSG(4326)
-    outLayerName = getOutputLayerName(shpFilename)
-
-    ogrDriver = ogr.GetDriverByName("GPKG")
-    gpkgFile = ogrDriver.CreateDataSource(gpkgFilename)
+    if(outLayerName == None):
+        outLayerName = getOutputLayerName(shpFilename)
 
-    if(gpkgFile == None):
+    ownSession = (session == None)
+    if(ownSession):
+        session = outputSession.openOutputSession(gpkgFilename, options)
+    if(session == None):
         print("Unable to create " + gpkgFilename)
         return
-    gpkgFile.StartTransaction()
+    gpkgFile = session['dataSource']
     outLayer = gpkgFile.GetLayerByName(outLayerName)
     fieldIdx = 0
     fieldIndexes = {}
     if(outLayer!=None):
+        #appending to an existing layer (e.g. when consolidating tiles); any
+        #fields this tile has that the layer doesn't are added below, and any
+        #that are too narrow for this tile's values are widened
         outputLayerDefinition = outLayer.GetLayerDefn()
-        #track field indexes for existing layers? 
         for i in range(outputLayerDefinition.GetFieldCount()):
             fieldName =  outputLayerDefinition.GetFieldDefn(i).GetName()
             convertedFields.append(fieldName)
             fieldIndexes[fieldName] = fieldIdx
             fieldIdx += 1
     else:
-        outLayer = gpkgFile.CreateLayer(outLayerName,srs,geom_type=layerDefinition.GetGeomType(),options=["FID=id"])
+        outLayer = gpkgFile.CreateLayer(outLayerName,srs,geom_type=layerDefinition.GetGeomType(),options=fastBuild.getLayerCreationOptions(session['deferSpatialIndex']))
+        if(session['deferSpatialIndex']):
+            #the R-tree is built in one pass when the session closes
+            session['deferredIndexes'].append((outLayer.GetName(), outLayer.GetGeometryColumn()))
         
-        # Add fields
-        for i in range(layerDefinition.GetFieldCount()):
-            fieldName =  layerDefinition.GetFieldDefn(i).GetName()
-            if(fieldName=='CNAM'):
-                hasCNAM = True
-            fieldTypeCode = layerDefinition.GetFieldDefn(i).GetType()
-            fieldType = layerDefinition.GetFieldDefn(i).GetFieldTypeName(fieldTypeCode)
-            fieldWidth = layerDefinition.GetFieldDefn(i).GetWidth()
-            GetPrecision = layerDefinition.GetFieldDefn(i).GetPrecision()
-            fieldDef = ogr.FieldDefn(fieldName,fieldTypeCode)
-            outLayer.CreateField(fieldDef)
-            convertedFields.append(fieldName)
-            fieldIndexes[fieldName] = fieldIdx
-            fieldIdx += 1
+    # Add fields
+    for i in range(layerDefinition.GetFieldCount()):
+        fieldName =  layerDefinition.GetFieldDefn(i).GetName()
+        if(fieldName in convertedFields):
+            outputSession.addOrWidenField(outLayer, layerDefinition.GetFieldDefn(i))
+            continue
+        #same type, subtype, width and precision as the shapefile field
+        outLayer.CreateField(layerDefinition.GetFieldDefn(i))
+        convertedFields.append(fieldName)
+        fieldIndexes[fieldName] = fieldIdx
+        fieldIdx += 1
 
-        #Create fields for featureClass Attributes
-        for recordCNAM, row in fClassRecords.items():
-            for fieldName,fieldValue in row.items():
-                if(fieldName in convertedFields):
-                    continue
-                fieldTypeCode = ogr.OFTString
-                if(isinstance(fieldValue,float)):
-                    fieldTypeCode = ogr.OFSTFloat32
-                if(isinstance(fieldValue,int)):
-                    fieldTypeCode = ogr.OFTInteger
-                if(isinstance(fieldValue,bool)):
-                    fieldTypeCode = ogr.OFSTBoolean
-                fieldDef = ogr.FieldDefn(fieldName,fieldTypeCode)
-
-                outLayer.CreateField(fieldDef)
+    #Create fields for featureClass Attributes, typed from the whole table (see schemaInference.py)
+    for column in fClassSchema:
+        fieldName = column['name']
+        if(fieldName in convertedFields):
+            outputSession.addOrWidenField(outLayer, schemaInference.getOGRFieldDefn(column))
+            continue
+        outLayer.CreateField(schemaInference.getOGRFieldDefn(column))
+        convertedFields.append(fieldName)
+        fieldIndexes[fieldName] = fieldIdx
+        fieldIdx += 1
+
+    #Tile provenance columns, the same value for every feature of the tile
+    constantValues = {}
+    if(provenance != None):
+        for fieldName, fieldValue in provenance:
+            if(fieldName not in convertedFields):
+                outLayer.CreateField(ogr.FieldDefn(fieldName,ogr.OFTInteger))
                 convertedFields.append(fieldName)
                 fieldIndexes[fieldName] = fieldIdx
                 fieldIdx += 1
-            #read one record to get the field name/types
-            break
+            constantValues[fieldName] = fieldValue
 
     layerDefinition = outLayer.GetLayerDefn()
+    hasCNAM = (inputLayerDefinition.GetFieldIndex('CNAM') >= 0)
+    if(not hasCNAM):
+        fClassTable = recordCache.createFeatureClassTable()
+    missingCNAMPolicy = options['missingCNAMPolicy']
+    #quantize and simplify the geometries for the tile's LOD (see geometryTransform.py)
+    transformPlan = geometryTransform.createTransformPlan(layerComponents['lod'], options['quantize'], options['simplify'],
+        tileSubset.getTileLatitude(shpFilename))
+    copyStartTime = time.perf_counter()
     layer.ResetReading()
-    featureCount = 0
-    inFeature = layer.GetNextFeature()
-    #copy the features
-    while inFeature is not None:
-        featureCount += 1
-        outFeature = ogr.Feature(layerDefinition)
-        #Copy the geometry and attributes 
-        outFeature.SetFrom(inFeature)
-
-        if(hasCNAM):
-            cnamValue = inFeature.GetField('CNAM')
-            fclassRecord = fClassRecords[cnamValue]
-
-            #flatten attributes from the feature class attributes table
-            if(cnamValue in fClassRecords.keys()):
-                fclassFields = fClassRecords[cnamValue]
-                for field in fclassFields.keys():
-                    outFeature.SetField(fieldIndexes[field],fclassFields[field])
-
-        #write the feature
-        outLayer.CreateFeature(outFeature)
-        outFeature = None
-        inFeature = layer.GetNextFeature()
-    gpkgFile.CommitTransaction()
+    with instrumentation.stage('featureCopy') as stageMetrics:
+        if(options['useArrow'] and arrowCopy.isArrowCopySupported()):
+            #copy the features a batch at a time
+            featureCount, missingCount = arrowCopy.copyFeaturesWithArrow(layer, outLayer, fClassTable, hasCNAM, missingCNAMPolicy, constantValues, transformPlan)
+        else:
+            #work out the feature class values for each CNAM once, up front
+            joinPlan = featureClassJoin.buildJoinPlan(fClassTable, fieldIndexes, layerDefinition, inputLayerDefinition, missingCNAMPolicy, constantValues)
+            featureCount = 0
+            transformFeatures = []
+            inFeature = layer.GetNextFeature()
+            #copy the features
+            while inFeature is not None:
+                #Copy the geometry and attributes, flattening in the feature class attributes
+                outFeature = featureClassJoin.createJoinedFeature(joinPlan, inFeature)
+
+                #write the feature, or hold it until a batch can be transformed
+                if(outFeature != None and transformPlan != None):
+                    transformFeatures.append(outFeature)
+                    featureCount += 1
+                elif(outFeature != None):
+                    outLayer.CreateFeature(outFeature)
+                    featureCount += 1
+                if(len(transformFeatures) >= geometryTransform.featureBatchSize):
+                    writeTransformedFeatures(outLayer, transformPlan, transformFeatures)
+                    transformFeatures = []
+                outFeature = None
+                inFeature = layer.GetNextFeature()
+            writeTransformedFeatures(outLayer, transformPlan, transformFeatures)
+            missingCount = joinPlan['missing']
+        stageMetrics['files'] += 1
+        stageMetrics['features'] += featureCount
+        for ext in ('shp', 'shx', 'dbf'):
+            stageMetrics['bytesRead'] += archiveInput.getFileSize(shpFilename[0:-3] + ext)
+    if(missingCount > 0):
+        print(str(missingCount) + " features of " + shpFilename + " have a CNAM that isn't in " + str(dbfFCFilename))
+    tileStats['features'] += featureCount
+    tileStats['missingCNAM'] += missingCount
+    if(transformPlan != None):
+        transformPlan['copySeconds'] += time.perf_counter() - copyStartTime
+        geometryTransform.addTransformCounters(tileStats, transformPlan)
+    if(ownSession):
+        outputSession.closeOutputSession(session)
     if(removeConverted):
         dataSource = None
         converter.removeShapeFile(shpFilename)
@@ -202,17 +326,25 @@ def getOutputGeoPackageFilePath(shpFilename,cdbInputPath,cdbOutputPath):
     return fullGPKGOutputFilePath
 
 #create the extended attributes table
-def createExtendedAttributesTable(sqliteCon,shpFilename, removeConverted):
+#in the output session (see outputSession.py)
+#dbfTableName overrides the table name; extraColumns is as in outputSession.writeDBFTable
+def createExtendedAttributesTable(session,shpFilename, removeConverted, dbfTableName=None, extraColumns=None):
     #create the table
-    if(sqliteCon == None):
+    if(session == None):
         print("Unable to access database when creating extended attributes table")
         return None
     extendedAttributesDBFFilename = converter.getExtendedAttrFileName(shpFilename)
 
-    dbfTableName = getExtendedAttrTableName(shpFilename)
-    if(os.path.exists(extendedAttributesDBFFilename)):
-        if(os.path.getsize(extendedAttributesDBFFilename)!=0):
-            converter.convertDBF(sqliteCon,extendedAttributesDBFFilename, dbfTableName,'Extended Attributes')
+    if(dbfTableName == None):
+        dbfTableName = getExtendedAttrTableName(shpFilename)
+    if(archiveInput.isFile(extendedAttributesDBFFilename)):
+        if(archiveInput.getFileSize(extendedAttributesDBFFilename)!=0):
+            with instrumentation.stage('extendedAttributes') as stageMetrics:
+                outputSession.writeDBFTable(session,extendedAttributesDBFFilename, dbfTableName,'Extended Attributes',
+                    extraColumns=extraColumns, inferSchema=True)
+                stageMetrics['files'] += 1
+                stageMetrics['rows'] += converter.getDBFRecordCount(extendedAttributesDBFFilename)
+                stageMetrics['bytesRead'] += archiveInput.getFileSize(extendedAttributesDBFFilename)
         if(removeConverted):
             converter.removeShapeFile(extendedAttributesDBFFilename[0:-3] + "shp")
     return None
@@ -223,70 +355,620 @@ def getExtendedAttrTableName(shpFilename):
     dbfTableName = shpBaseFilename[0:-4]
     return dbfTableName
 
-#convert a relationship dbf into a GeoPackage, as a table in an existing file.
-def convertRelationshipAttrShapeFile(sqliteCon,relAttrFileName, cdbInputDir, cdbOutputDir, removeConverted):    
+#convert a relationship dbf into a GeoPackage, as a table in the output session.
+#relAttrTableName overrides the table name; extraColumns is as in outputSession.writeDBFTable
+def convertRelationshipAttrShapeFile(session,relAttrFileName, cdbInputDir, cdbOutputDir, removeConverted, relAttrTableName=None, extraColumns=None):    
 
-    if(os.path.exists(relAttrFileName) == False):
+    if(archiveInput.isFile(relAttrFileName) == False):
         return None
-    if(os.path.getsize(relAttrFileName)==0):
+    if(archiveInput.getFileSize(relAttrFileName)==0):
         if(removeConverted):
             converter.removeShapeFile(relAttrFileName[0:-3] + "shp")
         return None
     
-    relAttrTableName = converter.getFeatureAttrTableName(relAttrFileName)
+    if(relAttrTableName == None):
+        relAttrTableName = converter.getFeatureAttrTableName(relAttrFileName)
 
-    converter.convertDBF(sqliteCon,relAttrFileName,
-        relAttrTableName, 'Relationship Attributes', False)
+    with instrumentation.stage('relationships') as stageMetrics:
+        outputSession.writeDBFTable(session,relAttrFileName,
+            relAttrTableName, 'Relationship Attributes', False, extraColumns=extraColumns)
+        stageMetrics['files'] += 1
+        stageMetrics['rows'] += converter.getDBFRecordCount(relAttrFileName)
+        stageMetrics['bytesRead'] += archiveInput.getFileSize(relAttrFileName)
 
     if(removeConverted):
         converter.removeShapeFile(relAttrFileName[0:-3] + "shp")
     return None
 
+#Remove the input files of a converted tile: the shapefile itself and the feature
+#class, extended attributes and relationship files that went into its GeoPackage.
+def removeConvertedTileFiles(shpFilename):
+    with instrumentation.stage('removal') as stageMetrics:
+        stageMetrics['files'] += 1
+        converter.removeShapeFile(shpFilename)
+        if(converter.getSelector2(shpFilename)=="T011"):
+            return
+        #even though the FC and EA files are dbfs, some tools make an empty shapefile
+        #so we'll try to delete those too.
+        fcAttrName = converter.getFeatureClassAttrFileName(shpFilename)
+        if(fcAttrName != None):
+            converter.removeShapeFile(fcAttrName[0:-3] + "shp")
+        extendedAttrName = converter.getExtendedAttrFileName(shpFilename)
+        if(extendedAttrName != None and archiveInput.isFile(extendedAttrName)):
+            converter.removeShapeFile(extendedAttrName[0:-3] + "shp")
+
+#optimizeStats is what closeOutputSession returns, None when not optimizing
+def addOptimizeStats(tileStats, optimizeStats):
+    if(optimizeStats != None):
+        optimizeGeoPackage.addOptimizeCounters(tileStats, optimizeStats)
+
 #convert a shapefile into a GeoPackage file using GDAL.
-def convertShapeFile(shpFilename, cdbInputDir, cdbOutputDir, removeConverted):    
+#outputGeoPackageFile overrides the path from getOutputGeoPackageFilePath
+#The GeoPackage is opened once, and everything for the tile is written to it in
+#one transaction. The input files are only removed once that is committed.
+#Returns the counters for the tile (see createTileStats)
+def convertShapeFile(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options=None, outputGeoPackageFile=None):    
+    options = getOptions(options)
+    tileStats = createTileStats()
+    if(outputGeoPackageFile == None):
+        outputGeoPackageFile = getOutputGeoPackageFilePath(shpFilename,cdbInputDir, cdbOutputDir)
     
     #see if it's a relationship file
     selector2 = converter.getSelector2(shpFilename)
     if(selector2=="T011"):
-        outputGeoPackageFile = getOutputGeoPackageFilePath(shpFilename,cdbInputDir, cdbOutputDir)
-        sqliteCon = sqlite3.connect(outputGeoPackageFile)
-        relFileName = shpFilename
-        if(relFileName):
-            convertRelationshipAttrShapeFile(sqliteCon,relFileName[0:-3] + "dbf", cdbInputDir, cdbOutputDir, removeConverted)
-        sqliteCon.close()
-        return None
+        session = outputSession.openOutputSession(outputGeoPackageFile, options)
+        if(session == None):
+            return tileStats
+        try:
+            convertRelationshipAttrShapeFile(session,shpFilename[0:-3] + "dbf", cdbInputDir, cdbOutputDir, False)
+        except:
+            outputSession.closeOutputSession(session, False)
+            raise
+        addOptimizeStats(tileStats, outputSession.closeOutputSession(session))
+        if(removeConverted):
+            removeConvertedTileFiles(shpFilename)
+        return tileStats
     
     #make sure it's a real feature file if it's not a relationship file.
     fcAttrName = converter.getFeatureClassAttrFileName(shpFilename)    
     if(fcAttrName==None):
-        return None
+        return tileStats
 
     #Create the features table, adding the feature class columns
-    outputGeoPackageFile = getOutputGeoPackageFilePath(shpFilename,cdbInputDir, cdbOutputDir)
     # Make whatever directories we need for the output file.
     parentDirectory = os.path.dirname(cleanPath(outputGeoPackageFile))
     if not os.path.exists(parentDirectory):
         os.makedirs(parentDirectory)
 
-    featureTableName = converter.getFeatureAttrTableName(shpFilename)
-    copyFeaturesFromShapeToGeoPackage(shpFilename,outputGeoPackageFile, True, removeConverted)
-    sqliteCon = sqlite3.connect(outputGeoPackageFile)
-    createExtendedAttributesTable(sqliteCon,shpFilename, removeConverted)    
-    sqliteCon.close()
+    session = outputSession.openOutputSession(outputGeoPackageFile, options)
+    if(session == None):
+        return tileStats
+    try:
+        copyFeaturesFromShapeToGeoPackage(shpFilename,outputGeoPackageFile, True, False, options, tileStats, session)
+        createExtendedAttributesTable(session,shpFilename, False)
+    except:
+        outputSession.closeOutputSession(session, False)
+        raise
+    addOptimizeStats(tileStats, outputSession.closeOutputSession(session))
+    if(removeConverted):
+        removeConvertedTileFiles(shpFilename)
 
         
-    return
+    return tileStats
+
+class OutputLostError(Exception):
+    pass
+
+#Asked just before a finished output is moved into place, and before each tile,
+#whether this process may still write the output; runQueueWorker sets it to
+#check the group's lease. None allows every output.
+outputGuard = {'check': None}
+
+def checkOutputGuard(outputPath):
+    check = outputGuard['check']
+    if(check != None and not check()):
+        raise OutputLostError("The lease on " + outputPath + " was lost to another worker")
+
+#The temporary file an output is written to before it is moved into place. The
+#name is this process's own, so workers on other hosts converting the same
+#output (e.g. after a lease ran out) never write to the same file.
+def getPartialOutputPath(outputPath):
+    return outputPath[0:-5] + "." + socket.gethostname() + "-" + str(os.getpid()) + ".partial.gpkg"
+
+#Move a finished partial output into place, unless the output has been lost
+#to another worker in the meantime
+def replaceOutput(partialPath, outputPath):
+    try:
+        checkOutputGuard(outputPath)
+    except OutputLostError:
+        converter.removeFileIfExists(partialPath)
+        raise
+    os.replace(partialPath, outputPath)
+
+#convert into a temporary file next to the output and only move it into place
+#once it is complete, so an interrupted run never leaves a half-written GeoPackage
+#that a rerun would then append to. The inputs are only removed once it is.
+def convertShapeFileAtomically(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options=None):
+    outputGeoPackageFile = getOutputGeoPackageFilePath(shpFilename,cdbInputDir, cdbOutputDir)
+    partialGeoPackageFile = getPartialOutputPath(outputGeoPackageFile)
+    converter.removeFileIfExists(partialGeoPackageFile)
+    try:
+        tileStats = convertShapeFile(shpFilename, cdbInputDir, cdbOutputDir, False, options, partialGeoPackageFile)
+    except:
+        converter.removeFileIfExists(partialGeoPackageFile)
+        raise
+    if(os.path.exists(partialGeoPackageFile)):
+        replaceOutput(partialGeoPackageFile, outputGeoPackageFile)
+    if(removeConverted):
+        removeConvertedTileFiles(shpFilename)
+    return tileStats
+
+class ConsolidationError(Exception):
+    pass
+
+#The consolidated GeoPackage being written by this process. Tiles of the same
+#output arrive one after another in a group, and they all go through one output
+#session that stays open until finishConsolidatedGroup.
+consolidatedOutput = {'session': None, 'outputPath': None, 'failed': False, 'converted': []}
+
+#The consolidated output path for a tile; shapefiles that don't have CDB
+#tile names still get a GeoPackage of their own.
+def getConsolidatedOutputPath(shpFilename, cdbInputDir, cdbOutputDir, consolidateMode):
+    if(not consolidate.isCDBTileName(shpFilename)):
+        return getOutputGeoPackageFilePath(shpFilename, cdbInputDir, cdbOutputDir)
+    return consolidate.getConsolidatedGeoPackageFilePath(shpFilename, cdbOutputDir, consolidateMode)
+
+#Append a tile to its consolidated GeoPackage (see consolidate.py). The output is
+#rebuilt from scratch in a partial file by the first tile of its group, and only
+#committed and moved into place by finishConsolidatedGroup.
+def convertShapeFileConsolidated(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options=None):
+    options = getOptions(options)
+    if(not consolidate.isCDBTileName(shpFilename)):
+        return convertShapeFile(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options)
+    consolidateMode = options['consolidate']
+    outputGeoPackageFile = consolidate.getConsolidatedGeoPackageFilePath(shpFilename, cdbOutputDir, consolidateMode)
+    if(consolidatedOutput['failed']):
+        raise ConsolidationError("Not converted because an earlier tile of " + outputGeoPackageFile + " failed")
+    session = consolidatedOutput['session']
+    if(session != None and consolidatedOutput['outputPath'] != outputGeoPackageFile):
+        finishConsolidatedGroup(cdbInputDir, cdbOutputDir, removeConverted, options)
+        session = None
+    if(session == None):
+        parentDirectory = os.path.dirname(cleanPath(outputGeoPackageFile))
+        if not os.path.exists(parentDirectory):
+            os.makedirs(parentDirectory)
+        partialGeoPackageFile = getPartialOutputPath(outputGeoPackageFile)
+        converter.removeFileIfExists(partialGeoPackageFile)
+        session = outputSession.openOutputSession(partialGeoPackageFile, options)
+        if(session == None):
+            consolidatedOutput['failed'] = True
+            raise ConsolidationError("Unable to create " + partialGeoPackageFile)
+        consolidatedOutput['session'] = session
+        consolidatedOutput['outputPath'] = outputGeoPackageFile
+
+    tileStats = createTileStats()
+    provenance = consolidate.getProvenance(shpFilename)
+    try:
+        if(converter.getSelector2(shpFilename)=="T011"):
+            convertRelationshipAttrShapeFile(session, shpFilename[0:-3] + "dbf", cdbInputDir, cdbOutputDir, False,
+                consolidate.getConsolidatedName(shpFilename, consolidateMode), provenance)
+        elif(converter.getFeatureClassAttrFileName(shpFilename) != None):
+            copyFeaturesFromShapeToGeoPackage(shpFilename, session['filename'], True, False, options, tileStats, session,
+                provenance, consolidate.getConsolidatedName(shpFilename, consolidateMode))
+            extendedAttrSelector = converter.getSelector2(converter.getExtendedAttrFileName(shpFilename))
+            createExtendedAttributesTable(session, shpFilename, False,
+                consolidate.getConsolidatedName(shpFilename, consolidateMode, extendedAttrSelector), provenance)
+    except:
+        #the session can't be trusted after a partial write, so the whole output is dropped
+        consolidatedOutput['failed'] = True
+        raise
+    consolidatedOutput['converted'].append(shpFilename)
+    return tileStats
+
+#Commit and close the consolidated GeoPackage once its group is done, building
+#each layer's spatial index in a single pass, and move it into place. If any
+#tile of the group failed the output is rolled back and removed, and this
+#raises so the group's tiles are all reported as failed.
+def finishConsolidatedGroup(cdbInputDir, cdbOutputDir, removeConverted, options=None):
+    session = consolidatedOutput['session']
+    outputPath = consolidatedOutput['outputPath']
+    failed = consolidatedOutput['failed']
+    converted = consolidatedOutput['converted']
+    consolidatedOutput['session'] = None
+    consolidatedOutput['outputPath'] = None
+    consolidatedOutput['failed'] = False
+    consolidatedOutput['converted'] = []
+    if(failed):
+        if(session != None):
+            outputSession.closeOutputSession(session, False)
+            converter.removeFileIfExists(session['filename'])
+        raise ConsolidationError("The consolidated output was not written because one of its tiles failed")
+    if(session == None):
+        return
+    try:
+        outputSession.closeOutputSession(session)
+    except:
+        converter.removeFileIfExists(session['filename'])
+        raise
+    replaceOutput(session['filename'], outputPath)
+    if(removeConverted):
+        for shpFilename in converted:
+            removeConvertedTileFiles(shpFilename)
+
+def convertTileWithOptions(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options):
+    if(options['consolidate'] != None):
+        return convertShapeFileConsolidated(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options)
+    if(options['atomic']):
+        return convertShapeFileAtomically(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options)
+    return convertShapeFile(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options)
+
+#The worker function translateCDB runs for each tile: the conversion the options
+#ask for, with the tile's stage metrics and profile added to its counters when
+#those are turned on.
+def convertTile(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options=None):
+    options = getOptions(options)
+    if(options['instrument']):
+        instrumentation.startTile(shpFilename)
+    try:
+        profileFilename = None
+        if(options['profileCount'] > 0):
+            tileStats, profileFilename = instrumentation.runProfiled(options['profileDir'], options['profileCount'], shpFilename,
+                convertTileWithOptions, shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options)
+        else:
+            tileStats = convertTileWithOptions(shpFilename, cdbInputDir, cdbOutputDir, removeConverted, options)
+    finally:
+        metrics = instrumentation.finishTile()
+    if(tileStats == None):
+        tileStats = createTileStats()
+    if(metrics != None):
+        tileStats['metrics'] = metrics
+    if(profileFilename != None):
+        tileStats['profile'] = profileFilename
+    return tileStats
+
+#How the tiles map to output GeoPackages: returns the output path function, the
+#function that completes an output once all of its tiles are in it (or None),
+#and the tile index order that keeps the tiles of each output together, with
+#the largest outputs first if largestFirst is set (see scheduler.py).
+def getOutputPlan(cdbInputDir, cdbOutputDir, options, largestFirst=False):
+    getOutputPath = lambda shapeFile: getOutputGeoPackageFilePath(shapeFile, cdbInputDir, cdbOutputDir)
+    finishFunction = None
+    tileOrder = "id"
+    groupColumns = ['path']
+    if(options['consolidate'] != None):
+        consolidateMode = options['consolidate']
+        getOutputPath = lambda shapeFile: getConsolidatedOutputPath(shapeFile, cdbInputDir, cdbOutputDir, consolidateMode)
+        finishFunction = finishConsolidatedGroup
+        tileOrder = consolidate.getTileOrder(consolidateMode)
+        groupColumns = consolidate.getGroupColumns(consolidateMode)
+    if(largestFirst):
+        tileOrder = scheduler.getLargestFirstOrder(groupColumns, tileOrder)
+    return getOutputPath, finishFunction, tileOrder
+
+#metricsFilename, if given, gets the stage metrics of the run as JSON lines, or
+#as a Prometheus textfile if it ends in .prom, updated every metricsInterval
+#seconds. profileCount keeps cProfile output for that many of the slowest tiles.
+#tileFilter (see tileSubset.py) converts only part of the CDB.
+#pipelineOptions, if given, runs the conversion through pipeline.py instead of
+#worker processes; its keys are the keyword arguments of runPipelinedConversion.
+#With more than one job, the output GeoPackages that read the most are converted
+#first, and memoryBudget (bytes) holds back work while the estimated memory of
+#the running tiles would go over it (see scheduler.py).
+#cdbInputDir can also be a zip or tar archive of the CDB, which is read in place
+#(see archiveInput.py); the outputs are laid out as if it had been extracted to
+#cdbInputDir.
+def translateCDB(cdbInputDir, cdbOutputDir, removeConverted, jobs=1, resume=False, useContentHash=False, scanThreads=0, options=None,
+        metricsFilename=None, metricsInterval=instrumentation.defaultMetricsInterval, profileCount=0, tileFilter=None, pipelineOptions=None,
+        memoryBudget=None):
+    cdbInputDir = archiveInput.getInputRoot(cdbInputDir)
+    if(removeConverted and archiveInput.isVirtualPath(cdbInputDir)):
+        print("Error: files can't be removed from an archive")
+        return None
+    options = getOptions(options)
+    options['atomic'] = resume
+    runMetrics = None
+    if(metricsFilename != None or profileCount > 0):
+        runMetrics = instrumentation.createRunMetrics(metricsFilename, metricsInterval, profileCount)
+        options['instrument'] = True
+        options['profileCount'] = profileCount
+        options['profileDir'] = os.path.join(cdbOutputDir, 'tile_profiles')
+    scanMetrics = instrumentation.createStageMetrics()
+    with instrumentation.stage('scan', {'scan': scanMetrics}):
+        indexFilename = generateMetaFiles.generateMetaFiles(cdbInputDir, scanThreads=scanThreads, tileFilter=tileFilter)
+    indexCon = tileIndex.openTileIndex(indexFilename)
+    scanMetrics['files'] = tileIndex.getTileCount(indexCon)
+    if(runMetrics != None):
+        instrumentation.addRunStage(runMetrics, 'scan', scanMetrics)
 
-def translateCDB(cdbInputDir, cdbOutputDir, removeConverted):
-    sys.path.append(cdbInputDir)
-    import generateMetaFiles
-    shapeFiles = generateMetaFiles.generateMetaFiles(cDBRoot)
+    getOutputPath, finishFunction, tileOrder = getOutputPlan(cdbInputDir, cdbOutputDir, options, jobs > 1 and pipelineOptions == None)
+    bbox = None
+    if(tileFilter != None):
+        bbox = tileFilter['bbox']
+    shapeFiles = tileIndex.iterateTilePaths(indexCon, tileOrder, bbox)
+    resultCallbacks = []
+    if(resume):
+        manifestCon = conversionManifest.openManifest(cdbOutputDir)
+        selectionStats = conversionManifest.createSelectionStats()
+        shapeFiles = conversionManifest.selectTilesToConvert(manifestCon, shapeFiles, getOutputPath, useContentHash, selectionStats)
+        resultCallbacks.append(lambda results: conversionManifest.recordResults(manifestCon, results))
+    if(runMetrics != None):
+        resultCallbacks.append(lambda results: instrumentation.recordResults(runMetrics, results))
 
-    for shapefile in shapeFiles:
-        convertShapeFile(shapefile,cdbInputDir,cdbOutputDir, removeConverted)
+    def resultCallback(results):
+        for callback in resultCallbacks:
+            callback(results)
+
+    # each output GeoPackage is owned by exactly one worker
+    groups = parallelConvert.groupShapeFilesByOutput(shapeFiles, getOutputPath)
+    if(pipelineOptions != None):
+        removeFunction = None
+        if(removeConverted):
+            removeFunction = removeConvertedTileFiles
+        summary = pipeline.runPipelinedConversion(groups, convertTile, cdbInputDir, cdbOutputDir, options, getOutputPath,
+            resultCallback=resultCallback, finishFunction=finishFunction, removeFunction=removeFunction,
+            stageExistingOutputs=(options['consolidate'] == None), **pipelineOptions)
+    else:
+        getGroupMemory = None
+        if(memoryBudget != None):
+            getGroupMemory = lambda shapeFiles: scheduler.getGroupMemory(indexCon, shapeFiles)
+        summary = parallelConvert.runConversionJobs(groups, convertTile,
+            (cdbInputDir, cdbOutputDir, removeConverted, options), jobs, resultCallback=resultCallback, finishFunction=finishFunction,
+            memoryBudget=memoryBudget, getGroupMemory=getGroupMemory)
+    parallelConvert.printConversionSummary(summary)
+    geometryTransform.printTransformSummary(summary['counters'])
+    optimizeGeoPackage.printOptimizeSummary(summary['counters'])
+    pipeline.printPipelineSummary(summary)
+    if(runMetrics != None):
+        if('pipeline' in summary):
+            pipelineStats = summary['pipeline']
+            prefetchMetrics = instrumentation.createStageMetrics()
+            prefetchMetrics['wall'] = pipelineStats['prefetchSeconds']
+            prefetchMetrics['files'] = pipelineStats['prefetchFiles']
+            prefetchMetrics['bytesRead'] = pipelineStats['prefetchBytes']
+            instrumentation.addRunStage(runMetrics, 'prefetch', prefetchMetrics)
+            flushMetrics = instrumentation.createStageMetrics()
+            flushMetrics['wall'] = pipelineStats['flushSeconds']
+            flushMetrics['files'] = pipelineStats['flushFiles']
+            flushMetrics['bytesWritten'] = pipelineStats['flushBytes']
+            instrumentation.addRunStage(runMetrics, 'flush', flushMetrics)
+        instrumentation.finishRunMetrics(runMetrics)
+    if(resume):
+        conversionManifest.printSelectionSummary(selectionStats)
+        manifestCon.close()
+    indexCon.close()
+    return summary
+
+#Scan the CDB and write its output groups into a work queue (see workQueue.py)
+#for runQueueWorker processes on any number of hosts to convert. The queue file
+#defaults to one in cdbOutputDir, which must be on storage they can all reach.
+#Returns the filename of the queue.
+def queueCDB(cdbInputDir, cdbOutputDir, removeConverted=False, scanThreads=0, options=None, tileFilter=None, queueFilename=None):
+    cdbInputDir = archiveInput.getInputRoot(cdbInputDir)
+    if(removeConverted and archiveInput.isVirtualPath(cdbInputDir)):
+        print("Error: files can't be removed from an archive")
+        return None
+    options = getOptions(options)
+    #a reclaimed group must never add to what a crashed worker left behind
+    options['atomic'] = True
+    if(queueFilename == None):
+        queueFilename = workQueue.getQueuePath(cdbOutputDir)
+    if not os.path.exists(os.path.dirname(os.path.abspath(queueFilename))):
+        os.makedirs(os.path.dirname(os.path.abspath(queueFilename)))
+    indexFilename = generateMetaFiles.generateMetaFiles(cdbInputDir, scanThreads=scanThreads, tileFilter=tileFilter)
+    indexCon = tileIndex.openTileIndex(indexFilename)
+    getOutputPath, finishFunction, tileOrder = getOutputPlan(cdbInputDir, cdbOutputDir, options, True)
+    bbox = None
+    if(tileFilter != None):
+        bbox = tileFilter['bbox']
+    groups = parallelConvert.groupShapeFilesByOutput(tileIndex.iterateTilePaths(indexCon, tileOrder, bbox), getOutputPath)
+    settings = {'cdbInputDir': cdbInputDir, 'cdbOutputDir': cdbOutputDir, 'removeConverted': removeConverted, 'options': options}
+    groupCount = workQueue.createWorkQueue(queueFilename, settings, groups)
+    indexCon.close()
+    print("Queued " + str(groupCount) + " output GeoPackages in " + queueFilename)
+    return queueFilename
+
+#Check the GeoPackages of an earlier conversion against the CDB on jobs worker
+#processes (see verifyConversion.py). The options must be the ones the CDB was
+#converted with. Mismatches are written to reportFilename, by default
+#verify_report.jsonl in cdbOutputDir. Returns the summary.
+def verifyCDB(cdbInputDir, cdbOutputDir, jobs=1, scanThreads=0, options=None, tileFilter=None, reportFilename=None):
+    cdbInputDir = archiveInput.getInputRoot(cdbInputDir)
+    options = getOptions(options)
+    if(reportFilename == None):
+        reportFilename = os.path.join(cdbOutputDir, verifyConversion.reportFileName)
+    indexFilename = generateMetaFiles.generateMetaFiles(cdbInputDir, scanThreads=scanThreads, tileFilter=tileFilter)
+    indexCon = tileIndex.openTileIndex(indexFilename)
+    getOutputPath, finishFunction, tileOrder = getOutputPlan(cdbInputDir, cdbOutputDir, options, True)
+    bbox = None
+    if(tileFilter != None):
+        bbox = tileFilter['bbox']
+    #nothing is written, so the tiles of a consolidated GeoPackage needn't share a worker
+    groups = ((shapeFile, [shapeFile]) for shapeFile in tileIndex.iterateTilePaths(indexCon, tileOrder, bbox))
+    with open(reportFilename, 'w') as reportFile:
+        summary = parallelConvert.runConversionJobs(groups, verifyConversion.verifyTile, (cdbInputDir, cdbOutputDir, options), jobs,
+            resultCallback=lambda results: verifyConversion.writeReport(reportFile, results))
+    indexCon.close()
+    verifyConversion.printVerifySummary(summary, reportFilename)
+    return summary
+
+#Convert groups from a work queue until none are left. Groups leased by other
+#workers are waited for, so that if one of them dies or hangs its groups are taken over
+#when the lease runs out. On an interrupt the groups not yet converted are
+#handed back. Returns the summary of what this worker converted.
+def runQueueWorker(queueFilename, batchSize=workQueue.defaultBatchSize, leaseSeconds=workQueue.defaultLeaseSeconds,
+        maxAttempts=workQueue.defaultMaxAttempts, stallSeconds=workQueue.defaultStallSeconds):
+    workerName = workQueue.getWorkerName()
+    queueCon = workQueue.openWorkQueue(queueFilename)
+    settings = workQueue.getSettings(queueCon)
+    cdbInputDir = settings['cdbInputDir']
+    cdbOutputDir = settings['cdbOutputDir']
+    options = getOptions(settings['options'])
+    workerArgs = (cdbInputDir, cdbOutputDir, settings['removeConverted'], options)
+    finishFunction = None
+    if(options['consolidate'] != None):
+        finishFunction = finishConsolidatedGroup
+    summary = parallelConvert.createSummary()
+    leaseKeeper = workQueue.startLeaseKeeper(queueFilename, workerName, leaseSeconds, stallSeconds)
+
+    #the leases are only renewed while tiles keep getting done, and a group
+    #whose lease has been lost isn't written any further
+    def convertTileWithProgress(shpFilename, *args):
+        try:
+            checkOutputGuard(shpFilename)
+            return convertTile(shpFilename, *args)
+        finally:
+            workQueue.recordProgress(leaseKeeper)
+
+    claimed = []
+    try:
+        while True:
+            claimed = workQueue.claimWork(queueCon, workerName, batchSize, leaseSeconds, maxAttempts)
+            if(len(claimed) == 0):
+                if('leased' not in workQueue.getQueueStatus(queueCon)):
+                    break
+                time.sleep(min(leaseSeconds / 4.0, 30))
+                continue
+            with leaseKeeper['lock']:
+                leaseKeeper['workIds'].update(workId for workId, outputPath, shapeFiles in claimed)
+            workQueue.recordProgress(leaseKeeper)
+            while(len(claimed) > 0):
+                workId, outputPath, shapeFiles = claimed[0]
+                outputGuard['check'] = lambda: workQueue.holdsLease(queueCon, workerName, workId)
+                results = parallelConvert.convertGroup(shapeFiles, convertTileWithProgress, workerArgs, finishFunction)
+                workQueue.completeWork(queueCon, workerName, workId, results)
+                with leaseKeeper['lock']:
+                    leaseKeeper['workIds'].discard(workId)
+                claimed.pop(0)
+                parallelConvert.addResultsToSummary(summary, results)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        outputGuard['check'] = None
+        workQueue.releaseWork(queueCon, workerName, [workId for workId, outputPath, shapeFiles in claimed])
+        workQueue.stopLeaseKeeper(leaseKeeper)
+        queueCon.close()
+    summary['elapsed'] = time.time() - summary['startTime']
+    return summary
+
+#Run jobs queue workers on this host, each in a process of its own
+def runQueueWorkers(queueFilename, jobs=1, batchSize=workQueue.defaultBatchSize, leaseSeconds=workQueue.defaultLeaseSeconds,
+        stallSeconds=workQueue.defaultStallSeconds):
+    if(jobs <= 1):
+        return runQueueWorker(queueFilename, batchSize, leaseSeconds, stallSeconds=stallSeconds)
+    summary = parallelConvert.createSummary()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(runQueueWorker, queueFilename, batchSize, leaseSeconds, stallSeconds=stallSeconds) for i in range(jobs)]
+        for future in futures:
+            parallelConvert.addSummary(summary, future.result())
+    summary['elapsed'] = time.time() - summary['startTime']
+    return summary
+
+#Called once on each worker process of watchCDB so GDAL is loaded before the
+#first tile arrives
+def warmWorker():
+    return int(gdal.VersionInfo('VERSION_NUM'))
+
+def createWatchStats():
+    watchStats = {}
+    watchStats['tiles'] = 0
+    watchStats['totalLatency'] = 0.0
+    watchStats['maxLatency'] = 0.0
+    return watchStats
+
+#Convert tiles as they appear or change under cdbInputDir (see tileWatcher.py),
+#until stopEvent (a threading.Event) is set or the process is interrupted.
+#The jobs worker processes are started once and kept for the whole watch. The
+#conversion manifest in cdbOutputDir records what was converted, so tiles that
+#are unchanged since an earlier run or watch aren't converted again, and each
+#GeoPackage is only moved into place once it is complete.
+#rescanInterval is as in tileWatcher.createWatchIndex.
+#resultCallback, if given, is called with the results of each tile.
+#Returns the summary of the tiles converted.
+def watchCDB(cdbInputDir, cdbOutputDir, jobs=1, options=None, tileFilter=None, pollInterval=tileWatcher.defaultPollInterval,
+        rescanInterval=tileWatcher.defaultRescanInterval, stopEvent=None, resultCallback=None):
+    options = getOptions(options)
+    options['atomic'] = True
+    if(options['consolidate'] != None):
+        print("Error: consolidated GeoPackages can't be updated a tile at a time")
+        return None
+    jobs = max(1, jobs)
+    manifestCon = conversionManifest.openManifest(cdbOutputDir)
+    getOutputPath = lambda shapeFile: getOutputGeoPackageFilePath(shapeFile, cdbInputDir, cdbOutputDir)
+    watchIndex = tileWatcher.createWatchIndex(cdbInputDir, tileFilter, rescanInterval)
+    summary = parallelConvert.createSummary()
+    watchStats = createWatchStats()
+    summary['watch'] = watchStats
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    for i in range(jobs):
+        executor.submit(warmWorker)
+    #future -> shapefile
+    inFlight = {}
+    #tiles that changed again while they were being converted
+    changedInFlight = set()
+    print("Watching " + cdbInputDir)
+    try:
+        while(stopEvent == None or not stopEvent.is_set()):
+            pollStart = time.time()
+            readyShapeFiles = tileWatcher.pollChanges(watchIndex)
+            runningShapeFiles = set(inFlight.values())
+            for shapeFile in readyShapeFiles:
+                if(shapeFile in runningShapeFiles):
+                    changedInFlight.add(shapeFile)
+            readyShapeFiles = [shapeFile for shapeFile in readyShapeFiles if shapeFile not in runningShapeFiles]
+            #an idle poll doesn't touch the manifest
+            if(len(readyShapeFiles) > 0):
+                for shapeFile in conversionManifest.selectTilesToConvert(manifestCon, readyShapeFiles, getOutputPath):
+                    future = executor.submit(parallelConvert.convertGroup, [shapeFile], convertTile, (cdbInputDir, cdbOutputDir, False, options))
+                    inFlight[future] = shapeFile
+            #wait for conversions until the next poll is due
+            timeout = max(0, pollInterval - (time.time() - pollStart))
+            if(len(inFlight) == 0):
+                if(stopEvent != None):
+                    stopEvent.wait(timeout)
+                else:
+                    time.sleep(timeout)
+                continue
+            done, notDone = concurrent.futures.wait(inFlight.keys(), timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                shapeFile = inFlight.pop(future)
+                try:
+                    results = future.result()
+                except Exception:
+                    results = [{'shapefile': shapeFile, 'status': 'failed', 'features': 0, 'error': traceback.format_exc(), 'seconds': 0}]
+                changeTime = tileWatcher.getChangeTime(watchIndex, shapeFile)
+                for result in results:
+                    if(result['status'] == 'ok' and changeTime != None):
+                        latency = time.time() - changeTime
+                        watchStats['tiles'] += 1
+                        watchStats['totalLatency'] += latency
+                        watchStats['maxLatency'] = max(watchStats['maxLatency'], latency)
+                        print("Converted " + shapeFile + " {:.2f} s after it changed".format(latency))
+                parallelConvert.addResultsToSummary(summary, results)
+                conversionManifest.recordResults(manifestCon, results)
+                if(resultCallback != None):
+                    resultCallback(results)
+                if(shapeFile in changedInFlight):
+                    #picked up again on the next poll
+                    changedInFlight.discard(shapeFile)
+                    watchIndex['candidates'][shapeFile] = watchIndex['signatures'].pop(shapeFile, None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=True)
+        manifestCon.close()
+    summary['elapsed'] = time.time() - summary['startTime']
+    return summary
+
+def printWatchSummary(summary):
+    watchStats = summary.get('watch')
+    if(watchStats == None or watchStats['tiles'] == 0):
+        return
+    print("  Average Seconds from Change to GeoPackage: {:.2f}".format(watchStats['totalLatency'] / watchStats['tiles']))
+    print("  Maximum Seconds from Change to GeoPackage: {:.2f}".format(watchStats['maxLatency']))
 
 def printUsage():
-    print("Usage: Convert.py [--REMOVE_SHP] <Input Root CDB Directory> <Output Directory for GeoPackage Files>")
+    print("Usage: Convert.py [--REMOVE_SHP] [--jobs N] [--resume [--hash]] [--scan-threads N] [--missing-cnam null|skip|error] [--no-arrow] [--record-cache MB] [--quantize] [--simplify] [--fast-build] [--vacuum] [--optimize [--optimize-views]] [--consolidate dataset|geocell] [--metrics FILE [--metrics-interval SEC]] [--profile N] [--bbox W,S,E,N] [--datasets LIST] [--lod-range MIN:MAX] [--selectors LIST] [--pipeline [--prefetch-threads N] [--prefetch-depth N] [--staging-dir DIR]] [--memory-budget MB] [--watch [--poll-interval SEC] [--rescan-interval SEC]] [--coordinator] [--verify [--report FILE]] <Input Root CDB Directory> <Output Directory for GeoPackage Files>")
+    print("       Convert.py --worker QUEUE [--jobs N] [--batch N] [--lease SEC] [--stall SEC]")
     print("Note: Only the GeoPackage files will be placed in the output directory.")
     print("      The input and output directories can be the same. If so, it is highly")
     print("      recommended that you make a copy of the CDB first, especially")
@@ -294,27 +976,277 @@ def printUsage():
     print("      the associated files such as shx, dbf, etc.")
     print("")
     print("      Only the GeoPackage files will be placed in the output directory, no other files will be copied.")
+    print("")
+    print("      The input can also be a .zip, .tar, .tar.gz or .tgz archive of the CDB. It is read")
+    print("      in place through GDAL's /vsizip/ and /vsitar/ file systems without being extracted,")
+    print("      and the tile index is written next to it.")
+    print("")
+    print("      --jobs N converts on N worker processes. Each output GeoPackage is written")
+    print("      by a single worker, and a failed file is reported without stopping the run.")
+    print("      The GeoPackages with the largest input files are started first.")
+    print("      --memory-budget MB holds back new work while the memory the running tiles are")
+    print("      estimated to need, from the sizes of their files, would go over MB.")
+    print("")
+    print("      --resume keeps a manifest (" + conversionManifest.manifestFileName + ") in the output directory")
+    print("      and only converts tiles that are new, changed or unfinished since the last run.")
+    print("      --hash also records a content hash, so tiles that were only touched are skipped.")
+    print("")
+    print("      --scan-threads N reads the shapefile headers on N threads while scanning the CDB.")
+    print("")
+    print("      --missing-cnam sets what happens to features whose CNAM isn't in the feature")
+    print("      class attributes: null (the default) leaves the attributes empty, skip drops")
+    print("      the feature, error fails the tile. A tile without feature class attributes")
+    print("      is copied as is.")
+    print("      --no-arrow copies features one at a time even if GDAL supports Arrow streams.")
+    print("      --record-cache MB is the memory each worker keeps feature class tables in for")
+    print("      reuse (default " + str(recordCache.defaultCacheBytes // (1024 * 1024)) + "), 0 for none.")
+    print("")
+    print("      --quantize snaps coordinates to a grid of 1/" + str(geometryTransform.quantizationSubdivisions) + " of the sample spacing of the tile's LOD")
+    print("      and --simplify simplifies lines and polygons to " + str(geometryTransform.simplifyTolerance) + " sample spacings, keeping their")
+    print("      topology, so coarse LODs get smaller GeoPackages. Both need shapely 2. The size")
+    print("      reduction and throughput are reported for each LOD.")
+    print("")
+    print("      --fast-build writes the GeoPackages without a spatial index and with relaxed")
+    print("      SQLite durability settings, then builds each spatial index in one pass and")
+    print("      runs ANALYZE. --vacuum also compacts each GeoPackage once it is written.")
+    print("      --optimize indexes the CNAM, PRIM_ID and SEC_ID join keys of each GeoPackage once")
+    print("      it is written, then runs ANALYZE and VACUUM, and reports lookup latency before and")
+    print("      after. --optimize-views also adds a view joining each feature to its extended")
+    print("      attributes. optimizeGeoPackage.py does the same over an existing output tree.")
+    print("")
+    print("      --consolidate dataset writes one GeoPackage per dataset code, selector and LOD")
+    print("      instead of one per tile; --consolidate geocell does the same per geocell. The")
+    print("      layers and tables get UREF and RREF columns recording the tile each row came")
+    print("      from. Consolidated GeoPackages are rebuilt on every run, so --resume can't be")
+    print("      used with it.")
+    print("")
+    print("      --metrics FILE records wall and CPU time, features, rows and bytes for each stage")
+    print("      of every tile, as JSON lines, or as a Prometheus textfile if FILE ends in .prom.")
+    print("      The totals are rewritten every --metrics-interval seconds (default " + str(instrumentation.defaultMetricsInterval) + ").")
+    print("      --profile N runs each tile under cProfile and keeps the profiles of the N slowest")
+    print("      tiles in tile_profiles in the output directory.")
+    print("")
+    print("      --bbox, --datasets, --lod-range and --selectors convert only part of the CDB:")
+    print("        --bbox W,S,E,N       tiles intersecting the area, in degrees (e.g. -118,32,-117,33)")
+    print("        --datasets LIST      comma separated dataset names or codes (e.g. 100_GSFeature,D101)")
+    print("        --lod-range MIN:MAX  LODs from MIN to MAX, e.g. 0:3 or LC02:L01; either end may be left out")
+    print("        --selectors LIST     comma separated selectors (e.g. S001_T001,T005)")
+    print("      Directories that can't hold a wanted tile are skipped without being read.")
+    print("      With --consolidate, the consolidated GeoPackages only hold the wanted tiles.")
+    print("")
+    print("      --pipeline is for CDBs on network file systems. --prefetch-threads threads (default " + str(pipeline.defaultPrefetchThreads) + ")")
+    print("      copy the next --prefetch-depth tiles (default " + str(pipeline.defaultPrefetchDepth) + ") into a local staging directory")
+    print("      (--staging-dir, default the system temporary directory) while the current tile is")
+    print("      converted there, and a writer thread copies the finished GeoPackages to the output")
+    print("      directory. The time each stage spent waiting is shown in the summary.")
+    print("      It runs in a single process, so it can't be used with --jobs.")
+    print("")
+    print("      --watch keeps running and converts tiles as they are added or changed, on --jobs")
+    print("      worker processes that are started once. The CDB is polled every --poll-interval")
+    print("      seconds (default " + str(tileWatcher.defaultPollInterval) + "); only directories whose modification time changed are")
+    print("      listed again. A conversion manifest in the output directory keeps unchanged tiles")
+    print("      from being converted again, and each GeoPackage appears once it is complete.")
+    print("      Files rewritten in place don't change their directory, so every --rescan-interval")
+    print("      seconds (default " + str(tileWatcher.defaultRescanInterval) + ", 0 for never) the signatures of all the tiles are checked.")
+    print("")
+    print("      --coordinator scans the CDB and writes the work into a queue (" + workQueue.queueFileName + ") in the")
+    print("      output directory instead of converting it. --worker QUEUE then converts from the")
+    print("      queue, and can be run on any number of hosts that see the same input, output and")
+    print("      queue paths; --jobs N runs N workers. Workers claim --batch output GeoPackages at")
+    print("      a time (default " + str(workQueue.defaultBatchSize) + ") on a lease of --lease seconds (default " + str(workQueue.defaultLeaseSeconds) + ") that they renew while")
+    print("      working, and the work of a worker that stops renewing is taken over by the others.")
+    print("      A worker that finishes no tile for --stall seconds (default " + str(workQueue.defaultStallSeconds) + ") stops renewing,")
+    print("      so the groups of a hung worker are taken over too.")
+    print("")
+    print("      --verify checks an earlier conversion instead of converting, on --jobs worker")
+    print("      processes. For each tile the feature count, extent and a hash of the geometries")
+    print("      and flattened attributes are compared with the GeoPackage layer, and the row count")
+    print("      and a hash of the rows of the extended attribute and relationship tables with")
+    print("      their DBFs. Give it the same --consolidate, --missing-cnam, --quantize and")
+    print("      --simplify options as the conversion. Mismatches are written as JSON lines to")
+    print("      --report FILE (default " + verifyConversion.reportFileName + " in the output directory). Hashes need")
+    print("      GDAL 3.8 or later with pyarrow and NumPy; without them only counts and extents are checked.")
 
 
-if(len(sys.argv) < 3):
-    printUsage()
-    exit()
-removeConverted = False
-nextArg = 1
-if(sys.argv[1]=="--REMOVE_SHP"):
-    if(len(sys.argv) != 4):
+#Run the command line in argv (without the program name)
+def main(argv):
+    removeConverted = False
+    jobs = 1
+    resume = False
+    useContentHash = False
+    scanThreads = 0
+    options = {}
+    metricsFilename = None
+    metricsInterval = instrumentation.defaultMetricsInterval
+    profileCount = 0
+    bbox = None
+    datasets = None
+    lodRange = None
+    selectors = None
+    usePipeline = False
+    pipelineOptions = {}
+    memoryBudget = None
+    coordinator = False
+    workerQueue = None
+    leaseSeconds = workQueue.defaultLeaseSeconds
+    stallSeconds = workQueue.defaultStallSeconds
+    batchSize = workQueue.defaultBatchSize
+    watch = False
+    pollInterval = tileWatcher.defaultPollInterval
+    rescanInterval = tileWatcher.defaultRescanInterval
+    verify = False
+    reportFilename = None
+    args = list(argv)
+    while(len(args) > 0 and args[0].startswith("--")):
+        option = args.pop(0)
+        if(option == "--REMOVE_SHP"):
+            removeConverted = True
+        elif(option == "--jobs" and len(args) > 0 and args[0].isdigit()):
+            jobs = int(args.pop(0))
+        elif(option == "--resume"):
+            resume = True
+        elif(option == "--hash"):
+            useContentHash = True
+        elif(option == "--scan-threads" and len(args) > 0 and args[0].isdigit()):
+            scanThreads = int(args.pop(0))
+        elif(option == "--missing-cnam" and len(args) > 0 and args[0] in featureClassJoin.missingCNAMPolicies):
+            options['missingCNAMPolicy'] = args.pop(0)
+        elif(option == "--no-arrow"):
+            options['useArrow'] = False
+        elif(option == "--fast-build"):
+            options['fastBuild'] = True
+        elif(option == "--vacuum"):
+            options['vacuum'] = True
+        elif(option == "--optimize"):
+            options['optimize'] = True
+        elif(option == "--optimize-views"):
+            options['optimize'] = True
+            options['optimizeViews'] = True
+        elif(option == "--quantize"):
+            options['quantize'] = True
+        elif(option == "--simplify"):
+            options['simplify'] = True
+        elif(option == "--record-cache" and len(args) > 0 and args[0].isdigit()):
+            options['recordCacheBytes'] = int(args.pop(0)) * 1024 * 1024
+        elif(option == "--consolidate" and len(args) > 0 and args[0] in consolidate.consolidateModes):
+            options['consolidate'] = args.pop(0)
+        elif(option == "--metrics" and len(args) > 0):
+            metricsFilename = args.pop(0)
+        elif(option == "--metrics-interval" and len(args) > 0 and args[0].isdigit()):
+            metricsInterval = int(args.pop(0))
+        elif(option == "--profile" and len(args) > 0 and args[0].isdigit()):
+            profileCount = int(args.pop(0))
+        elif(option == "--bbox" and len(args) > 0 and tileSubset.parseBBox(args[0]) != None):
+            bbox = tileSubset.parseBBox(args.pop(0))
+        elif(option == "--datasets" and len(args) > 0 and None not in [tileSubset.getDatasetCode(dataset) for dataset in tileSubset.parseList(args[0])]):
+            datasets = tileSubset.parseList(args.pop(0))
+        elif(option == "--lod-range" and len(args) > 0 and tileSubset.parseLODRange(args[0]) != None):
+            lodRange = tileSubset.parseLODRange(args.pop(0))
+        elif(option == "--selectors" and len(args) > 0):
+            selectors = tileSubset.parseList(args.pop(0))
+        elif(option == "--memory-budget" and len(args) > 0 and args[0].isdigit()):
+            memoryBudget = int(args.pop(0)) * 1024 * 1024
+        elif(option == "--coordinator"):
+            coordinator = True
+        elif(option == "--worker" and len(args) > 0):
+            workerQueue = args.pop(0)
+        elif(option == "--lease" and len(args) > 0 and args[0].isdigit() and int(args[0]) > 0):
+            leaseSeconds = int(args.pop(0))
+        elif(option == "--stall" and len(args) > 0 and args[0].isdigit() and int(args[0]) > 0):
+            stallSeconds = int(args.pop(0))
+        elif(option == "--batch" and len(args) > 0 and args[0].isdigit() and int(args[0]) > 0):
+            batchSize = int(args.pop(0))
+        elif(option == "--watch"):
+            watch = True
+        elif(option == "--verify"):
+            verify = True
+        elif(option == "--report" and len(args) > 0):
+            reportFilename = args.pop(0)
+        elif(option == "--poll-interval" and len(args) > 0 and tileSubset.parseFloat(args[0]) != None):
+            pollInterval = tileSubset.parseFloat(args.pop(0))
+        elif(option == "--rescan-interval" and len(args) > 0 and tileSubset.parseFloat(args[0]) != None):
+            rescanInterval = tileSubset.parseFloat(args.pop(0))
+        elif(option == "--pipeline"):
+            usePipeline = True
+        elif(option == "--prefetch-threads" and len(args) > 0 and args[0].isdigit() and int(args[0]) > 0):
+            pipelineOptions['prefetchThreads'] = int(args.pop(0))
+        elif(option == "--prefetch-depth" and len(args) > 0 and args[0].isdigit() and int(args[0]) > 0):
+            pipelineOptions['prefetchDepth'] = int(args.pop(0))
+        elif(option == "--staging-dir" and len(args) > 0):
+            pipelineOptions['stagingDir'] = args.pop(0)
+        else:
+            printUsage()
+            return
+    if(workerQueue != None):
+        if(len(args) != 0 or not os.path.isfile(workerQueue)):
+            printUsage()
+            return
+        if(not checkGDALVersion()):
+            return
+        summary = runQueueWorkers(workerQueue, jobs, batchSize, leaseSeconds, stallSeconds)
+        parallelConvert.printConversionSummary(summary)
+        geometryTransform.printTransformSummary(summary['counters'])
+        optimizeGeoPackage.printOptimizeSummary(summary['counters'])
+        queueCon = workQueue.openWorkQueue(workerQueue)
+        workQueue.printQueueStatus(workQueue.getQueueStatus(queueCon))
+        queueCon.close()
+        return
+    if(len(args) != 2):
         printUsage()
-        exit()
+        return
+    cDBRoot = args[0]
+    outputDirectory = args[1]
+
+    if(removeConverted and archiveInput.isArchive(cDBRoot)):
+        print("Error: --REMOVE_SHP can't be used with an archive")
+        return
+    if(removeConverted and (cDBRoot != outputDirectory)):
+        print("Error: To use --REMOVE_SHP, the input and output directories must be the same")
+        return
+    if(resume and options.get('consolidate') != None):
+        print("Error: --resume can't be used with --consolidate")
+        return
+    if((options.get('quantize') or options.get('simplify')) and not geometryTransform.isAvailable()):
+        print("Error: --quantize and --simplify need shapely 2 and NumPy")
+        return
+    if(not usePipeline):
+        pipelineOptions = None
+    elif(jobs > 1):
+        print("Error: --pipeline can't be used with --jobs")
+        return
 
-    removeConverted = True
-    nextArg = nextArg + 1
-cDBRoot = sys.argv[nextArg]
-nextArg = nextArg + 1
-outputDirectory = sys.argv[nextArg]
+    if(watch and (removeConverted or usePipeline or options.get('consolidate') != None or archiveInput.isArchive(cDBRoot))):
+        print("Error: --watch can't be used with --REMOVE_SHP, --pipeline, --consolidate or an archive")
+        return
+    if(verify and (removeConverted or resume or usePipeline or watch or coordinator)):
+        print("Error: --verify can't be used with --REMOVE_SHP, --resume, --pipeline, --watch or --coordinator")
+        return
+    if(verify and not os.path.isdir(outputDirectory)):
+        print("Error: " + outputDirectory + " doesn't exist")
+        return
+    if(not checkGDALVersion()):
+        return
 
-if(removeConverted and (cDBRoot != outputDirectory)):
-    print("Error: To use --REMOVE_SHP, the input and output directories must be the same")
-    exit()
+    tileFilter = tileSubset.createTileFilter(bbox, datasets, lodRange, selectors)
+    if(verify):
+        verifyCDB(cDBRoot, outputDirectory, jobs, scanThreads, options, tileFilter, reportFilename)
+        return
+    if(coordinator):
+        queueCDB(cDBRoot, outputDirectory, removeConverted, scanThreads, options, tileFilter)
+        return
+    if(watch):
+        summary = watchCDB(cDBRoot, outputDirectory, jobs, options, tileFilter, pollInterval, rescanInterval)
+        if(summary != None):
+            parallelConvert.printConversionSummary(summary)
+            geometryTransform.printTransformSummary(summary['counters'])
+            optimizeGeoPackage.printOptimizeSummary(summary['counters'])
+            printWatchSummary(summary)
+        return
+    translateCDB(cDBRoot,outputDirectory,removeConverted,jobs,resume,useContentHash,scanThreads,options,
+        metricsFilename,metricsInterval,profileCount,tileFilter,pipelineOptions,memoryBudget)
 
-translateCDB(cDBRoot,outputDirectory,removeConverted)
 
+# The guard keeps worker processes (which may re-import this module) from
+# starting a conversion of their own.
+if __name__ == "__main__":
+    main(sys.argv[1:])
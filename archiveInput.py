@@ -0,0 +1,211 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Reading a CDB straight out of a zip or tar archive through GDAL's virtual file
+# systems, with nothing extracted to disk. translateCDB turns an archive input
+# into its /vsizip/ or /vsitar/ root, and from there every tile path is a
+# virtual path: OGR opens the shapefiles itself, and the helpers here stand in
+# for os.walk, os.stat and open for everything read with Python (the scan, the
+# shapefile headers and the DBFs). The helpers work on ordinary paths too, so
+# callers don't need to care which kind they have.
+#
+# The archive directory is read once: the zip central directory, or for tar
+# the member headers. GDAL keeps it cached, so a stat of a member afterwards
+# doesn't touch the archive.
+#
+# DBFs decoded by dbfarray are memory mapped. One in an archive is read through
+# the virtual file system into a single buffer that dbfarray decodes in place,
+# with no temporary copy written to disk and read back.
+
+import os
+import sys
+import shutil
+import tempfile
+
+import dbfarray
+
+try:
+    from osgeo import gdal
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+archiveFileSystems = (('.zip', '/vsizip/'), ('.tar', '/vsitar/'), ('.tar.gz', '/vsitar/'), ('.tgz', '/vsitar/'))
+
+def getArchiveFileSystem(path):
+    for extension, fileSystem in archiveFileSystems:
+        if(path.lower().endswith(extension)):
+            return fileSystem
+    return None
+
+def isArchive(path):
+    return getArchiveFileSystem(path) != None and os.path.isfile(path)
+
+def isVirtualPath(path):
+    return path.startswith('/vsi')
+
+# The root to convert from: the virtual file system root of an archive, or the
+# directory itself
+def getInputRoot(path):
+    if(not isArchive(path)):
+        return path
+    return getArchiveFileSystem(path) + os.path.abspath(path)
+
+# The archive file of a virtual root, or None for an ordinary directory
+def getArchivePath(inputRoot):
+    for extension, fileSystem in archiveFileSystems:
+        if(inputRoot.startswith(fileSystem)):
+            return inputRoot[len(fileSystem):]
+    return None
+
+# (size, modification time) of a file, or None if there isn't one
+def getFileStat(path):
+    if(not isVirtualPath(path)):
+        try:
+            fileStat = os.stat(path)
+        except OSError:
+            return None
+        return fileStat.st_size, fileStat.st_mtime
+    fileStat = gdal.VSIStatL(path)
+    if(fileStat == None or fileStat.IsDirectory()):
+        return None
+    return fileStat.size, fileStat.mtime
+
+def isFile(path):
+    if(not isVirtualPath(path)):
+        return os.path.isfile(path)
+    return getFileStat(path) != None
+
+def getFileSize(path):
+    if(path == None):
+        return 0
+    fileStat = getFileStat(path)
+    if(fileStat == None):
+        return 0
+    return fileStat[0]
+
+# A read only file object over a GDAL virtual file
+class VirtualFile(object):
+    def __init__(self, path):
+        self.path = path
+        self.handle = gdal.VSIFOpenL(path, 'rb')
+        if(self.handle == None):
+            raise IOError("Unable to open " + path)
+
+    def read(self, size=-1):
+        if(size < 0):
+            position = gdal.VSIFTellL(self.handle)
+            gdal.VSIFSeekL(self.handle, 0, 2)
+            size = gdal.VSIFTellL(self.handle) - position
+            gdal.VSIFSeekL(self.handle, position, 0)
+        if(size == 0):
+            return b''
+        data = gdal.VSIFReadL(1, size, self.handle)
+        if(data == None):
+            return b''
+        return data
+
+    def seek(self, offset, whence=0):
+        gdal.VSIFSeekL(self.handle, offset, whence)
+        return gdal.VSIFTellL(self.handle)
+
+    def tell(self):
+        return gdal.VSIFTellL(self.handle)
+
+    def close(self):
+        if(self.handle != None):
+            gdal.VSIFCloseL(self.handle)
+            self.handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+# Open a file for binary reading, virtual or not
+def openFile(path, mode='rb'):
+    if(not isVirtualPath(path)):
+        return open(path, mode)
+    return VirtualFile(path)
+
+# The whole of a file, virtual or not
+def readFileBytes(path):
+    with openFile(path) as f:
+        return f.read()
+
+# Copy a file, virtual or not, to an ordinary path. Returns the bytes copied.
+def copyFile(sourceFile, destinationFile):
+    parentDirectory = os.path.dirname(destinationFile)
+    if not os.path.exists(parentDirectory):
+        os.makedirs(parentDirectory)
+    with openFile(sourceFile) as source:
+        with open(destinationFile, 'wb') as destination:
+            shutil.copyfileobj(source, destination, 1024 * 1024)
+    return os.path.getsize(destinationFile)
+
+# A local copy of a DBF (and its memo file) for readers that need a real file.
+# The caller removes the returned directory.
+def getLocalDBFCopy(dbfFilename):
+    localDirectory = tempfile.mkdtemp(prefix='cdbdbf')
+    localFilename = os.path.join(localDirectory, os.path.basename(dbfFilename))
+    copyFile(dbfFilename, localFilename)
+    if(isFile(dbfFilename[0:-3] + 'dbt')):
+        copyFile(dbfFilename[0:-3] + 'dbt', localFilename[0:-3] + 'dbt')
+    return localDirectory, localFilename
+
+# Open a DBF, virtual or not, with dbfarray.openDBFArray
+def openDBFArray(dbfFilename):
+    if(not isVirtualPath(dbfFilename)):
+        return dbfarray.openDBFArray(dbfFilename)
+    return dbfarray.openDBFArray(readFileBytes(dbfFilename))
+
+def addDirectory(directories, directory):
+    if(directory in directories):
+        return
+    parent, name = os.path.split(directory)
+    addDirectory(directories, parent)
+    directories[directory] = ([], [])
+    directories[parent][0].append(name)
+
+# os.walk over an ordinary directory or an archive root. For an archive, the
+# whole listing comes from its directory in one call; dirs can be pruned in
+# place the same way.
+def walk(inputRoot):
+    if(not isVirtualPath(inputRoot)):
+        for root, dirs, files in os.walk(inputRoot):
+            yield root, dirs, files
+        return
+    # relative directory -> (subdirectory names, file names)
+    directories = {'': ([], [])}
+    for name in gdal.ReadDirRecursive(inputRoot) or []:
+        if(name.endswith('/')):
+            addDirectory(directories, name.rstrip('/'))
+            continue
+        # members can be listed without their directories
+        parent, baseName = os.path.split(name)
+        addDirectory(directories, parent)
+        directories[parent][1].append(baseName)
+    pending = ['']
+    while(len(pending) > 0):
+        directory = pending.pop()
+        dirs, files = directories[directory]
+        root = inputRoot if directory == '' else inputRoot + '/' + directory
+        yield root, dirs, files
+        for subdirectory in reversed(dirs):
+            pending.append(subdirectory if directory == '' else directory + '/' + subdirectory)
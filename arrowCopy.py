@@ -0,0 +1,219 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Batched feature copy through the GDAL Arrow stream interface (GDAL 3.8+ with
+# pyarrow). Instead of one ogr.Feature, SetFrom, SetField per flattened
+# attribute and CreateFeature per row, the shapefile is read a batch at a time
+# as Arrow arrays, the feature class columns are joined on CNAM as whole arrays,
+# and each batch goes into the GeoPackage with a single WritePyArrow call.
+
+import sys
+
+import featureClassJoin
+import geometryTransform
+import recordCache
+
+try:
+    from osgeo import ogr, gdal
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+# features read from the shapefile per batch
+arrowBatchSize = 65536
+
+def isArrowCopySupported():
+    if(pyarrow == None):
+        return False
+    if(int(gdal.VersionInfo('VERSION_NUM')) < 3080000):
+        return False
+    return hasattr(ogr.Layer, 'GetArrowStreamAsPyArrow') and hasattr(ogr.Layer, 'WritePyArrow')
+
+# The index of the WKB geometry column of a GDAL Arrow stream schema, or -1
+def getGeometryColumnIndex(schema):
+    for fieldNum, field in enumerate(schema):
+        if(field.metadata != None and field.metadata.get(b'ARROW:extension:name') == b'ogc.wkb'):
+            return fieldNum
+    return -1
+
+# The Arrow type matching an output field, or None to let pyarrow pick one
+def getArrowType(fieldDefn):
+    fieldType = fieldDefn.GetType()
+    if(fieldType == ogr.OFTInteger and fieldDefn.GetSubType() == ogr.OFSTBoolean):
+        return pyarrow.bool_()
+    if(fieldType == ogr.OFTInteger):
+        return pyarrow.int32()
+    if(fieldType == ogr.OFTInteger64):
+        return pyarrow.int64()
+    if(fieldType == ogr.OFTReal):
+        return pyarrow.float64()
+    if(fieldType == ogr.OFTString):
+        return pyarrow.string()
+    return None
+
+# The feature class table as Arrow arrays: the CNAM keys, and for each field
+# to be flattened, its values in the same order as the keys.
+# fieldDefns, if given, are the output fields the arrays are typed for.
+def getFeatureClassArrays(fClassTable, fieldNames, cnamType, fieldDefns=None):
+    cnamValues = list(fClassTable['rows'].keys())
+    fieldArrays = []
+    for fieldNum, fieldName in enumerate(fieldNames):
+        values = recordCache.getColumnValues(fClassTable, fieldName)
+        arrowType = None
+        if(fieldDefns != None):
+            arrowType = getArrowType(fieldDefns[fieldNum])
+        try:
+            if(arrowType == pyarrow.bool_()):
+                fieldArray = pyarrow.array([None if value == None else bool(value) for value in values], type=arrowType)
+            elif(arrowType != None):
+                fieldType = fieldDefns[fieldNum].GetType()
+                fieldArray = pyarrow.array([featureClassJoin.getTypedValue(value, fieldType) for value in values], type=arrowType)
+            else:
+                fieldArray = pyarrow.array(values)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            # mixed types in one column; let the output field type sort it out
+            fieldArray = pyarrow.array([None if value == None else str(value) for value in values], type=pyarrow.string())
+        if(fieldArray.type == pyarrow.null()):
+            fieldArray = fieldArray.cast(pyarrow.string())
+        fieldArrays.append(fieldArray)
+    return pyarrow.array(cnamValues, type=cnamType), fieldArrays
+
+# A column of a dbfarray.iterateColumnBatches batch as an Arrow array of the
+# values the batched INSERTs write for it (see dbfarray.getColumnValues)
+def getDBFColumnArray(column, field, encoding):
+    if(isinstance(column, numpy.ma.MaskedArray)):
+        return pyarrow.array(column.data, mask=numpy.ma.getmaskarray(column))
+    if(column.dtype.kind == 'f'):
+        return pyarrow.array(column, mask=numpy.isnan(column))
+    if(column.dtype.kind != 'S'):
+        return pyarrow.array(column)
+    if(field.type == 'L'):
+        trueValues = numpy.isin(column, (b'T', b't', b'Y', b'y'))
+        falseValues = numpy.isin(column, (b'F', b'f', b'N', b'n'))
+        return pyarrow.array(trueValues, mask=~(trueValues | falseValues))
+    if(field.type == 'D'):
+        values = numpy.char.strip(column)
+        isDate = (numpy.char.str_len(values) == 8) & numpy.char.isdigit(values)
+        text = pyarrow.array(numpy.char.decode(numpy.where(isDate, values, b'00000000'), 'ascii'))
+        dates = pyarrow.compute.binary_join_element_wise(pyarrow.compute.utf8_slice_codeunits(text, 0, 4),
+            pyarrow.compute.utf8_slice_codeunits(text, 4, 6), pyarrow.compute.utf8_slice_codeunits(text, 6, 8), '-')
+        return pyarrow.compute.if_else(pyarrow.array(isDate), dates, pyarrow.scalar(None, pyarrow.string()))
+    return pyarrow.array(numpy.char.decode(numpy.char.rstrip(column, b' \x00'), encoding, 'replace'))
+
+# Copy every feature of layer into outLayer, flattening the fields of
+# fClassTable (see recordCache.py) that outLayer has into each feature.
+# missingCNAMPolicy is as in featureClassJoin. constantValues (field name -> value)
+# are added as columns with the same value for every feature.
+# transformPlan, if given, is applied to the geometries of each batch (see geometryTransform.py).
+# Returns the number of features copied and the number with a missing CNAM.
+def copyFeaturesWithArrow(layer, outLayer, fClassTable, hasCNAM, missingCNAMPolicy='null', constantValues=None, transformPlan=None):
+    # the output assigns its own FIDs
+    stream = layer.GetArrowStreamAsPyArrow(["INCLUDE_FID=NO", "MAX_FEATURES_IN_BATCH=" + str(arrowBatchSize)])
+    inputSchema = stream.schema
+
+    outputLayerDefinition = outLayer.GetLayerDefn()
+    outputFieldNames = set()
+    for i in range(outputLayerDefinition.GetFieldCount()):
+        outputFieldNames.add(outputLayerDefinition.GetFieldDefn(i).GetName())
+
+    # as in featureClassJoin, there is only a join (and so only missing CNAMs)
+    # when the feature class table has rows and the shapefile has a CNAM field
+    cnamIndex = -1
+    if(hasCNAM and len(fClassTable['rows']) > 0):
+        cnamIndex = inputSchema.get_field_index('CNAM')
+
+    joinFieldNames = []
+    if(cnamIndex >= 0):
+        for fieldName in fClassTable['columns']:
+            if(fieldName in outputFieldNames and fieldName != 'CNAM' and fieldName not in joinFieldNames):
+                joinFieldNames.append(fieldName)
+
+    # feature class values replace shapefile fields of the same name where
+    # the CNAM is found, the rest are added as new columns
+    outputSchema = inputSchema
+    replacedIndexes = []
+    if(cnamIndex >= 0):
+        joinFieldDefns = [outputLayerDefinition.GetFieldDefn(outputLayerDefinition.GetFieldIndex(fieldName)) for fieldName in joinFieldNames]
+        cnamKeys, fieldArrays = getFeatureClassArrays(fClassTable, joinFieldNames, inputSchema.field(cnamIndex).type, joinFieldDefns)
+        for fieldName, fieldArray in zip(joinFieldNames, fieldArrays):
+            inputIndex = inputSchema.get_field_index(fieldName)
+            replacedIndexes.append(inputIndex)
+            if(inputIndex >= 0):
+                outputSchema = outputSchema.set(inputIndex, pyarrow.field(fieldName, fieldArray.type))
+            else:
+                outputSchema = outputSchema.append(pyarrow.field(fieldName, fieldArray.type))
+
+    constantNames = []
+    if(constantValues != None):
+        for fieldName in constantValues.keys():
+            if(inputSchema.get_field_index(fieldName) < 0 and fieldName not in joinFieldNames):
+                constantNames.append(fieldName)
+                outputSchema = outputSchema.append(pyarrow.field(fieldName, pyarrow.int64()))
+
+    geometryIndex = -1
+    if(transformPlan != None):
+        geometryIndex = getGeometryColumnIndex(inputSchema)
+
+    featureCount = 0
+    missingCount = 0
+    for batch in stream:
+        columns = list(batch.columns)
+        if(geometryIndex >= 0):
+            wkbValues = geometryTransform.transformWKB(transformPlan, columns[geometryIndex].to_numpy(zero_copy_only=False))
+            columns[geometryIndex] = pyarrow.array(wkbValues, type=columns[geometryIndex].type)
+        keepRows = None
+        if(cnamIndex >= 0):
+            # row number in the feature class table for each feature, null when
+            # the feature's CNAM isn't in the table
+            rowIndexes = pyarrow.compute.index_in(batch.column(cnamIndex), value_set=cnamKeys)
+            batchMissing = rowIndexes.null_count
+            missingCount += batchMissing
+            if(batchMissing > 0 and missingCNAMPolicy == 'error'):
+                raise featureClassJoin.MissingCNAMError(str(batchMissing) + " features have a CNAM that is not in the feature class attributes")
+            found = pyarrow.compute.is_valid(rowIndexes)
+            if(batchMissing > 0 and missingCNAMPolicy == 'skip'):
+                keepRows = found
+            for inputIndex, fieldArray in zip(replacedIndexes, fieldArrays):
+                joinedValues = fieldArray.take(rowIndexes)
+                if(inputIndex < 0):
+                    columns.append(joinedValues)
+                    continue
+                inputValues = columns[inputIndex].cast(fieldArray.type)
+                columns[inputIndex] = pyarrow.compute.if_else(found, joinedValues, inputValues)
+        for fieldName in constantNames:
+            columns.append(pyarrow.array([constantValues[fieldName]] * batch.num_rows, type=pyarrow.int64()))
+        if(len(columns) > batch.num_columns or geometryIndex >= 0 or len(replacedIndexes) > 0):
+            batch = pyarrow.RecordBatch.from_arrays(columns, schema=outputSchema)
+        if(keepRows != None):
+            batch = batch.filter(keepRows)
+        if(batch.num_rows == 0):
+            continue
+        featureCount += batch.num_rows
+        outLayer.WritePyArrow(batch)
+    return featureCount, missingCount
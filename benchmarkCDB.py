@@ -0,0 +1,208 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# End-to-end benchmark on a synthetic CDB (see syntheticCDB.py). Times each
+# stage of a conversion on its own and then translateCDB as a whole:
+#
+#   scan            generateMetaFiles building the tile index
+#   copyFeatures    every feature shapefile into its own GeoPackage
+#   translateCDB    the full conversion
+#   verify          Convert.verifyCDB checking the output of translateCDB
+#
+# and reports files/sec, features/sec, rows/sec and MB/sec for each. The results
+# are written to a JSON file, and --compare prints the speedup of each stage
+# over an earlier results file.
+#
+# Usage: benchmarkCDB.py [--tiles N] [--features N] [--width N] [--jobs N]
+#                        [--output results.json] [--compare previous.json]
+#                        [--cdb existing CDB] [work directory]
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+
+try:
+    from osgeo import gdal
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+import Convert
+import converter
+import tileIndex
+import syntheticCDB
+import generateMetaFiles
+
+featureSelectors = ('T001', 'T003', 'T005', 'T007', 'T009')
+
+def getFileSize(filename):
+    if(filename == None or not os.path.exists(filename)):
+        return 0
+    return os.path.getsize(filename)
+
+def createStageResult(seconds, files=0, features=0, rows=0, bytes=0):
+    result = {}
+    result['seconds'] = seconds
+    result['files'] = files
+    result['features'] = features
+    result['rows'] = rows
+    result['bytes'] = bytes
+    for key in ('files', 'features', 'rows'):
+        result[key + 'PerSec'] = result[key] / seconds if seconds > 0 else 0
+    result['MBPerSec'] = bytes / 1e6 / seconds if seconds > 0 else 0
+    return result
+
+def listTiles(indexFilename):
+    indexCon = tileIndex.openTileIndex(indexFilename)
+    tiles = [(row['path'], row['selector2']) for row in tileIndex.iterateTiles(indexCon, "id")]
+    indexCon.close()
+    return tiles
+
+def runScanStage(cdbRoot, workDir):
+    indexFilename = os.path.join(workDir, 'benchmark_index.sqlite')
+    startTime = time.time()
+    generateMetaFiles.generateMetaFiles(cdbRoot, indexFilename=indexFilename)
+    seconds = time.time() - startTime
+    tiles = listTiles(indexFilename)
+    scannedBytes = sum(getFileSize(path) for path, selector2 in tiles)
+    return createStageResult(seconds, files=len(tiles), bytes=scannedBytes), tiles
+
+def runCopyFeaturesStage(tiles, workDir, options):
+    outputDir = os.path.join(workDir, 'benchmark_features')
+    os.makedirs(outputDir)
+    shapeFiles = [path for path, selector2 in tiles if selector2 in featureSelectors]
+    tileStats = Convert.createTileStats()
+    inputBytes = 0
+    for shapeFile in shapeFiles:
+        inputBytes += getFileSize(shapeFile) + getFileSize(shapeFile[0:-3] + 'dbf') + getFileSize(converter.getFeatureClassAttrFileName(shapeFile))
+    startTime = time.time()
+    for shapeFile in shapeFiles:
+        gpkgFilename = os.path.join(outputDir, os.path.basename(shapeFile)[0:-4] + '.gpkg')
+        Convert.copyFeaturesFromShapeToGeoPackage(shapeFile, gpkgFilename, True, False, options, tileStats)
+    seconds = time.time() - startTime
+    shutil.rmtree(outputDir)
+    return createStageResult(seconds, files=len(shapeFiles), features=tileStats['features'], bytes=inputBytes)
+
+def runTranslateStage(cdbRoot, workDir, jobs, options, inputBytes):
+    outputDir = os.path.join(workDir, 'benchmark_output')
+    startTime = time.time()
+    summary = Convert.translateCDB(cdbRoot, outputDir, False, jobs, options=options)
+    seconds = time.time() - startTime
+    return createStageResult(seconds, files=summary['files'], features=summary['features'], bytes=inputBytes)
+
+# Verifies the output runTranslateStage left behind, then removes it
+def runVerifyStage(cdbRoot, workDir, jobs, options, inputBytes):
+    outputDir = os.path.join(workDir, 'benchmark_output')
+    startTime = time.time()
+    summary = Convert.verifyCDB(cdbRoot, outputDir, jobs, options=options)
+    seconds = time.time() - startTime
+    shutil.rmtree(outputDir, ignore_errors=True)
+    return createStageResult(seconds, files=summary['files'], features=summary['features'],
+        rows=summary['counters'].get('rows', 0), bytes=inputBytes)
+
+def getCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except Exception:
+        return None
+
+def printResults(stages):
+    print("{:14s} {:>9s} {:>10s} {:>13s} {:>11s} {:>9s}".format('stage', 'seconds', 'files/sec', 'features/sec', 'rows/sec', 'MB/sec'))
+    for name, result in stages.items():
+        print("{:14s} {:9.2f} {:10.1f} {:13.0f} {:11.0f} {:9.1f}".format(name, result['seconds'],
+            result['filesPerSec'], result['featuresPerSec'], result['rowsPerSec'], result['MBPerSec']))
+
+def printComparison(stages, previousFilename):
+    with open(previousFilename) as previousFile:
+        previous = json.load(previousFile)
+    print("Compared with " + previousFilename + " (" + str(previous.get('commit')) + ")")
+    for name, result in stages.items():
+        previousResult = previous['stages'].get(name)
+        if(previousResult == None or result['seconds'] <= 0):
+            continue
+        print("{:14s} {:9.2f} s -> {:9.2f} s {:6.2f}x".format(name, previousResult['seconds'], result['seconds'],
+            previousResult['seconds'] / result['seconds']))
+
+def runBenchmark(workDir, parameters, cdbRoot=None):
+    stages = {}
+    if(cdbRoot == None):
+        cdbRoot = os.path.join(workDir, 'cdb')
+        print("Writing a synthetic CDB of " + str(parameters['tiles']) + " tiles to " + cdbRoot)
+        startTime = time.time()
+        totals = syntheticCDB.generateSyntheticCDB(cdbRoot, parameters['tiles'], parameters['features'], parameters['width'])
+        stages['generate'] = createStageResult(time.time() - startTime, files=totals['shapefiles'],
+            features=totals['features'], rows=totals['dbfRows'], bytes=totals['bytes'])
+    inputBytes = syntheticCDB.getDirectorySize(cdbRoot)
+    options = Convert.getOptions(parameters['options'])
+
+    stages['scan'], tiles = runScanStage(cdbRoot, workDir)
+    stages['copyFeatures'] = runCopyFeaturesStage(tiles, workDir, options)
+    stages['translateCDB'] = runTranslateStage(cdbRoot, workDir, parameters['jobs'], options, inputBytes)
+    stages['verify'] = runVerifyStage(cdbRoot, workDir, parameters['jobs'], options, inputBytes)
+
+    results = {}
+    results['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    results['commit'] = getCommit()
+    results['gdalVersion'] = gdal.VersionInfo('RELEASE_NAME')
+    results['python'] = platform.python_version()
+    results['platform'] = platform.platform()
+    results['parameters'] = parameters
+    results['inputBytes'] = inputBytes
+    results['stages'] = stages
+    return results
+
+if __name__ == "__main__":
+    parameters = {'tiles': 16, 'features': 1000, 'width': 10, 'jobs': 1, 'options': {}}
+    outputFilename = 'benchmarkCDB-' + time.strftime('%Y%m%d-%H%M%S') + '.json'
+    previousFilename = None
+    cdbRoot = None
+    args = sys.argv[1:]
+    validArgs = True
+    while(validArgs and len(args) > 1 and args[0].startswith("--")):
+        option = args.pop(0)
+        value = args.pop(0)
+        if(option in ("--tiles", "--features", "--width", "--jobs") and value.isdigit()):
+            parameters[option[2:]] = int(value)
+        elif(option == "--output"):
+            outputFilename = value
+        elif(option == "--compare"):
+            previousFilename = value
+        elif(option == "--cdb"):
+            cdbRoot = value
+        else:
+            validArgs = False
+    if(not validArgs or len(args) > 1 or (len(args) == 1 and args[0].startswith("--"))):
+        print("Usage: benchmarkCDB.py [--tiles N] [--features N] [--width N] [--jobs N] [--output results.json] [--compare previous.json] [--cdb existing CDB] [work directory]")
+        exit()
+    if(len(args) == 1):
+        results = runBenchmark(args[0], parameters, cdbRoot)
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            results = runBenchmark(workDir, parameters, cdbRoot)
+    printResults(results['stages'])
+    with open(outputFilename, 'w') as outputFile:
+        json.dump(results, outputFile, indent=2)
+    print("Results written to " + outputFilename)
+    if(previousFilename != None):
+        printComparison(results['stages'], previousFilename)
@@ -0,0 +1,149 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Compares the old row-at-a-time INSERT loop used for the attribute tables with
+# the bulk executemany path outputSession.writeRowsWithSQLite uses, on a
+# synthetic extended attributes (T016 style) DBF.
+#
+# Usage: benchmarkConvertDBF.py [row count] [work directory]
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+import converter
+import dbfwriter
+
+extendedAttrFields = [
+    ('CNAM', 'C', 32, 0),
+    ('MODL', 'C', 32, 0),
+    ('FACC', 'C', 5, 0),
+    ('FSC', 'N', 5, 0),
+    ('AO1', 'N', 10, 3),
+    ('HGT', 'N', 10, 3),
+    ('SCALX', 'N', 10, 4),
+    ('SCALY', 'N', 10, 4),
+    ('SCALZ', 'N', 10, 4),
+    ('BBW', 'N', 12, 4)]
+
+def generateRows(rowCount):
+    for rowNum in range(rowCount):
+        yield ('CN' + str(rowNum), 'model_' + str(rowNum % 500), 'AL015', rowNum % 1000,
+            (rowNum % 360) + 0.5, 10.25, 1.0, 1.0, 1.0, 12.5)
+
+# How attribute tables were read before the streaming reader: load everything,
+# copy each record into a new dict and key the lot by CNAM.
+def legacyReadDBF(dbfFilename):
+    cNameRecords = {}
+    for record in converter.dbfread.DBF(dbfFilename,load=True):
+        recordFields = {}
+        for field in record.keys():
+            recordFields[field] = record[field]
+        cNameRecords[record['CNAM']] = recordFields
+    return cNameRecords
+
+# The INSERT loop used before the bulk path: the statement is
+# rebuilt from the record's keys and executed once per row.
+def legacyInsertRows(cursor, dbfTableName, dbfTable):
+    for rowPK in dbfTable.keys():
+        insertValues = []
+        insertValuesString = ""
+        insertString = ""
+        row = dbfTable[rowPK]
+        for key,value in row.items():
+            if(len(insertString)>0):
+                insertString += ","
+                insertValuesString += ","
+            else:
+                    insertString = "INSERT INTO " + dbfTableName + " ("
+                    insertValuesString += " VALUES ("
+            insertString += key
+            insertValues.append(value)
+            insertValuesString += "?"
+        insertValuesString += ")"
+        insertString += ") "
+        insertString += insertValuesString
+        cursor.execute(insertString,tuple(insertValues))
+
+# The table the attribute tables were written to with sqlite3
+def getCreateTableString(dbfTableName, dbfFields):
+    columns = ["'ID' INTEGER PRIMARY KEY AUTOINCREMENT"]
+    for field in dbfFields:
+        columnType = "TEXT"
+        if(field.type in ('F', 'O', 'N')):
+            columnType = "REAL"
+        elif(field.type == 'I'):
+            columnType = "INTEGER"
+        columns.append("'" + field.name + "' " + columnType)
+    return "CREATE TABLE '" + dbfTableName + "' (" + ",".join(columns) + ")"
+
+# Time just the insert stage of each path on an already loaded table
+def timeInsertStage(dbfTable, dbfFields, workDir, bulk):
+    dbfTableName = 'N32W118_D101_S001_T016_L00_U0_R0'
+    sqliteFilename = os.path.join(workDir, 'insert.sqlite')
+    converter.removeFileIfExists(sqliteFilename)
+    sqliteCon = sqlite3.connect(sqliteFilename)
+    if(bulk):
+        converter.applyBulkLoadPragmas(sqliteCon)
+    cursor = sqliteCon.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    cursor.execute(getCreateTableString(dbfTableName, dbfFields))
+    if(bulk):
+        rows = [tuple(row.values()) for row in dbfTable.values()]
+    startTime = time.time()
+    if(bulk):
+        converter.insertRows(cursor, converter.getInsertString(dbfTableName, [field.name for field in dbfFields]), converter.iterateDBFBatches(rows))
+    else:
+        legacyInsertRows(cursor, dbfTableName, dbfTable)
+    cursor.execute("COMMIT TRANSACTION")
+    elapsed = time.time() - startTime
+    sqliteCon.close()
+    os.remove(sqliteFilename)
+    return elapsed
+
+def runBenchmark(rowCount, workDir):
+    dbfFilename = os.path.join(workDir, 'N32W118_D101_S001_T016_L00_U0_R0.dbf')
+    print("Writing " + str(rowCount) + " rows to " + dbfFilename)
+    dbfwriter.writeDBF(dbfFilename, extendedAttrFields, generateRows(rowCount))
+
+    startTime = time.time()
+    dbfTable = legacyReadDBF(dbfFilename)
+    readSeconds = time.time() - startTime
+    dbfFields = converter.dbfread.DBF(dbfFilename).fields
+    legacyInsertSeconds = timeInsertStage(dbfTable, dbfFields, workDir, False)
+    bulkInsertSeconds = timeInsertStage(dbfTable, dbfFields, workDir, True)
+    dbfTable = None
+    os.remove(dbfFilename)
+
+    print("Read DBF:             {:.2f} s, {:.0f} rows/sec".format(readSeconds, rowCount / readSeconds))
+    print("Insert row-at-a-time: {:.2f} s, {:.0f} rows/sec".format(legacyInsertSeconds, rowCount / legacyInsertSeconds))
+    print("Insert bulk:          {:.2f} s, {:.0f} rows/sec".format(bulkInsertSeconds, rowCount / bulkInsertSeconds))
+    print("Speedup:              {:.2f}x insert".format(legacyInsertSeconds / bulkInsertSeconds))
+
+if __name__ == "__main__":
+    rowCount = 1000000
+    if(len(sys.argv) > 1):
+        rowCount = int(sys.argv[1])
+    if(len(sys.argv) > 2):
+        runBenchmark(rowCount, sys.argv[2])
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            runBenchmark(rowCount, workDir)
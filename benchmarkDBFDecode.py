@@ -0,0 +1,88 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Compares decoding a large T016 style extended attributes DBF with dbfread
+# against the memory mapped NumPy decoder in dbfarray.
+#
+# Usage: benchmarkDBFDecode.py [row count] [work directory]
+
+import os
+import sys
+import time
+import tempfile
+
+import dbfread
+import dbfarray
+import dbfwriter
+import benchmarkConvertDBF
+
+def decodeWithDBFRead(dbfFilename):
+    rowCount = 0
+    for record in dbfread.DBF(dbfFilename, recfactory=tuple):
+        rowCount += 1
+    return rowCount
+
+# Only the numeric columns are decoded; text stays as raw bytes
+def decodeColumnsWithNumPy(dbfFilename):
+    rowCount = 0
+    for columns in dbfarray.iterateColumnBatches(dbfarray.openDBFArray(dbfFilename)):
+        rowCount += len(columns['CNAM'])
+    return rowCount
+
+# Every value as a Python object, which is what the batched INSERTs write
+def decodeRowsWithNumPy(dbfFilename):
+    rowCount = 0
+    for batch in dbfarray.iterateRowBatches(dbfarray.openDBFArray(dbfFilename)):
+        rowCount += len(batch)
+    return rowCount
+
+def timeDecode(decodeFunction, dbfFilename):
+    startTime = time.time()
+    rowCount = decodeFunction(dbfFilename)
+    return rowCount, time.time() - startTime
+
+def runBenchmark(rowCount, workDir):
+    if(not dbfarray.isAvailable()):
+        print("NumPy is not installed")
+        return
+    dbfFilename = os.path.join(workDir, 'N32W118_D101_S001_T016_L00_U0_R0.dbf')
+    print("Writing " + str(rowCount) + " rows to " + dbfFilename)
+    dbfwriter.writeDBF(dbfFilename, benchmarkConvertDBF.extendedAttrFields, benchmarkConvertDBF.generateRows(rowCount))
+    fileSize = os.path.getsize(dbfFilename)
+
+    results = []
+    results.append(('dbfread rows', timeDecode(decodeWithDBFRead, dbfFilename)))
+    results.append(('NumPy rows', timeDecode(decodeRowsWithNumPy, dbfFilename)))
+    results.append(('NumPy columns', timeDecode(decodeColumnsWithNumPy, dbfFilename)))
+    os.remove(dbfFilename)
+
+    baseSeconds = results[0][1][1]
+    for name, (decodedRows, seconds) in results:
+        print("{:14s} {:8.2f} s {:12.0f} rows/sec {:8.1f} MB/sec {:6.1f}x".format(name, seconds,
+            decodedRows / seconds, fileSize / seconds / 1e6, baseSeconds / seconds))
+
+if __name__ == "__main__":
+    rowCount = 1000000
+    if(len(sys.argv) > 1):
+        rowCount = int(sys.argv[1])
+    if(len(sys.argv) > 2):
+        runBenchmark(rowCount, sys.argv[2])
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            runBenchmark(rowCount, workDir)
@@ -0,0 +1,147 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Converts the same dense line and polygon tiles at several LODs with and
+# without --quantize and --simplify, and reports for each LOD the GeoPackage
+# size, the size reduction and the change in features per second.
+#
+# Usage: benchmarkGeometryTransform.py [features per tile] [work directory]
+
+import os
+import sys
+import math
+import time
+import random
+import tempfile
+
+try:
+    from osgeo import ogr, osr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+import Convert
+import tileSubset
+import geometryTransform
+
+lodNames = ('LC02', 'L00', 'L02', 'L04', 'L06')
+
+# vertices of each line and polygon ring
+vertexCount = 200
+
+modes = (
+    ('full', {}),
+    ('quantize', {'quantize': True}),
+    ('simplify', {'simplify': True}),
+    ('both', {'quantize': True, 'simplify': True}))
+
+def getTileWidth(lodName):
+    return min(1.0, 1.0 / (2 ** tileSubset.parseLOD(lodName)))
+
+# A wandering line, or a wobbly circle for a polygon, about a quarter of the tile across
+def createGeometry(geometryType, west, south, width, rng):
+    step = width / (vertexCount * 4.0)
+    centerX = west + rng.uniform(width / 4, width * 3 / 4)
+    centerY = south + rng.uniform(width / 4, width * 3 / 4)
+    points = []
+    for vertexNum in range(vertexCount):
+        if(geometryType == ogr.wkbLineString):
+            points.append((centerX + step * vertexNum, centerY + step * rng.uniform(-1, 1)))
+        else:
+            angle = 2 * math.pi * vertexNum / vertexCount
+            radius = width / 8 + step * rng.uniform(-1, 1)
+            points.append((centerX + radius * math.cos(angle), centerY + radius * math.sin(angle)))
+    if(geometryType == ogr.wkbLineString):
+        geometry = ogr.Geometry(ogr.wkbLineString)
+        for x, y in points:
+            geometry.AddPoint_2D(x, y)
+        return geometry
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for x, y in points + points[0:1]:
+        ring.AddPoint_2D(x, y)
+    geometry = ogr.Geometry(ogr.wkbPolygon)
+    geometry.AddGeometry(ring)
+    return geometry
+
+def writeTile(shpFilename, geometryType, lodName, featureCount, rng):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataSource = ogr.GetDriverByName("ESRI Shapefile").CreateDataSource(shpFilename)
+    layer = dataSource.CreateLayer(Convert.getOutputLayerName(shpFilename), srs, geometryType)
+    layer.CreateField(ogr.FieldDefn('CNAM', ogr.OFTString))
+    layerDefinition = layer.GetLayerDefn()
+    width = getTileWidth(lodName)
+    for featureNum in range(featureCount):
+        feature = ogr.Feature(layerDefinition)
+        feature.SetField('CNAM', 'FC' + str(featureNum % 16))
+        feature.SetGeometry(createGeometry(geometryType, -118.0, 32.0, width, rng))
+        layer.CreateFeature(feature)
+    dataSource = None
+
+def getTileShapeFiles(inputDir, lodName):
+    shapeFiles = []
+    for selector2, geometryType in (('T003', ogr.wkbLineString), ('T005', ogr.wkbPolygon)):
+        shpFilename = os.path.join(inputDir, 'N32W118_D101_S001_' + selector2 + '_' + lodName + '_U0_R0.shp')
+        shapeFiles.append((shpFilename, geometryType))
+    return shapeFiles
+
+# Convert the tiles of a LOD with options, returning the seconds taken and the GeoPackage bytes
+def convertTiles(shapeFiles, outputDir, options):
+    os.makedirs(outputDir)
+    outputBytes = 0
+    seconds = 0.0
+    for shpFilename, geometryType in shapeFiles:
+        gpkgFilename = os.path.join(outputDir, os.path.basename(shpFilename)[0:-4] + '.gpkg')
+        startTime = time.time()
+        Convert.copyFeaturesFromShapeToGeoPackage(shpFilename, gpkgFilename, False, False, options)
+        seconds += time.time() - startTime
+        outputBytes += os.path.getsize(gpkgFilename)
+    return seconds, outputBytes
+
+def runBenchmark(featureCount, workDir):
+    if(not geometryTransform.isAvailable()):
+        print("shapely 2 and NumPy are needed")
+        return
+    rng = random.Random(0)
+    inputDir = os.path.join(workDir, 'input')
+    os.makedirs(inputDir)
+    print("{:5s} {:9s} {:>9s} {:>10s} {:>9s} {:>12s} {:>9s}".format('LOD', 'mode', 'seconds', 'MB', 'reduced', 'features/s', 'change'))
+    for lodName in lodNames:
+        shapeFiles = getTileShapeFiles(inputDir, lodName)
+        for shpFilename, geometryType in shapeFiles:
+            writeTile(shpFilename, geometryType, lodName, featureCount, rng)
+        tileFeatures = featureCount * len(shapeFiles)
+        baseSeconds = None
+        baseBytes = None
+        for mode, options in modes:
+            seconds, outputBytes = convertTiles(shapeFiles, os.path.join(workDir, lodName + '_' + mode), options)
+            if(baseSeconds == None):
+                baseSeconds = seconds
+                baseBytes = outputBytes
+            print("{:5s} {:9s} {:9.2f} {:10.2f} {:8.1f}% {:12.0f} {:+8.1f}%".format(lodName, mode, seconds, outputBytes / 1e6,
+                100.0 * (baseBytes - outputBytes) / baseBytes, tileFeatures / seconds, 100.0 * (baseSeconds / seconds - 1)))
+
+if __name__ == "__main__":
+    featureCount = 5000
+    if(len(sys.argv) > 1):
+        featureCount = int(sys.argv[1])
+    if(len(sys.argv) > 2):
+        runBenchmark(featureCount, sys.argv[2])
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            runBenchmark(featureCount, workDir)
@@ -0,0 +1,175 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Compares writing a point tile (features, flattened feature class attributes
+# and an extended attributes table) the way convertShapeFile used to, with the
+# GeoPackage opened by OGR and then again with sqlite3, against a single output
+# session. Reports the time per tile, and when strace is installed, the system
+# calls, file opens and fsyncs per tile.
+#
+# Usage: benchmarkOutputSession.py [tile count] [features per tile] [work directory]
+
+import os
+import re
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+
+try:
+    from osgeo import ogr, osr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+import Convert
+import converter
+import dbfwriter
+import benchmarkConvertDBF
+
+featureClassFields = [
+    ('CNAM', 'C', 32, 0),
+    ('FACC', 'C', 5, 0),
+    ('MODL', 'C', 32, 0),
+    ('FSC', 'N', 5, 0)]
+
+classCount = 50
+
+def getTileShapeFile(inputDir, tileNum):
+    return os.path.join(inputDir, 'N32W118_D101_S001_T001_L00_U' + str(tileNum) + '_R0.shp')
+
+def writeSyntheticTile(shpFilename, featureCount):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataSource = ogr.GetDriverByName("ESRI Shapefile").CreateDataSource(shpFilename)
+    layer = dataSource.CreateLayer(Convert.getOutputLayerName(shpFilename), srs, ogr.wkbPoint)
+    layer.CreateField(ogr.FieldDefn('CNAM', ogr.OFTString))
+    layer.CreateField(ogr.FieldDefn('AO1', ogr.OFTReal))
+    layerDefinition = layer.GetLayerDefn()
+    for featureNum in range(featureCount):
+        feature = ogr.Feature(layerDefinition)
+        feature.SetField('CNAM', 'FC' + str(featureNum % classCount))
+        feature.SetField('AO1', float(featureNum % 360))
+        feature.SetGeometry(ogr.CreateGeometryFromWkt('POINT ({} {})'.format(-118 + (featureNum % 1000) / 1000.0, 32 + featureNum / float(featureCount))))
+        layer.CreateFeature(feature)
+    dataSource = None
+    dbfwriter.writeDBF(converter.getFeatureClassAttrFileName(shpFilename), featureClassFields,
+        (('FC' + str(classNum), 'AL015', 'model_' + str(classNum), classNum) for classNum in range(classCount)))
+    dbfwriter.writeDBF(converter.getExtendedAttrFileName(shpFilename), benchmarkConvertDBF.extendedAttrFields,
+        benchmarkConvertDBF.generateRows(featureCount))
+
+# How convertShapeFile wrote a tile before the output session: the features
+# through one OGR data source, then the extended attributes through sqlite3.
+def convertSeparately(shpFilename, outputDir):
+    gpkgFilename = os.path.join(outputDir, os.path.basename(shpFilename)[0:-4] + '.gpkg')
+    Convert.copyFeaturesFromShapeToGeoPackage(shpFilename, gpkgFilename, True, False)
+    sqliteCon = sqlite3.connect(gpkgFilename)
+    dbfTableName = Convert.getExtendedAttrTableName(shpFilename)
+    dbfFields, recordCount, rowBatches = converter.openDBFRowBatches(converter.getExtendedAttrFileName(shpFilename))
+    converter.applyBulkLoadPragmas(sqliteCon)
+    cursor = sqliteCon.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    cursor.execute(benchmarkConvertDBF.getCreateTableString(dbfTableName, dbfFields))
+    cursor.execute("INSERT INTO gpkg_contents (table_name,data_type,identifier,description,last_change) VALUES(?,'attributes',?,?,strftime('%Y-%m-%dT%H:%M:%fZ','now'))",
+        (dbfTableName, dbfTableName, dbfTableName + " Extended Attributes"))
+    converter.insertRows(cursor, converter.getInsertString(dbfTableName, [field.name for field in dbfFields]), rowBatches)
+    cursor.execute("COMMIT TRANSACTION")
+    sqliteCon.close()
+
+def convertWithSession(shpFilename, outputDir):
+    Convert.convertShapeFile(shpFilename, os.path.dirname(shpFilename), outputDir, False)
+
+convertFunctions = {
+    'separate': convertSeparately,
+    'session': convertWithSession,
+    'none': None,
+}
+
+def convertTiles(mode, inputDir, outputDir, tileCount):
+    if(os.path.exists(outputDir)):
+        shutil.rmtree(outputDir)
+    os.makedirs(outputDir)
+    convertFunction = convertFunctions[mode]
+    startTime = time.time()
+    if(convertFunction != None):
+        for tileNum in range(tileCount):
+            convertFunction(getTileShapeFile(inputDir, tileNum), outputDir)
+    return time.time() - startTime
+
+# Count the system calls made by converting the tiles in a child process.
+# 'none' gives the cost of starting the process and importing the modules.
+def countSyscalls(mode, inputDir, outputDir, tileCount):
+    traceFilename = outputDir + '.strace'
+    subprocess.check_call(['strace', '-f', '-qq', '-o', traceFilename, sys.executable, os.path.abspath(__file__),
+        '--run', mode, inputDir, outputDir, str(tileCount)], stdout=subprocess.DEVNULL)
+    counts = {'total': 0, 'open': 0, 'fsync': 0}
+    syscallPattern = re.compile(r'^(?:\d+\s+)?(\w+)\(')
+    with open(traceFilename) as traceFile:
+        for line in traceFile:
+            match = syscallPattern.match(line)
+            if(match == None):
+                continue
+            syscall = match.group(1)
+            counts['total'] += 1
+            if(syscall in ('open', 'openat')):
+                counts['open'] += 1
+            elif(syscall in ('fsync', 'fdatasync')):
+                counts['fsync'] += 1
+    os.remove(traceFilename)
+    return counts
+
+def runBenchmark(tileCount, featureCount, workDir):
+    inputDir = os.path.join(workDir, 'input')
+    os.makedirs(inputDir)
+    print("Writing " + str(tileCount) + " tiles of " + str(featureCount) + " features to " + inputDir)
+    for tileNum in range(tileCount):
+        writeSyntheticTile(getTileShapeFile(inputDir, tileNum), featureCount)
+
+    for mode in ('separate', 'session'):
+        seconds = convertTiles(mode, inputDir, os.path.join(workDir, mode), tileCount)
+        print("{:9s} {:8.1f} ms/tile".format(mode, seconds * 1000 / tileCount))
+
+    if(shutil.which('strace') == None):
+        print("strace is not installed, not counting system calls")
+        return
+    baseCounts = countSyscalls('none', inputDir, os.path.join(workDir, 'none'), tileCount)
+    for mode in ('separate', 'session'):
+        counts = countSyscalls(mode, inputDir, os.path.join(workDir, mode), tileCount)
+        perTile = {}
+        for key in counts.keys():
+            perTile[key] = (counts[key] - baseCounts[key]) / float(tileCount)
+        print("{:9s} {:8.0f} syscalls/tile {:6.1f} opens/tile {:5.1f} fsyncs/tile".format(mode,
+            perTile['total'], perTile['open'], perTile['fsync']))
+
+if __name__ == "__main__":
+    if(len(sys.argv) == 6 and sys.argv[1] == '--run'):
+        convertTiles(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+        exit()
+    tileCount = 100
+    featureCount = 2000
+    if(len(sys.argv) > 1):
+        tileCount = int(sys.argv[1])
+    if(len(sys.argv) > 2):
+        featureCount = int(sys.argv[2])
+    if(len(sys.argv) > 3):
+        runBenchmark(tileCount, featureCount, sys.argv[3])
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            runBenchmark(tileCount, featureCount, workDir)
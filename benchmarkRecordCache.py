@@ -0,0 +1,91 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Compares the memory held by the feature class tables of many tiles when each is
+# read into a dictionary per record (dbfconvert.readDBF) against the compact,
+# interned tables of recordCache. The tiles share their CNAM rows and model
+# names, as the feature class tables of a CDB do.
+#
+# Usage: benchmarkRecordCache.py [tile count] [rows per tile] [work directory]
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+import dbfconvert
+import dbfwriter
+import recordCache
+import benchmarkConvertDBF
+
+def getTileFilenames(workDir, tileCount):
+    dbfFilenames = []
+    for tileNum in range(tileCount):
+        dbfFilenames.append(os.path.join(workDir, 'N32W118_D101_S001_T002_L00_U' + str(tileNum) + '_R0.dbf'))
+    return dbfFilenames
+
+# Read every table, keeping them all, and return the bytes allocated and seconds taken
+def measureTables(readFunction, dbfFilenames):
+    tracemalloc.start()
+    startTime = time.time()
+    tables = [readFunction(dbfFilename) for dbfFilename in dbfFilenames]
+    seconds = time.time() - startTime
+    heldBytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tables
+    return heldBytes, seconds
+
+def readCachedTable(dbfFilename):
+    return recordCache.getFeatureClassTable(dbfFilename)[0]
+
+def runBenchmark(tileCount, rowCount, workDir):
+    dbfFilenames = getTileFilenames(workDir, tileCount)
+    print("Writing " + str(tileCount) + " tables of " + str(rowCount) + " rows to " + workDir)
+    for dbfFilename in dbfFilenames:
+        dbfwriter.writeDBF(dbfFilename, benchmarkConvertDBF.extendedAttrFields, benchmarkConvertDBF.generateRows(rowCount))
+
+    results = []
+    results.append(('dict records', measureTables(dbfconvert.readDBF, dbfFilenames)))
+    recordCache.clearCache()
+    results.append(('record cache', measureTables(readCachedTable, dbfFilenames)))
+    # every table again, now from the cache
+    results.append(('cache hits', measureTables(readCachedTable, dbfFilenames)))
+    for dbfFilename in dbfFilenames:
+        os.remove(dbfFilename)
+
+    baseBytes = results[0][1][0]
+    for name, (heldBytes, seconds) in results:
+        print("{:14s} {:8.2f} s {:10.1f} MB {:6.1f}x".format(name, seconds, heldBytes / 1e6, baseBytes / max(heldBytes, 1)))
+    stats = recordCache.getCacheStats()
+    print("Cache: {} hits, {} misses, {} evictions, {} tables, {:.1f} MB".format(stats['hits'], stats['misses'],
+        stats['evictions'], stats['tables'], stats['bytes'] / 1e6))
+
+if __name__ == "__main__":
+    tileCount = 50
+    rowCount = 20000
+    if(len(sys.argv) > 1):
+        tileCount = int(sys.argv[1])
+    if(len(sys.argv) > 2):
+        rowCount = int(sys.argv[2])
+    if(len(sys.argv) > 3):
+        runBenchmark(tileCount, rowCount, sys.argv[3])
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            runBenchmark(tileCount, rowCount, workDir)
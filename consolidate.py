@@ -0,0 +1,88 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Naming and ordering for the consolidated output mode, where all the tiles of a
+# dataset code, selector and LOD (optionally per geocell) are merged into one
+# GeoPackage instead of one GeoPackage per tile:
+#
+#   dataset   <output>/D100_S001_T001_L00.gpkg
+#   geocell   <output>/N32W118/N32W118_D100_S001_T001_L00.gpkg
+#
+# The feature layer and attribute tables in it are named the same way, and
+# each feature or row gets the UREF and RREF of the tile it came from.
+
+import os
+
+import converter
+
+consolidateModes = ('dataset', 'geocell')
+
+# provenance columns added to consolidated layers and tables
+provenanceColumns = ('UREF', 'RREF')
+
+def isCDBTileName(shpFilename):
+    try:
+        converter.getFilenameComponents(shpFilename)
+    except IndexError:
+        return False
+    return True
+
+def getGeocell(shpFilename):
+    return os.path.basename(shpFilename)[0:7]
+
+# The consolidated layer or table name for a tile. selector2 overrides the
+# tile's own, to name the extended attribute table of a feature tile.
+def getConsolidatedName(shpFilename, consolidate, selector2=None):
+    components = converter.getFilenameComponents(shpFilename)
+    if(selector2 == None):
+        selector2 = components['selector2']
+    name = "_".join((components['datasetcode'], components['selector1'], selector2, components['lod']))
+    if(consolidate == 'geocell'):
+        name = getGeocell(shpFilename) + "_" + name
+    return name
+
+def getConsolidatedGeoPackageFilePath(shpFilename, cdbOutputDir, consolidate):
+    gpkgFilename = getConsolidatedName(shpFilename, consolidate) + '.gpkg'
+    if(consolidate == 'geocell'):
+        return os.path.join(cdbOutputDir, getGeocell(shpFilename), gpkgFilename)
+    return os.path.join(cdbOutputDir, gpkgFilename)
+
+# The tile index columns that are the same for all tiles of a consolidated GeoPackage
+def getGroupColumns(consolidate):
+    groupColumns = ['datasetcode', 'selector1', 'selector2', 'lod']
+    if(consolidate == 'geocell'):
+        groupColumns = ['geocell'] + groupColumns
+    return groupColumns
+
+# Order for tileIndex.iterateTilePaths that puts the tiles sharing a
+# consolidated GeoPackage next to each other
+def getTileOrder(consolidate):
+    return ", ".join(getGroupColumns(consolidate) + ['id'])
+
+def getReferenceNumber(reference):
+    try:
+        return int(reference[1:])
+    except ValueError:
+        return None
+
+# (column name, value) pairs recording which tile a feature or row came from
+def getProvenance(shpFilename):
+    components = converter.getFilenameComponents(shpFilename)
+    return [(provenanceColumns[0], getReferenceNumber(components['uref'])),
+        (provenanceColumns[1], getReferenceNumber(components['rref']))]
@@ -0,0 +1,152 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# The conversion manifest is a small SQLite database in the output root that
+# remembers which input tiles were converted, what they looked like at the time
+# (sizes and modification times, optionally a content hash) and whether the
+# conversion finished. A rerun only converts tiles that are new, changed, or
+# that didn't finish last time.
+
+import os
+import json
+import hashlib
+import sqlite3
+
+import converter
+import archiveInput
+
+manifestFileName = 'convert_manifest.sqlite'
+
+def openManifest(cdbOutputDir):
+    if not os.path.exists(cdbOutputDir):
+        os.makedirs(cdbOutputDir)
+    manifestCon = sqlite3.connect(os.path.join(cdbOutputDir, manifestFileName))
+    manifestCon.execute("PRAGMA journal_mode=WAL")
+    manifestCon.execute("PRAGMA synchronous=NORMAL")
+    manifestCon.execute("CREATE TABLE IF NOT EXISTS tiles ("
+        "shapefile TEXT PRIMARY KEY, "
+        "output TEXT, "
+        "signature TEXT, "
+        "content_hash TEXT, "
+        "status TEXT, "
+        "features INTEGER, "
+        "updated TEXT)")
+    manifestCon.commit()
+    return manifestCon
+
+# All of the files that make up one input tile: the shapefile itself plus the
+# feature class and extended attribute tables that get merged into its output.
+def getTileInputFiles(shpFilename):
+    inputFiles = [shpFilename]
+    for ext in ('shx', 'dbf', 'dbt'):
+        inputFiles.append(shpFilename[0:-3] + ext)
+    fcAttrFilename = converter.getFeatureClassAttrFileName(shpFilename)
+    if(fcAttrFilename != None):
+        inputFiles.append(fcAttrFilename)
+    extAttrFilename = converter.getExtendedAttrFileName(shpFilename)
+    if(extAttrFilename != None):
+        inputFiles.append(extAttrFilename)
+    return inputFiles
+
+def getTileSignature(shpFilename):
+    signature = []
+    for inputFile in getTileInputFiles(shpFilename):
+        if(archiveInput.isVirtualPath(inputFile)):
+            # a member of an archive (see archiveInput.py)
+            fileStat = archiveInput.getFileStat(inputFile)
+            if(fileStat != None):
+                signature.append([os.path.basename(inputFile), fileStat[0], int(fileStat[1] * 1000000000)])
+            continue
+        try:
+            fileStat = os.stat(inputFile)
+        except OSError:
+            continue
+        signature.append([os.path.basename(inputFile), fileStat.st_size, fileStat.st_mtime_ns])
+    return json.dumps(signature)
+
+# The [file name, size, modification time in ns] entries of a signature
+def parseTileSignature(signature):
+    return json.loads(signature)
+
+def getTileContentHash(shpFilename):
+    contentHash = hashlib.sha1()
+    for inputFile in getTileInputFiles(shpFilename):
+        if not archiveInput.isFile(inputFile):
+            continue
+        contentHash.update(os.path.basename(inputFile).encode('utf-8'))
+        with archiveInput.openFile(inputFile) as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                contentHash.update(block)
+    return contentHash.hexdigest()
+
+def createSelectionStats():
+    return {'skipped': 0, 'selected': 0}
+
+def printSelectionSummary(selectionStats):
+    print("Manifest: " + str(selectionStats['skipped']) + " unchanged tiles skipped, " + str(selectionStats['selected']) + " selected for conversion")
+
+# Yields the shapefiles that need to be converted, recording each of them as
+# pending along with the signature of the inputs that are about to be read.
+# A tile is skipped when its last conversion finished, its output still exists
+# and its inputs are unchanged. With useContentHash, a tile whose sizes or times
+# changed but whose content didn't (e.g. it was copied or touched) is skipped too.
+# selectionStats, if given (see createSelectionStats), counts the tiles skipped
+# and selected.
+def selectTilesToConvert(manifestCon, shapeFiles, getOutputPath, useContentHash=False, selectionStats=None):
+    if(selectionStats == None):
+        selectionStats = createSelectionStats()
+    cursor = manifestCon.cursor()
+    for shpFilename in shapeFiles:
+        outputFile = getOutputPath(shpFilename)
+        signature = getTileSignature(shpFilename)
+        contentHash = None
+        cursor.execute("SELECT signature, content_hash, status FROM tiles WHERE shapefile=?", (shpFilename,))
+        row = cursor.fetchone()
+        if(row != None and row[2] == 'done' and os.path.exists(outputFile)):
+            if(row[0] == signature):
+                selectionStats['skipped'] += 1
+                continue
+            if(useContentHash and row[1] != None):
+                contentHash = getTileContentHash(shpFilename)
+                if(contentHash == row[1]):
+                    cursor.execute("UPDATE tiles SET signature=? WHERE shapefile=?", (signature, shpFilename))
+                    selectionStats['skipped'] += 1
+                    continue
+        if(useContentHash and contentHash == None):
+            contentHash = getTileContentHash(shpFilename)
+        cursor.execute("INSERT OR REPLACE INTO tiles (shapefile, output, signature, content_hash, status, features, updated) "
+            "VALUES (?,?,?,?,'pending',0,strftime('%Y-%m-%dT%H:%M:%fZ','now'))",
+            (shpFilename, outputFile, signature, contentHash))
+        selectionStats['selected'] += 1
+        yield shpFilename
+    manifestCon.commit()
+
+# Record the results of one converted group (see parallelConvert.convertGroup)
+def recordResults(manifestCon, results):
+    cursor = manifestCon.cursor()
+    for result in results:
+        status = 'done'
+        if(result['status'] != 'ok'):
+            status = 'failed'
+        cursor.execute("UPDATE tiles SET status=?, features=?, updated=strftime('%Y-%m-%dT%H:%M:%fZ','now') WHERE shapefile=?",
+            (status, result['features'], result['shapefile']))
+    manifestCon.commit()
@@ -18,13 +18,12 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 '''
 
 import os
-import sys
+import shutil
+import struct
 import dbfread
 
-try:
-    from osgeo import ogr, osr, gdal
-except:
-    sys.exit('ERROR: cannot find GDAL/OGR modules')
+import dbfarray
+import archiveInput
 
 def removeFileIfExists(theFile):
     if(os.path.exists(theFile)):
@@ -84,6 +83,28 @@ def getExtendedAttributesSelector(fclassSelector):
             return'T020'
 
 
+#Split a CDB filename such as N32W118_D100_S001_T001_L00_U0_R0.shp into its components
+def getFilenameComponents(shpFilename):
+    components = {}
+    filenameOnly = os.path.basename(shpFilename)
+    baseName,ext = os.path.splitext(filenameOnly)
+    filenameParts = baseName.split("_")
+    datasetCode = filenameParts[1]
+    components['datasetcode'] = datasetCode
+    componentSelector1 = filenameParts[2]
+    components['selector1'] = componentSelector1
+    componentSelector2 = filenameParts[3]
+    components['selector2'] = componentSelector2
+    lod = filenameParts[4]
+    components['lod'] = lod
+    uref = filenameParts[5]
+    components['uref'] = uref
+    rref = filenameParts[6]
+    components['rref'] = rref
+
+    return components
+
+
 def getSelector2(shpFilename):
     base = os.path.basename(shpFilename)
     selector2 = base[18:22]
@@ -138,84 +159,87 @@ def getOutputGeoPackageFilePath(shpFilename,cdbInputPath,cdbOutputPath):
     return fullGPKGOutputFilePath
 
 
-#Return a dictionary of dictionaries 
-#The top level dictionary maps CNAME values to a dictionary of key/value pairs representing column names -> values
-def readDBF(dbfFilename):
-    cNameRecords = {}
-
-    rowNum = 1
-    for record in dbfread.DBF(dbfFilename,load=True):
-        recordFields = {}        
-        
-        for field in record.keys():
-            recordFields[field] = record[field]
-            #print(record)
-
-        if('CNAM' in record):
-            print(str(record['CNAM']))
-            cNameRecords[record['CNAM']] = recordFields
-        # The ID column is a special column in the DBF file, and the dbfreader doesn't
-        # give this to us. Just in case it does in the future, we use it if it's there
-        # otherwise, we track it ourselves.
-        elif('ID' in record):
-            cNameRecords[record['ID']] = recordFields
-        else:
-            cNameRecords[str(rowNum)] = recordFields
-        rowNum = rowNum + 1
-    return cNameRecords
-
-
-def convertDBF(sqliteCon,dbfFilename,dbfTableName,tableDescription, addToGeoPackageContents=True):
-    dbfTable = readDBF(dbfFilename)
-    if(len(dbfTable)==0):
-        return None
-    convertedFields = []
-    cursor = sqliteCon.cursor()
-    cursor.execute("BEGIN TRANSACTION")
-    dbfFields = dbfread.DBF(dbfFilename).fields
-    createString = "CREATE TABLE '" + dbfTableName + "' ('ID' INTEGER PRIMARY KEY AUTOINCREMENT "
-    firstField = True
-    for fieldno in range(len(dbfFields)):
-        # add column
-        field = dbfFields[fieldno]
-        convertedFields.append(field)
-        createString += ','
-        createString += "'" + field.name + "' "
-        createFieldTypeString  = "TEXT"
-        if(field.type=='F' or field.type=='O' or field.type=='N'):
-            createFieldTypeString  = "REAL"
-        elif(field.type == 'I'):
-            createFieldTypeString  = "INTEGER"
-        firstField = False
-        createString += createFieldTypeString
-    createString += ")"
-    
-    cursor.execute(createString)
-    if(addToGeoPackageContents == True):
-        contentsString = "insert into gpkg_contents (table_name,data_type,identifier,description,last_change) VALUES(?,'attributes',?,?,strftime('%Y-%m-%dT%H:%M:%fZ','now'))"
-        contentsAttrs = (dbfTableName,dbfTableName,dbfTableName + " " + tableDescription)
-        cursor.execute(contentsString,contentsAttrs)
-
-    for rowPK in dbfTable.keys():
-        #print(record)
-        insertValues = []
-        insertValuesString = ""
-        insertString = ""
-        row = dbfTable[rowPK]
-        for key,value in row.items():
-            if(len(insertString)>0):
-                insertString += ","
-                insertValuesString += ","
-            else:
-                    insertString = "INSERT INTO " + dbfTableName + " ("
-                    insertValuesString += " VALUES ("
-            insertString += key
-            insertValues.append(value)
-            insertValuesString += "?"
-        insertValuesString += ")"
-        insertString += ") "
-        insertString += insertValuesString
-        #print(insertString)
-        cursor.execute(insertString,tuple(insertValues))
-    cursor.execute("COMMIT TRANSACTION")
-    return convertedFields
+# number of rows handed to executemany at a time
+insertBatchSize = 10000
+
+def getRecordValues(items):
+    return tuple(value for name, value in items)
+
+#Open a DBF for streaming. Nothing but the header is read up front; the returned
+#table has the schema in .fields, the record count in .header.numrecords, and
+#iterating it reads the records from disk one at a time as tuples of values in
+#field order.
+def openDBF(dbfFilename):
+    return dbfread.DBF(dbfFilename, recfactory=getRecordValues)
+
+#Yield the records of an open DBF in lists of at most batchSize tuples
+def iterateDBFBatches(dbfTable, batchSize=insertBatchSize):
+    batch = []
+    for record in dbfTable:
+        batch.append(record)
+        if(len(batch) >= batchSize):
+            yield batch
+            batch = []
+    if(len(batch) > 0):
+        yield batch
+
+#Row batches of a DBF that was copied out of an archive for dbfread, removing
+#the copy once they have all been read
+def iterateLocalDBFBatches(dbfTable, localDirectory, batchSize=insertBatchSize):
+    try:
+        for batch in iterateDBFBatches(dbfTable, batchSize):
+            yield batch
+    finally:
+        shutil.rmtree(localDirectory, ignore_errors=True)
+
+#Open a DBF and return its fields, its record count and a generator of row
+#batches. The columnar NumPy decoder is used when it's available and can handle
+#the table, dbfread otherwise.
+#A DBF in an archive (see archiveInput.py) is read into memory for NumPy, or
+#copied to a temporary file for dbfread.
+def openDBFRowBatches(dbfFilename, batchSize=insertBatchSize):
+    isVirtual = archiveInput.isVirtualPath(dbfFilename)
+    if(dbfarray.isAvailable()):
+        dbfArray = archiveInput.openDBFArray(dbfFilename)
+        if(dbfarray.canDecode(dbfArray)):
+            return dbfArray['fields'], dbfArray['numrecords'], dbfarray.iterateRowBatches(dbfArray, batchSize)
+    if(isVirtual):
+        localDirectory, localFilename = archiveInput.getLocalDBFCopy(dbfFilename)
+        dbfTable = openDBF(localFilename)
+        return dbfTable.fields, dbfTable.header.numrecords, iterateLocalDBFBatches(dbfTable, localDirectory, batchSize)
+    dbfTable = openDBF(dbfFilename)
+    return dbfTable.fields, dbfTable.header.numrecords, iterateDBFBatches(dbfTable, batchSize)
+
+#The record count from a DBF header, without reading the records
+def getDBFRecordCount(dbfFilename):
+    with archiveInput.openFile(dbfFilename) as dbfFile:
+        header = dbfFile.read(8)
+    if(len(header) < 8):
+        return 0
+    return struct.unpack('<I', header[4:8])[0]
+
+# Session settings for building a file in one shot. If the process dies the
+# output is rebuilt from the CDB anyway, so there's no point paying for a
+# rollback journal on disk or for fsyncs.
+def applyBulkLoadPragmas(sqliteCon):
+    sqliteCon.execute("PRAGMA journal_mode=MEMORY")
+    sqliteCon.execute("PRAGMA synchronous=OFF")
+    sqliteCon.execute("PRAGMA temp_store=MEMORY")
+    sqliteCon.execute("PRAGMA cache_size=-65536")
+
+# One prepared INSERT for every row of the table
+def getInsertString(dbfTableName, columnNames):
+    quotedNames = ["'" + columnName + "'" for columnName in columnNames]
+    insertString = "INSERT INTO '" + dbfTableName + "' (" + ",".join(quotedNames) + ") VALUES (" + ",".join(["?"] * len(columnNames)) + ")"
+    return insertString
+
+# Add the values of extraColumns, a list of (column name, value) pairs, to
+# the end of every row, e.g. the UREF/RREF of the tile a table came from
+def addConstantColumns(rowBatches, extraColumns):
+    extraValues = tuple(value for name, value in extraColumns)
+    for batch in rowBatches:
+        yield [tuple(row) + extraValues for row in batch]
+
+def insertRows(cursor, insertString, rowBatches):
+    for batch in rowBatches:
+        cursor.executemany(insertString, batch)
@@ -0,0 +1,206 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# A columnar DBF decoder. DBF records are fixed width, so the whole file can be
+# memory mapped as a NumPy structured array built from the header, and a batch
+# of records decoded a column at a time instead of a value at a time:
+#
+#   N, F   ASCII numbers, converted for the whole column at once. Columns with no
+#          decimals become int64 (masked where blank), others (and whole numbers
+#          too big for int64) float64 with NaN for blanks.
+#   I      binary little endian int32, used as is.
+#   O, B   binary little endian doubles, used as is.
+#   C, D, L and anything else are left as fixed width byte strings and only
+#          decoded when the values are asked for.
+#
+# Values come out the way dbfread would return them, so callers can switch
+# between the two. NumPy is optional; without it (or for tables with memo
+# fields) callers keep using dbfread.
+
+import os
+import struct
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# number of records decoded at a time
+decodeBatchSize = 65536
+
+DBFField = collections.namedtuple('DBFField', ['name', 'type', 'length', 'decimal_count'])
+
+def isAvailable():
+    return numpy != None
+
+def parseDBFHeader(header):
+    numrecords, headerLength, recordLength = struct.unpack('<IHH', header[4:12])
+    fields = []
+    offset = 32
+    while(offset + 32 <= len(header) and header[offset:offset + 1] != b'\r'):
+        fieldName = header[offset:offset + 11].split(b'\0')[0].decode('ascii', 'replace')
+        fieldType = header[offset + 11:offset + 12].decode('ascii', 'replace')
+        length, decimalCount = struct.unpack('<BB', header[offset + 16:offset + 18])
+        fields.append(DBFField(fieldName, fieldType, length, decimalCount))
+        offset += 32
+    return numrecords, headerLength, recordLength, fields
+
+def getRecordDType(fields, recordLength):
+    dtypeFields = [('_deleted', 'S1')]
+    usedNames = set()
+    dataLength = 1
+    for fieldNum, field in enumerate(fields):
+        # DBF doesn't forbid duplicate names, NumPy does
+        columnName = field.name
+        if(columnName in usedNames or columnName == '_deleted' or columnName == ''):
+            columnName = field.name + '_' + str(fieldNum)
+        usedNames.add(columnName)
+        if(field.type == 'I' and field.length == 4):
+            dtypeFields.append((columnName, '<i4'))
+        elif(field.type in ('O', 'B') and field.length == 8):
+            dtypeFields.append((columnName, '<f8'))
+        else:
+            dtypeFields.append((columnName, 'S' + str(field.length)))
+        dataLength += field.length
+    if(recordLength > dataLength):
+        dtypeFields.append(('_padding', 'V' + str(recordLength - dataLength)))
+    return numpy.dtype(dtypeFields)
+
+# Open a DBF file (or a bytes-like buffer holding one) as a structured array.
+# Returns a dictionary with the fields, the record count and the records.
+def openDBFArray(dbfSource, encoding='latin-1'):
+    if(isinstance(dbfSource, str)):
+        with open(dbfSource, 'rb') as f:
+            header = f.read(32)
+            headerLength, = struct.unpack('<H', header[8:10])
+            header += f.read(headerLength - 32)
+        dataSize = os.path.getsize(dbfSource) - headerLength
+    else:
+        header = bytes(dbfSource[0:32])
+        headerLength, = struct.unpack('<H', header[8:10])
+        header = bytes(dbfSource[0:headerLength])
+        dataSize = len(dbfSource) - headerLength
+    numrecords, headerLength, recordLength, fields = parseDBFHeader(header)
+    recordDType = getRecordDType(fields, recordLength)
+    # a truncated file only gets the records that are actually there
+    numrecords = max(0, min(numrecords, dataSize // recordLength))
+    if(numrecords == 0):
+        records = numpy.zeros(0, dtype=recordDType)
+    elif(isinstance(dbfSource, str)):
+        records = numpy.memmap(dbfSource, dtype=recordDType, mode='r', offset=headerLength, shape=(numrecords,))
+    else:
+        records = numpy.frombuffer(dbfSource, dtype=recordDType, count=numrecords, offset=headerLength)
+    dbfArray = {}
+    dbfArray['fields'] = fields
+    dbfArray['columns'] = list(recordDType.names[1:1 + len(fields)])
+    dbfArray['numrecords'] = numrecords
+    dbfArray['records'] = records
+    dbfArray['encoding'] = encoding
+    return dbfArray
+
+# Memo fields need the .dbt, which this decoder doesn't read
+def canDecode(dbfArray):
+    for field in dbfArray['fields']:
+        if(field.type in ('M', 'G', 'P')):
+            return False
+    return True
+
+def decodeNumericColumn(column, field):
+    values = numpy.char.strip(column, b' \x00*')
+    blank = (values == b'')
+    hasBlanks = blank.any()
+    if(field.decimal_count == 0):
+        # whole numbers with blanks are kept as a masked int64 column; ones
+        # too big for int64 (19 or more digits) fall back to float64
+        try:
+            if(hasBlanks):
+                return numpy.ma.masked_array(numpy.where(blank, b'0', values).astype(numpy.int64), mask=blank)
+            return values.astype(numpy.int64)
+        except (ValueError, OverflowError):
+            pass
+    if(hasBlanks):
+        values = numpy.where(blank, b'nan', values)
+    try:
+        return values.astype(numpy.float64)
+    except ValueError:
+        # e.g. a comma as the decimal separator
+        return numpy.char.replace(values, b',', b'.').astype(numpy.float64)
+
+def decodeColumn(column, field):
+    if(field.type in ('N', 'F') and column.dtype.kind == 'S'):
+        return decodeNumericColumn(column, field)
+    return column
+
+# Yield batches of non-deleted records as dictionaries of column name -> array.
+# Numeric columns are decoded, the rest are left as byte strings (see getColumnValues).
+def iterateColumnBatches(dbfArray, batchSize=decodeBatchSize):
+    records = dbfArray['records']
+    for batchStart in range(0, dbfArray['numrecords'], batchSize):
+        batch = records[batchStart:batchStart + batchSize]
+        deleted = (batch['_deleted'] == b'*')
+        if(deleted.any()):
+            batch = batch[~deleted]
+        columns = {}
+        for columnName, field in zip(dbfArray['columns'], dbfArray['fields']):
+            columns[columnName] = decodeColumn(batch[columnName], field)
+        yield columns
+
+def decodeLogicalValue(value):
+    if(value in (b'T', b't', b'Y', b'y')):
+        return True
+    if(value in (b'F', b'f', b'N', b'n')):
+        return False
+    return None
+
+def decodeDateValue(value):
+    value = value.strip()
+    if(len(value) != 8 or not value.isdigit()):
+        return None
+    return (value[0:4] + b'-' + value[4:6] + b'-' + value[6:8]).decode('ascii')
+
+# The Python values of one column of a batch, with None for blank numbers
+def getColumnValues(column, field, encoding='latin-1'):
+    if(isinstance(column, numpy.ma.MaskedArray)):
+        values = column.data.astype(object)
+        values[column.mask] = None
+        return values.tolist()
+    if(column.dtype.kind == 'f'):
+        missing = numpy.isnan(column)
+        if(missing.any()):
+            values = column.astype(object)
+            values[missing] = None
+            return values.tolist()
+        return column.tolist()
+    if(column.dtype.kind != 'S'):
+        return column.tolist()
+    if(field.type == 'L'):
+        return [decodeLogicalValue(value) for value in column.tolist()]
+    if(field.type == 'D'):
+        return [decodeDateValue(value) for value in column.tolist()]
+    return numpy.char.decode(numpy.char.rstrip(column, b' \x00'), encoding, 'replace').tolist()
+
+# Yield batches of records as lists of value tuples in field order
+def iterateRowBatches(dbfArray, batchSize=decodeBatchSize):
+    encoding = dbfArray['encoding']
+    for columns in iterateColumnBatches(dbfArray, batchSize):
+        columnValues = []
+        for columnName, field in zip(dbfArray['columns'], dbfArray['fields']):
+            columnValues.append(getColumnValues(columns[columnName], field, encoding))
+        yield list(zip(*columnValues))
@@ -1,23 +1,39 @@
 
+import shutil
 import dbfread
 
+import dbfarray
+import archiveInput
+
 #Return a dictionary of dictionaries 
 #The top level dictionary maps CNAME values to a dictionary of key/value pairs representing column names -> values
+#The file is opened once and streamed; only the keyed result is kept in memory.
+#A DBF in an archive (see archiveInput.py) is read from a temporary copy.
 def readDBF(dbfFilename):
     cNameRecords = {}
-    dbfields = None
+    isVirtual = archiveInput.isVirtualPath(dbfFilename)
+    if(dbfarray.isAvailable() and archiveInput.isFile(dbfFilename)):
+        dbfArray = archiveInput.openDBFArray(dbfFilename)
+        if(dbfarray.canDecode(dbfArray)):
+            fieldNames = [field.name for field in dbfArray['fields']]
+            for batch in dbfarray.iterateRowBatches(dbfArray):
+                for row in batch:
+                    record = dict(zip(fieldNames, row))
+                    cNameRecords[record['CNAM']] = record
+            return cNameRecords
+    if(isVirtual):
+        if(not archiveInput.isFile(dbfFilename)):
+            return None
+        localDirectory, localFilename = archiveInput.getLocalDBFCopy(dbfFilename)
+        try:
+            for record in dbfread.DBF(localFilename,recfactory=dict):
+                cNameRecords[record['CNAM']] = record
+        finally:
+            shutil.rmtree(localDirectory, ignore_errors=True)
+        return cNameRecords
     try:
-        dbfFields = dbfread.DBF(dbfFilename).fields
-        for record in dbfread.DBF(dbfFilename,load=True):
-            recordFields = {}
-
-            for field in record.keys():
-                recordFields[field] = record[field]
-                #print(record)
-
-            cNameRecords[record['CNAM']] = recordFields
+        for record in dbfread.DBF(dbfFilename,recfactory=dict):
+            cNameRecords[record['CNAM']] = record
     except dbfread.exceptions.DBFNotFound:
         return None
     return cNameRecords
-
-
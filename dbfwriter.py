@@ -0,0 +1,69 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# A minimal dBASE III writer, used to build test and benchmark tables.
+# Fields are (name, type, length, decimalCount) with type C, N, F or L.
+
+import struct
+import datetime
+
+def formatDBFValue(value, fieldType, length, decimalCount):
+    if(value == None):
+        return b' ' * length
+    if(fieldType == 'C'):
+        encoded = str(value).encode('latin-1', 'replace')[0:length]
+        return encoded.ljust(length, b' ')
+    if(fieldType == 'L'):
+        if(value):
+            return b'T'
+        return b'F'
+    if(decimalCount > 0):
+        text = "{:.{}f}".format(float(value), decimalCount)
+    else:
+        text = str(int(value))
+    encoded = text.encode('ascii')[0:length]
+    return encoded.rjust(length, b' ')
+
+# Write rows (sequences of values in field order) to a new DBF file
+def writeDBF(dbfFilename, fields, rows):
+    recordLength = 1
+    for name, fieldType, length, decimalCount in fields:
+        recordLength += length
+    headerLength = 32 + 32 * len(fields) + 1
+
+    with open(dbfFilename, 'wb') as f:
+        # the record count is patched in once the rows are written
+        today = datetime.date.today()
+        f.write(struct.pack('<BBBBIHH20x', 3, today.year - 1900, today.month, today.day, 0, headerLength, recordLength))
+        for name, fieldType, length, decimalCount in fields:
+            fieldName = name.encode('ascii')[0:10].ljust(11, b'\0')
+            f.write(struct.pack('<11sc4xBB14x', fieldName, fieldType.encode('ascii'), length, decimalCount))
+        f.write(b'\r')
+
+        recordCount = 0
+        for row in rows:
+            record = [b' ']
+            for value, (name, fieldType, length, decimalCount) in zip(row, fields):
+                record.append(formatDBFValue(value, fieldType, length, decimalCount))
+            f.write(b''.join(record))
+            recordCount += 1
+        f.write(b'\x1a')
+        f.seek(4)
+        f.write(struct.pack('<I', recordCount))
+    return recordCount
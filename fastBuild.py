@@ -0,0 +1,105 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# The --fast-build output profile. GeoPackage layers are normally created with
+# an R-tree spatial index that triggers keep up to date on every insert, and
+# the file is written with SQLite's default journal, sync and cache settings.
+# For a write-once conversion none of that pays off while loading, so the
+# profile:
+#
+#   - creates layers with SPATIAL_INDEX=NO,
+#   - opens the GeoPackage with an in-memory journal, synchronous=OFF, larger
+#     pages and a larger page cache,
+#   - builds each R-tree in one bulk pass once its layer is loaded,
+#   - and finishes the file with ANALYZE, and VACUUM if asked for.
+#
+# The journal is kept in memory rather than turned off so a failed tile can
+# still be rolled back. The result is an ordinary GeoPackage with the
+# gpkg_rtree_index extension registered as usual.
+
+import sys
+
+try:
+    from osgeo import gdal
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+# GDAL configuration used while a fast build GeoPackage is open
+fastBuildConfig = {
+    'OGR_SQLITE_JOURNAL': 'MEMORY',
+    'OGR_SQLITE_SYNCHRONOUS': 'OFF',
+    # megabytes
+    'OGR_SQLITE_CACHE': '256',
+    # page_size only takes effect on a new file
+    'OGR_SQLITE_PRAGMA': 'page_size=65536,temp_store=MEMORY',
+}
+
+# Set the GDAL configuration options in config, returning the previous values
+# for restoreConfigOptions
+def setConfigOptions(config):
+    previousConfig = {}
+    for key, value in config.items():
+        previousConfig[key] = gdal.GetConfigOption(key)
+        gdal.SetConfigOption(key, value)
+    return previousConfig
+
+def restoreConfigOptions(previousConfig):
+    for key, value in previousConfig.items():
+        gdal.SetConfigOption(key, value)
+
+def getLayerCreationOptions(fastBuild):
+    layerOptions = ["FID=id"]
+    if(fastBuild):
+        layerOptions.append("SPATIAL_INDEX=NO")
+    return layerOptions
+
+def getSQLValue(gpkgFile, sql):
+    resultLayer = gpkgFile.ExecuteSQL(sql)
+    if(resultLayer == None):
+        return None
+    value = None
+    feature = resultLayer.GetNextFeature()
+    if(feature != None):
+        value = feature.GetField(0)
+    gpkgFile.ReleaseResultSet(resultLayer)
+    return value
+
+def quoteSQLString(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def hasSpatialIndex(gpkgFile, layerName, geometryColumn):
+    value = getSQLValue(gpkgFile, "SELECT HasSpatialIndex(" + quoteSQLString(layerName) + "," + quoteSQLString(geometryColumn) + ")")
+    return value == 1
+
+# Build the R-tree of a layer that was loaded without one. The GeoPackage
+# driver fills it from the feature table in a single pass.
+def createSpatialIndex(gpkgFile, layerName, geometryColumn):
+    if(geometryColumn == None or geometryColumn == ''):
+        return False
+    if(hasSpatialIndex(gpkgFile, layerName, geometryColumn)):
+        return False
+    getSQLValue(gpkgFile, "SELECT CreateSpatialIndex(" + quoteSQLString(layerName) + "," + quoteSQLString(geometryColumn) + ")")
+    return True
+
+# Refresh the query planner statistics once everything is written and
+# committed, and optionally rewrite the file without free pages.
+def finishGeoPackage(gpkgFile, vacuum=False):
+    getSQLValue(gpkgFile, "ANALYZE")
+    if(vacuum):
+        getSQLValue(gpkgFile, "VACUUM")
@@ -0,0 +1,137 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# The join plan for flattening feature class attributes into features. It is
+# built once per tile: every CNAM of the feature class table maps to a tuple of
+# (output field index, value) with the values already converted to the output
+# field types, and to a template feature with those fields set. Copying a
+# feature is then one dictionary lookup, a clone of the template, and one
+# SetFromWithMap with a field map that was also worked out up front.
+#
+# As in the original per-feature copy, the feature class values win over
+# shapefile fields of the same name: the field map used with a template leaves
+# those fields out, so the shapefile only fills the fields the feature class
+# table doesn't have. Without a feature class table (or a CNAM field) there is
+# nothing to join, so every feature is copied as is and none count as missing.
+
+import sys
+
+try:
+    from osgeo import ogr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+# What to do with a feature whose CNAM isn't in the feature class table:
+#   null   write it with the feature class fields left empty
+#   skip   leave it out of the output
+#   error  fail the tile
+missingCNAMPolicies = ('null', 'skip', 'error')
+
+class MissingCNAMError(Exception):
+    pass
+
+def getTypedValue(value, fieldType):
+    if(value == None):
+        return None
+    try:
+        if(fieldType in (ogr.OFTInteger, ogr.OFTInteger64)):
+            return int(value)
+        if(fieldType == ogr.OFTReal):
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    if(fieldType == ogr.OFTString):
+        return str(value)
+    return value
+
+# fClassTable is the feature class table (see recordCache.py)
+# constantValues (output field name -> value) are set on every feature
+def buildJoinPlan(fClassTable, fieldIndexes, outputLayerDefinition, inputLayerDefinition, missingCNAMPolicy='null', constantValues=None):
+    joinPlan = {}
+    joinPlan['policy'] = missingCNAMPolicy
+    joinPlan['missing'] = 0
+    joinPlan['cnamIndex'] = -1
+    if(len(fClassTable['rows']) > 0):
+        joinPlan['cnamIndex'] = inputLayerDefinition.GetFieldIndex('CNAM')
+
+    # output field for each input field, by name; joinFieldMap skips the
+    # fields the feature class table sets
+    fClassColumns = set(fClassTable['columns'])
+    fieldMap = []
+    joinFieldMap = []
+    for i in range(inputLayerDefinition.GetFieldCount()):
+        fieldName = inputLayerDefinition.GetFieldDefn(i).GetName()
+        fieldIndex = outputLayerDefinition.GetFieldIndex(fieldName)
+        fieldMap.append(fieldIndex)
+        if(fieldName in fClassColumns and fieldName in fieldIndexes):
+            fieldIndex = -1
+        joinFieldMap.append(fieldIndex)
+    joinPlan['fieldMap'] = fieldMap
+    joinPlan['joinFieldMap'] = joinFieldMap
+
+    # (column index, output field index, output field type) of each column that is flattened
+    joinColumns = []
+    for columnIndex, columnName in enumerate(fClassTable['columns']):
+        fieldIndex = fieldIndexes.get(columnName)
+        if(fieldIndex != None):
+            joinColumns.append((columnIndex, fieldIndex, outputLayerDefinition.GetFieldDefn(fieldIndex).GetType()))
+
+    values = {}
+    templates = {}
+    for cnamValue, row in fClassTable['rows'].items():
+        cnamValues = []
+        template = ogr.Feature(outputLayerDefinition)
+        for columnIndex, fieldIndex, fieldType in joinColumns:
+            typedValue = getTypedValue(row[columnIndex], fieldType)
+            if(typedValue == None):
+                continue
+            cnamValues.append((fieldIndex, typedValue))
+            template.SetField(fieldIndex, typedValue)
+        values[cnamValue] = tuple(cnamValues)
+        templates[cnamValue] = template
+    joinPlan['values'] = values
+    joinPlan['templates'] = templates
+    # used for features without a feature class record under the 'null' policy
+    joinPlan['emptyTemplate'] = ogr.Feature(outputLayerDefinition)
+    if(constantValues != None):
+        for template in list(templates.values()) + [joinPlan['emptyTemplate']]:
+            for fieldName, value in constantValues.items():
+                template.SetField(fieldIndexes[fieldName], value)
+    return joinPlan
+
+# Create the output feature for inFeature, or None if the policy says to skip it
+def createJoinedFeature(joinPlan, inFeature):
+    if(joinPlan['cnamIndex'] < 0):
+        outFeature = joinPlan['emptyTemplate'].Clone()
+        outFeature.SetFromWithMap(inFeature, 1, joinPlan['fieldMap'])
+        return outFeature
+    cnamValue = inFeature.GetField(joinPlan['cnamIndex'])
+    template = joinPlan['templates'].get(cnamValue)
+    if(template == None):
+        joinPlan['missing'] += 1
+        if(joinPlan['policy'] == 'skip'):
+            return None
+        if(joinPlan['policy'] == 'error'):
+            raise MissingCNAMError("CNAM " + str(cnamValue) + " is not in the feature class attributes")
+        outFeature = joinPlan['emptyTemplate'].Clone()
+        outFeature.SetFromWithMap(inFeature, 1, joinPlan['fieldMap'])
+        return outFeature
+    outFeature = template.Clone()
+    outFeature.SetFromWithMap(inFeature, 1, joinPlan['joinFieldMap'])
+    return outFeature
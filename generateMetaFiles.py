@@ -25,28 +25,148 @@ try:
 except:
     sys.exit('ERROR: cannot find GDAL/OGR modules')
 from dbfread import DBF
+import concurrent.futures
 
-def generateMetaFiles(cDBRoot):
-    shapeFiles = []
-    shapeExtents = {}
+import shapeHeader
+import tileIndex
+import converter
+import tileSubset
+import archiveInput
+
+# number of shapefiles handed to the scan thread pool at a time
+scanChunkSize = 4096
+
+# The slow path: open the shapefile through OGR and compute the extents.
+def getExtentsFromOGR(shapeFile):
+    try:
+        dataSource = ogr.Open(shapeFile)
+        if(dataSource == None):
+            print("Unable to open " + shapeFile)
+            return None
+        layer = dataSource.GetLayer(0)
+        if(layer == None):
+            print("Unable to read layer from " + shapeFile)
+            return None
+        #envelope = ogr.
+        west,east,south,north = layer.GetExtent(True)
+    except Exception:
+        return None
+    extents = {}
+    extents['north'] = north
+    extents['south'] = south
+    extents['east'] = east
+    extents['west'] = west
+    return extents
+
+# The fast path: the bounding box from the 100 byte .shp header.
+# Only a malformed header falls back to OGR.
+def getExtents(shapeFile, fileSize, useHeaderScan=True):
+    if(not useHeaderScan):
+        return getExtentsFromOGR(shapeFile)
+    header = shapeHeader.readShapeHeader(shapeFile, fileSize, archiveInput.openFile)
+    if(header == None):
+        return getExtentsFromOGR(shapeFile)
+    if(header['empty']):
+        return None
+    extents = {}
+    extents['north'] = header['north']
+    extents['south'] = header['south']
+    extents['east'] = header['east']
+    extents['west'] = header['west']
+    return extents
+
+# Yields (shapeFile, extents) for each (shapeFile, fileSize), reading the headers
+# on scanThreads threads if requested to hide the file system latency.
+def scanExtents(shapeFileSizes, useHeaderScan=True, scanThreads=0):
+    if(scanThreads <= 1):
+        for shapeFile, fileSize in shapeFileSizes:
+            yield shapeFile, getExtents(shapeFile, fileSize, useHeaderScan)
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=scanThreads) as executor:
+        for chunkStart in range(0, len(shapeFileSizes), scanChunkSize):
+            chunk = shapeFileSizes[chunkStart:chunkStart + scanChunkSize]
+            chunkExtents = executor.map(lambda item: getExtents(item[0], item[1], useHeaderScan), chunk)
+            for (shapeFile, fileSize), extents in zip(chunk, chunkExtents):
+                yield shapeFile, extents
+
+# The dataset directory (e.g. 100_GSFeature) the shapefile sits under, if any
+def getDatasetDirectoryName(shapeFile, datasetCode):
+    datasetPrefix = datasetCode[1:] + "_"
+    for directoryName in reversed(os.path.dirname(shapeFile).split(os.sep)):
+        if(directoryName.startswith(datasetPrefix)):
+            return directoryName
+    return None
+
+# Build the index record for a shapefile from the sizes of the files in its directory
+def createTileRecord(shapeFile, directoryFileSizes):
+    tile = {}
+    tile['path'] = shapeFile
+    try:
+        components = converter.getFilenameComponents(shapeFile)
+    except IndexError:
+        # not a CDB tile name, but still converted like any other shapefile
+        components = {'datasetcode': None, 'selector1': None, 'selector2': None, 'lod': None, 'uref': None, 'rref': None}
+    tile.update(components)
+    # e.g. N32W118
+    tile['geocell'] = None
+    if(components['datasetcode'] != None):
+        tile['geocell'] = os.path.basename(shapeFile)[0:7]
+    tile['dataset'] = None
+    if(components['datasetcode'] != None):
+        tile['dataset'] = getDatasetDirectoryName(shapeFile, components['datasetcode'])
+    baseName = os.path.basename(shapeFile)[0:-3]
+    for ext in ('shp', 'shx', 'dbf', 'dbt'):
+        tile[ext + '_size'] = directoryFileSizes.get(baseName + ext, 0)
+    tile['fcattr_size'] = 0
+    fcAttrFilename = converter.getFeatureClassAttrFileName(shapeFile)
+    if(fcAttrFilename != None):
+        tile['fcattr_size'] = directoryFileSizes.get(os.path.basename(fcAttrFilename), 0)
+    tile['extattr_size'] = 0
+    extAttrFilename = converter.getExtendedAttrFileName(shapeFile)
+    if(extAttrFilename != None):
+        tile['extattr_size'] = directoryFileSizes.get(os.path.basename(extAttrFilename), 0)
+    tile['shp_mtime'] = None
+    tile['extents'] = None
+    return tile
+
+def addTilesToIndex(indexCon, tiles, useHeaderScan, scanThreads):
+    shapeFileSizes = []
+    tilesToScan = []
+    for tile in tiles:
+        if(tile['shp_size'] != 0):
+            shapeFileSizes.append((tile['path'], tile['shp_size']))
+            tilesToScan.append(tile)
+    for tile, (shapeFile, extents) in zip(tilesToScan, scanExtents(shapeFileSizes, useHeaderScan, scanThreads)):
+        tile['extents'] = extents
+    tileIndex.addTiles(indexCon, tiles)
+
+# Scan the CDB for shapefiles and write the tile index (see tileIndex.py).
+# Returns the filename of the index.
+# cDBRoot can be the root of an archive (see archiveInput.py), in which case the
+# index goes next to the archive.
+# tileFilter (see tileSubset.py) limits the index to the wanted tiles; directories
+# that can't hold any are not walked at all.
+def generateMetaFiles(cDBRoot, useHeaderScan=True, scanThreads=0, indexFilename=None, tileFilter=None):
     print("Generating metadata files for " + cDBRoot)
     fileCount = 0
     totalSize = 0
+    tileCount = 0
 
     gdal.UseExceptions()
-    #create python file for the dictionary
-
-    # shapeFiles = ['xxx.shp','yyy.shp']
-    metaPath = os.path.join(cDBRoot,'shapemeta.py')
-    shapeMetaData = open(metaPath,'w')
-    shapeMetaData.write('shapeMetaData = {\n')
-
-    pyFile = open(os.path.join(cDBRoot, 'shapeindex.py'),'w')
-    pyFile.write('shapeFiles = [')
-    first = True
-    for root, dirs, files in os.walk(cDBRoot):
-        path = root.split(os.sep)
-        hasShapeFile = False
+    if(indexFilename == None):
+        archivePath = archiveInput.getArchivePath(cDBRoot)
+        if(archivePath != None):
+            indexFilename = archivePath + "." + tileIndex.tileIndexFileName
+        else:
+            indexFilename = tileIndex.getTileIndexPath(cDBRoot)
+    indexCon = tileIndex.createTileIndex(indexFilename)
+
+    # tiles waiting for their extents to be read
+    pendingTiles = []
+    for root, dirs, files in archiveInput.walk(cDBRoot):
+        tileSubset.pruneDirectories(tileFilter, cDBRoot, root, dirs)
+        directoryFileSizes = {}
+        directoryShapeFiles = []
         for file in files:
             base,ext = os.path.splitext(file)
             filePath = os.path.join(root,file)
@@ -55,45 +175,24 @@ def generateMetaFiles(cDBRoot):
             (ext==".dbt") or
             (ext==".shx")):
                 fileCount += 1
-                fileSize = os.path.getsize(filePath)
+                fileSize, modifiedTime = archiveInput.getFileStat(filePath)
                 totalSize += fileSize
-                if(ext==".shp"):
-                    if(first != True):
-                        pyFile.write(",")
-                    first = False
-                    # Add this file to the list if it's a shape file
-                    pyFile.write("\n\tr'" + filePath + "'")
-                    shapeFile = filePath
-                    shapeFiles.append(filePath)
-                    if(fileSize==0):
-                        continue
-                    try:
-                        dataSource = ogr.Open(shapeFile)
-                        if(dataSource == None):
-                            print("Unable to open " + shapeFile)
-                            continue
-                        layer = dataSource.GetLayer(0)
-                        if(layer == None):
-                            print("Unable to read layer from " + shapeFile)
-                            continue
-                        #envelope = ogr.
-                        west,east,south,north = layer.GetExtent(True)
-                        extents = {}
-                        extents['north'] = north
-                        extents['south'] = south
-                        extents['east'] = east
-                        extents['west'] = west
-                        shapeExtents[shapeFile] = extents
-                        if(west != 0):
-                            shapeMetaData.write("r'{}': ".format(shapeFile))
-                            shapeMetaData.write("[{},{},{},{}],\n".format(north,south,east,west))
-                    except Exception:
-                        pass
-
-    pyFile.write(']\n')
-    shapeMetaData.write("'' : [0,0,0,0]\n")
-    shapeMetaData.write('}')
-    shapeMetaData.close()
+                directoryFileSizes[file] = fileSize
+                if(ext==".shp" and tileSubset.acceptTileName(tileFilter, filePath)):
+                    directoryShapeFiles.append((filePath, modifiedTime))
+        for shapeFile, modifiedTime in directoryShapeFiles:
+            tile = createTileRecord(shapeFile, directoryFileSizes)
+            tile['shp_mtime'] = modifiedTime
+            pendingTiles.append(tile)
+        if(len(pendingTiles) >= scanChunkSize):
+            addTilesToIndex(indexCon, pendingTiles, useHeaderScan, scanThreads)
+            tileCount += len(pendingTiles)
+            pendingTiles = []
+    addTilesToIndex(indexCon, pendingTiles, useHeaderScan, scanThreads)
+    tileCount += len(pendingTiles)
+    tileIndex.finishTileIndex(indexCon)
+
     print("Total File Count:" + str(fileCount))
     print("Total File Size:" + str(totalSize))
-    return shapeFiles
+    print("Total Shapefile Count:" + str(tileCount))
+    return indexFilename
@@ -0,0 +1,189 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Optional geometry stage of the feature copy, for tiles at coarse LODs that
+# don't need full double precision coordinates or every vertex:
+#
+#   quantize   snap x and y to a grid of 1/quantizationSubdivisions of the LOD's
+#              sample spacing (1/1024 of a tile), so coarser LODs get a
+#              coarser grid. Tiles are wider in longitude away from the
+#              equator, and so is the x spacing of their grid.
+#   simplify   Douglas-Peucker simplify lines and polygons, keeping their
+#              topology, to simplifyTolerance sample spacings (the latitude
+#              spacing, the smaller of the two)
+#
+# Geometries are transformed a batch at a time: the WKB of the batch is parsed
+# with shapely, the coordinates of the whole batch are snapped as one NumPy
+# array, and GEOS simplifies the lines and polygons of the batch in one call
+# (with a tolerance of 0 when only quantizing, which drops the vertices that
+# snapping made repeated). shapely 2 and NumPy are optional; without them the
+# stage isn't available.
+#
+# Each plan counts the features, vertices and WKB bytes going in and out and
+# the time spent, which are added to the tile counters per LOD (see
+# addTransformCounters) and reported by printTransformSummary.
+
+import sys
+import time
+
+try:
+    import numpy
+    import shapely
+except ImportError:
+    shapely = None
+
+try:
+    from osgeo import ogr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+import tileSubset
+
+# samples across a tile at every LOD
+lodSamples = 1024
+# grid cells per sample spacing when quantizing
+quantizationSubdivisions = 16
+# simplify tolerance in sample spacings
+simplifyTolerance = 0.5
+# features transformed at a time by the feature at a time copy
+featureBatchSize = 4096
+
+# shapely type ids of the geometries that get simplified
+simplifiedTypeIds = (1, 2, 3, 5, 6)
+
+transformCounters = ('features', 'verticesIn', 'verticesOut', 'bytesIn', 'bytesOut', 'seconds', 'copySeconds')
+
+def isAvailable():
+    return shapely != None and hasattr(shapely, 'set_coordinates')
+
+# Degrees of longitude and of latitude between samples at a LOD, for a tile of
+# the geocell at latitude lat (see tileSubset.getGeocellWidth); LOD is negative
+# for the LC levels. Without a latitude, both are the latitude spacing.
+def getLODSpacing(lod, lat=None):
+    ySpacing = 1.0 / (lodSamples * (2.0 ** lod))
+    if(lat == None):
+        return ySpacing, ySpacing
+    return ySpacing * tileSubset.getGeocellWidth(lat), ySpacing
+
+# The transform for a tile of one LOD (e.g. 'L02' or 'LC03') in the geocell at
+# latitude lat, or None when there is nothing to do or shapely isn't available
+def createTransformPlan(lodName, quantize=False, simplify=False, lat=None):
+    if(not (quantize or simplify) or not isAvailable()):
+        return None
+    lod = tileSubset.parseLOD(lodName)
+    if(lod == None):
+        return None
+    xSpacing, ySpacing = getLODSpacing(lod, lat)
+    plan = {}
+    plan['lod'] = lodName
+    # (x, y) cell size
+    plan['grid'] = None
+    if(quantize):
+        plan['grid'] = (xSpacing / quantizationSubdivisions, ySpacing / quantizationSubdivisions)
+    plan['tolerance'] = 0.0
+    if(simplify):
+        plan['tolerance'] = ySpacing * simplifyTolerance
+    for counter in transformCounters:
+        plan[counter] = 0
+    return plan
+
+# Snap the x and y of every coordinate of the geometries to the (x, y) grid in one go
+def quantizeGeometries(geometries, grid):
+    includeZ = bool(shapely.has_z(geometries).any())
+    coordinates = shapely.get_coordinates(geometries, include_z=includeZ)
+    grid = numpy.array(grid)
+    coordinates[:, 0:2] = numpy.round(coordinates[:, 0:2] / grid) * grid
+    return shapely.set_coordinates(geometries, coordinates)
+
+# Transform an array of WKB values (None for no geometry), returning the new WKB
+# values in a NumPy object array
+def transformWKB(plan, wkbValues):
+    startTime = time.perf_counter()
+    plan['bytesIn'] += getWKBBytes(wkbValues)
+    geometries = shapely.from_wkb(wkbValues)
+    includeZ = bool(shapely.has_z(geometries).any())
+    plan['features'] += len(geometries)
+    plan['verticesIn'] += int(shapely.get_num_coordinates(geometries).sum())
+    if(plan['grid'] != None):
+        geometries = quantizeGeometries(geometries, plan['grid'])
+    simplified = numpy.isin(shapely.get_type_id(geometries), simplifiedTypeIds)
+    if(simplified.any()):
+        geometries[simplified] = shapely.simplify(geometries[simplified], plan['tolerance'], preserve_topology=True)
+    plan['verticesOut'] += int(shapely.get_num_coordinates(geometries).sum())
+    wkbValues = shapely.to_wkb(geometries, output_dimension=3 if includeZ else 2)
+    plan['bytesOut'] += getWKBBytes(wkbValues)
+    plan['seconds'] += time.perf_counter() - startTime
+    return wkbValues
+
+def getWKBBytes(wkbValues):
+    return sum(len(wkb) for wkb in wkbValues if wkb != None)
+
+# Transform the geometries of a list of OGR features in place
+def transformFeatures(plan, features):
+    wkbValues = numpy.empty(len(features), dtype=object)
+    for featureNum, feature in enumerate(features):
+        geometry = feature.GetGeometryRef()
+        if(geometry != None):
+            wkbValues[featureNum] = geometry.ExportToIsoWkb()
+    wkbValues = transformWKB(plan, wkbValues)
+    for feature, wkb in zip(features, wkbValues):
+        if(wkb != None):
+            feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(wkb))
+
+# Add the counters of a plan to tileStats, as geometry.<LOD>.<counter>
+def addTransformCounters(tileStats, plan):
+    for counter in transformCounters:
+        key = 'geometry.' + plan['lod'] + '.' + counter
+        tileStats[key] = tileStats.get(key, 0) + plan[counter]
+
+# The per LOD totals of addTransformCounters in a summary's counters
+def getTransformTotals(counters):
+    lodTotals = {}
+    for key, value in counters.items():
+        keyParts = key.split('.')
+        if(len(keyParts) != 3 or keyParts[0] != 'geometry'):
+            continue
+        lodTotals.setdefault(keyParts[1], {})[keyParts[2]] = value
+    return lodTotals
+
+def getLODSortKey(lodName):
+    lod = tileSubset.parseLOD(lodName)
+    if(lod == None):
+        return 0
+    return lod
+
+def printTransformSummary(counters):
+    lodTotals = getTransformTotals(counters)
+    if(len(lodTotals) == 0):
+        return
+    print("Geometry Transform")
+    print("  {:5s} {:>10s} {:>12s} {:>12s} {:>9s} {:>14s} {:>14s}".format('LOD', 'Features', 'Vertices', 'WKB MB', 'Reduced', 'Transform f/s', 'Copy f/s'))
+    for lodName in sorted(lodTotals.keys(), key=getLODSortKey):
+        totals = lodTotals[lodName]
+        features = totals.get('features', 0)
+        bytesIn = totals.get('bytesIn', 0)
+        bytesOut = totals.get('bytesOut', 0)
+        reduction = 0.0
+        if(bytesIn > 0):
+            reduction = 100.0 * (bytesIn - bytesOut) / bytesIn
+        transformRate = features / totals['seconds'] if totals.get('seconds', 0) > 0 else 0
+        copyRate = features / totals['copySeconds'] if totals.get('copySeconds', 0) > 0 else 0
+        print("  {:5s} {:10d} {:12s} {:12s} {:8.1f}% {:14.0f} {:14.0f}".format(lodName, features,
+            str(totals.get('verticesOut', 0)) + "/" + str(totals.get('verticesIn', 0)),
+            "{:.1f}/{:.1f}".format(bytesOut / 1e6, bytesIn / 1e6), reduction, transformRate, copyRate))
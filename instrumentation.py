@@ -0,0 +1,272 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Timing, counters and profiling for conversion runs.
+#
+# Each tile converted by a worker gets a metrics dictionary (startTile/finishTile)
+# that the conversion code adds stages to with
+#
+#   with instrumentation.stage('featureCopy') as stageMetrics:
+#       ...
+#       stageMetrics['features'] += featureCount
+#
+# Every stage records wall and CPU seconds, the number of times it ran, and the
+# files, features, rows and bytes read and written it reports. When no tile is
+# being measured, stage() does nothing. The metrics travel back to the main
+# process with the tile's results, where a run recorder (createRunMetrics) adds
+# them up and writes them out while the run goes on, either as JSON lines (one
+# per tile, plus aggregates) or as a Prometheus textfile.
+#
+# With profiling on, each tile runs under cProfile and the profiles of the
+# slowest tiles are kept, with a text report next to each.
+
+import os
+import json
+import time
+import heapq
+import pstats
+import cProfile
+import threading
+import contextlib
+
+stageNames = ('scan', 'prefetch', 'dbfRead', 'featureCopy', 'extendedAttributes', 'relationships', 'commit', 'optimize', 'removal', 'flush')
+
+stageCounters = ('files', 'features', 'rows', 'bytesRead', 'bytesWritten')
+
+# seconds between aggregate writes during a run
+defaultMetricsInterval = 30
+
+tileState = threading.local()
+
+def createStageMetrics():
+    stageMetrics = {}
+    stageMetrics['wall'] = 0.0
+    stageMetrics['cpu'] = 0.0
+    stageMetrics['calls'] = 0
+    for counter in stageCounters:
+        stageMetrics[counter] = 0
+    return stageMetrics
+
+def addStageMetrics(stages, otherStages):
+    for stageName, otherMetrics in otherStages.items():
+        stageMetrics = stages.setdefault(stageName, createStageMetrics())
+        for key, value in otherMetrics.items():
+            stageMetrics[key] = stageMetrics.get(key, 0) + value
+
+def startTile(shpFilename):
+    metrics = {}
+    metrics['shapefile'] = shpFilename
+    metrics['stages'] = {}
+    metrics['wallStart'] = time.perf_counter()
+    metrics['cpuStart'] = time.process_time()
+    tileState.metrics = metrics
+
+def finishTile():
+    metrics = getattr(tileState, 'metrics', None)
+    tileState.metrics = None
+    if(metrics == None):
+        return None
+    metrics['wall'] = time.perf_counter() - metrics.pop('wallStart')
+    metrics['cpu'] = time.process_time() - metrics.pop('cpuStart')
+    return metrics
+
+@contextlib.contextmanager
+def stage(stageName, stages=None):
+    if(stages == None):
+        metrics = getattr(tileState, 'metrics', None)
+        if(metrics == None):
+            # nothing is being measured
+            yield createStageMetrics()
+            return
+        stages = metrics['stages']
+    stageMetrics = stages.setdefault(stageName, createStageMetrics())
+    wallStart = time.perf_counter()
+    cpuStart = time.process_time()
+    try:
+        yield stageMetrics
+    finally:
+        stageMetrics['wall'] += time.perf_counter() - wallStart
+        stageMetrics['cpu'] += time.process_time() - cpuStart
+        stageMetrics['calls'] += 1
+
+def getFileSize(filename):
+    if(filename == None):
+        return 0
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+# Profiles kept by this worker process: a heap of (seconds, profile filename)
+workerProfiles = []
+
+def getProfileFilename(profileDir, shpFilename):
+    return os.path.join(profileDir, os.path.basename(shpFilename)[0:-4] + '.prof')
+
+# Call function(*args) under cProfile. The profile is written to profileDir if
+# the call is one of the profileCount slowest this process has seen. Returns
+# the function's result and the profile filename (None if it wasn't kept).
+def runProfiled(profileDir, profileCount, shpFilename, function, *args):
+    profiler = cProfile.Profile()
+    startTime = time.perf_counter()
+    profiler.enable()
+    try:
+        result = function(*args)
+    finally:
+        profiler.disable()
+    seconds = time.perf_counter() - startTime
+    if(len(workerProfiles) >= profileCount and seconds <= workerProfiles[0][0]):
+        return result, None
+    if(not os.path.exists(profileDir)):
+        os.makedirs(profileDir, exist_ok=True)
+    profileFilename = getProfileFilename(profileDir, shpFilename)
+    profiler.dump_stats(profileFilename)
+    heapq.heappush(workerProfiles, (seconds, profileFilename))
+    if(len(workerProfiles) > profileCount):
+        fasterSeconds, fasterFilename = heapq.heappop(workerProfiles)
+        removeFile(fasterFilename)
+    return result, profileFilename
+
+def removeFile(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+# The run recorder, in the main process.
+# metricsFilename: where to write, None for no metrics output. Files ending in
+#   .prom are written as a Prometheus textfile, anything else as JSON lines.
+# profileCount: how many of the slowest tile profiles to keep.
+def createRunMetrics(metricsFilename=None, interval=defaultMetricsInterval, profileCount=0):
+    runMetrics = {}
+    runMetrics['filename'] = metricsFilename
+    runMetrics['prometheus'] = metricsFilename != None and metricsFilename.endswith('.prom')
+    runMetrics['interval'] = interval
+    runMetrics['startTime'] = time.time()
+    runMetrics['lastWrite'] = time.time()
+    runMetrics['tiles'] = {'ok': 0, 'failed': 0}
+    runMetrics['stages'] = {}
+    runMetrics['profileCount'] = profileCount
+    runMetrics['profiles'] = []
+    runMetrics['file'] = None
+    if(metricsFilename != None and not runMetrics['prometheus']):
+        runMetrics['file'] = open(metricsFilename, 'w')
+    return runMetrics
+
+def writeJSONLine(runMetrics, record):
+    runMetrics['file'].write(json.dumps(record) + "\n")
+
+def getAggregateRecord(runMetrics):
+    record = {}
+    record['type'] = 'aggregate'
+    record['time'] = time.time()
+    record['elapsed'] = time.time() - runMetrics['startTime']
+    record['tiles'] = runMetrics['tiles']
+    record['stages'] = runMetrics['stages']
+    return record
+
+prometheusMetrics = [
+    ('wall', 'stage_seconds_total', 'Wall clock seconds spent in each conversion stage'),
+    ('cpu', 'stage_cpu_seconds_total', 'CPU seconds spent in each conversion stage'),
+    ('calls', 'stage_calls_total', 'Number of times each conversion stage ran'),
+    ('files', 'stage_files_total', 'Files processed by each conversion stage'),
+    ('features', 'stage_features_total', 'Features processed by each conversion stage'),
+    ('rows', 'stage_rows_total', 'Attribute rows processed by each conversion stage'),
+    ('bytesRead', 'stage_read_bytes_total', 'Bytes read by each conversion stage'),
+    ('bytesWritten', 'stage_written_bytes_total', 'Bytes written by each conversion stage'),
+]
+
+# The Prometheus textfile collector may read the file at any time, so it is
+# written to a temporary file and moved into place.
+def writePrometheusFile(runMetrics):
+    lines = []
+    lines.append("# HELP cdbconvert_tiles_total Tiles converted, by result")
+    lines.append("# TYPE cdbconvert_tiles_total counter")
+    for status, count in sorted(runMetrics['tiles'].items()):
+        lines.append('cdbconvert_tiles_total{status="' + status + '"} ' + str(count))
+    for key, name, description in prometheusMetrics:
+        lines.append("# HELP cdbconvert_" + name + " " + description)
+        lines.append("# TYPE cdbconvert_" + name + " counter")
+        for stageName, stageMetrics in sorted(runMetrics['stages'].items()):
+            lines.append('cdbconvert_' + name + '{stage="' + stageName + '"} ' + repr(stageMetrics.get(key, 0)))
+    lines.append("# HELP cdbconvert_elapsed_seconds Seconds since the run started")
+    lines.append("# TYPE cdbconvert_elapsed_seconds gauge")
+    lines.append("cdbconvert_elapsed_seconds " + repr(time.time() - runMetrics['startTime']))
+    temporaryFilename = runMetrics['filename'] + '.tmp'
+    with open(temporaryFilename, 'w') as prometheusFile:
+        prometheusFile.write("\n".join(lines) + "\n")
+    os.replace(temporaryFilename, runMetrics['filename'])
+
+def writeAggregate(runMetrics):
+    runMetrics['lastWrite'] = time.time()
+    if(runMetrics['prometheus']):
+        writePrometheusFile(runMetrics)
+    elif(runMetrics['file'] != None):
+        writeJSONLine(runMetrics, getAggregateRecord(runMetrics))
+        runMetrics['file'].flush()
+
+# Add a run level stage (such as the scan), outside any tile
+def addRunStage(runMetrics, stageName, stageMetrics):
+    addStageMetrics(runMetrics['stages'], {stageName: stageMetrics})
+
+# Add the results of a group of tiles (see parallelConvert.convertGroup)
+def recordResults(runMetrics, results):
+    for result in results:
+        if(result['status'] == 'ok'):
+            runMetrics['tiles']['ok'] += 1
+        else:
+            runMetrics['tiles']['failed'] += 1
+        metrics = result.get('metrics')
+        if(metrics != None):
+            addStageMetrics(runMetrics['stages'], metrics['stages'])
+            if(runMetrics['file'] != None):
+                record = {'type': 'tile', 'status': result['status'], 'seconds': result['seconds']}
+                record.update(metrics)
+                writeJSONLine(runMetrics, record)
+        if(result.get('profile') != None and runMetrics['profileCount'] > 0):
+            keepSlowestProfile(runMetrics, result['seconds'], result['profile'])
+    if(time.time() - runMetrics['lastWrite'] >= runMetrics['interval']):
+        writeAggregate(runMetrics)
+
+def keepSlowestProfile(runMetrics, seconds, profileFilename):
+    profiles = runMetrics['profiles']
+    heapq.heappush(profiles, (seconds, profileFilename))
+    if(len(profiles) > runMetrics['profileCount']):
+        fasterSeconds, fasterFilename = heapq.heappop(profiles)
+        removeFile(fasterFilename)
+
+def writeProfileReport(profileFilename, lineCount=40):
+    with open(profileFilename[0:-5] + '.txt', 'w') as reportFile:
+        stats = pstats.Stats(profileFilename, stream=reportFile)
+        stats.sort_stats('cumulative').print_stats(lineCount)
+
+# Write the final aggregate and the reports for the slowest tiles' profiles
+def finishRunMetrics(runMetrics):
+    writeAggregate(runMetrics)
+    if(runMetrics['file'] != None):
+        runMetrics['file'].close()
+        runMetrics['file'] = None
+    slowest = sorted(runMetrics['profiles'], reverse=True)
+    slowest = [(seconds, profileFilename) for seconds, profileFilename in slowest if os.path.exists(profileFilename)]
+    for seconds, profileFilename in slowest:
+        writeProfileReport(profileFilename)
+    if(len(slowest) > 0):
+        print("Profiles of the " + str(len(slowest)) + " slowest tiles:")
+        for seconds, profileFilename in slowest:
+            print("  {:8.2f} s {}".format(seconds, profileFilename))
@@ -0,0 +1,258 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Post-build optimizer for converted GeoPackages. The attribute tables are
+# written without any indexes, so every join on CNAM (features to extended
+# attributes) or on PRIM_ID/SEC_ID (relationships) is a full table scan. This
+# pass, run on a closed file:
+#
+#   - indexes the join keys of every feature and attribute table: CNAM, PRIM_ID
+#     and SEC_ID, each followed by UREF and RREF in consolidated files,
+#   - optionally creates a view per feature table joining each feature to its
+#     extended attribute rows, registered in gpkg_contents so GIS clients list it
+#     (relationship tables are written to GeoPackages of their own, so there is
+#     no feature table next to them to join to),
+#   - runs ANALYZE and VACUUM,
+#   - and times a standard set of lookups, one per join key, before and after.
+#
+# It runs inline when a GeoPackage is closed (Convert.py --optimize), or over an
+# existing output tree on a pool of processes:
+#
+# Usage: optimizeGeoPackage.py [--jobs N] [--views] [--no-vacuum] <GeoPackage directory or file>
+
+import os
+import sys
+import time
+import sqlite3
+
+import converter
+import consolidate
+import parallelConvert
+
+# columns that attribute tables are joined on
+joinKeyColumns = ('CNAM', 'PRIM_ID', 'SEC_ID')
+
+# key values looked up per join key when timing lookups
+lookupSamples = 3
+
+optimizeCounters = ('files', 'seconds', 'indexes', 'views', 'lookups', 'lookupSecondsBefore', 'lookupSecondsAfter', 'bytesBefore', 'bytesAfter')
+
+def quoteIdentifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def getTableNames(sqliteCon):
+    tableNames = []
+    for tableName, in sqliteCon.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"):
+        if(tableName.startswith('gpkg_') or tableName.startswith('rtree_') or tableName.startswith('sqlite_')):
+            continue
+        tableNames.append(tableName)
+    return tableNames
+
+def getColumnNames(sqliteCon, tableName):
+    return [row[1] for row in sqliteCon.execute("PRAGMA table_info(" + quoteIdentifier(tableName) + ")")]
+
+def getFeatureTableNames(sqliteCon):
+    try:
+        return set(row[0] for row in sqliteCon.execute("SELECT table_name FROM gpkg_contents WHERE data_type='features'"))
+    except sqlite3.OperationalError:
+        return set()
+
+# (table name, key column, index columns) of every join key
+def getJoinKeys(sqliteCon, tableNames):
+    joinKeys = []
+    for tableName in tableNames:
+        columnNames = getColumnNames(sqliteCon, tableName)
+        provenance = [column for column in consolidate.provenanceColumns if column in columnNames]
+        for keyColumn in joinKeyColumns:
+            if(keyColumn in columnNames):
+                joinKeys.append((tableName, keyColumn, [keyColumn] + provenance))
+    return joinKeys
+
+def getIndexName(tableName, indexColumns):
+    return "idx_" + tableName + "_" + "_".join(indexColumns)
+
+def createIndex(sqliteCon, tableName, indexColumns):
+    indexName = getIndexName(tableName, indexColumns)
+    if(sqliteCon.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (indexName,)).fetchone() != None):
+        return False
+    sqliteCon.execute("CREATE INDEX " + quoteIdentifier(indexName) + " ON " + quoteIdentifier(tableName) +
+        " (" + ",".join(quoteIdentifier(column) for column in indexColumns) + ")")
+    return True
+
+# Key values spread through the table to look up
+def getSampleKeys(sqliteCon, tableName, keyColumn):
+    rowCount = sqliteCon.execute("SELECT COUNT(*) FROM " + quoteIdentifier(tableName)).fetchone()[0]
+    sampleKeys = []
+    for sampleNum in range(min(lookupSamples, rowCount)):
+        row = sqliteCon.execute("SELECT " + quoteIdentifier(keyColumn) + " FROM " + quoteIdentifier(tableName) +
+            " LIMIT 1 OFFSET ?", (rowCount * sampleNum // lookupSamples,)).fetchone()
+        if(row != None and row[0] != None):
+            sampleKeys.append(row[0])
+    return sampleKeys
+
+# Run the lookups, returning the seconds they took in total
+def timeLookups(sqliteCon, lookups):
+    startTime = time.perf_counter()
+    for tableName, keyColumn, keyValue in lookups:
+        sqliteCon.execute("SELECT * FROM " + quoteIdentifier(tableName) + " WHERE " + quoteIdentifier(keyColumn) + " = ?", (keyValue,)).fetchall()
+    return time.perf_counter() - startTime
+
+# The extended attributes table for a feature table, named the same but for the selector
+def getExtendedAttrTableName(featureTableName, tableNames):
+    nameParts = featureTableName.split('_')
+    for partNum, namePart in enumerate(nameParts):
+        extendedAttrSelector = converter.getExtendedAttributesSelector(namePart)
+        if(extendedAttrSelector == None):
+            continue
+        extendedAttrTableName = "_".join(nameParts[0:partNum] + [extendedAttrSelector] + nameParts[partNum + 1:])
+        if(extendedAttrTableName in tableNames):
+            return extendedAttrTableName
+    return None
+
+# A view of each feature's extended attribute rows, joined on CNAM (and UREF and
+# RREF in consolidated files), registered as an attributes table
+def createExtendedAttrView(sqliteCon, featureTableName, extendedAttrTableName):
+    viewName = featureTableName + "_EA"
+    if(sqliteCon.execute("SELECT 1 FROM sqlite_master WHERE name=?", (viewName,)).fetchone() != None):
+        return False
+    featureColumns = getColumnNames(sqliteCon, featureTableName)
+    extendedAttrColumns = getColumnNames(sqliteCon, extendedAttrTableName)
+    joinColumns = [column for column in ('CNAM',) + consolidate.provenanceColumns if column in featureColumns and column in extendedAttrColumns]
+    if('CNAM' not in joinColumns):
+        return False
+    joinCondition = " AND ".join("e." + quoteIdentifier(column) + " = f." + quoteIdentifier(column) for column in joinColumns)
+    sqliteCon.execute("CREATE VIEW " + quoteIdentifier(viewName) + " AS SELECT f.rowid AS feature_id, e.* FROM " +
+        quoteIdentifier(featureTableName) + " f JOIN " + quoteIdentifier(extendedAttrTableName) + " e ON " + joinCondition)
+    sqliteCon.execute("INSERT OR IGNORE INTO gpkg_contents (table_name,data_type,identifier,description,last_change) " +
+        "VALUES(?,'attributes',?,?,strftime('%Y-%m-%dT%H:%M:%fZ','now'))",
+        (viewName, viewName, featureTableName + " features with their extended attributes"))
+    return True
+
+def createOptimizeStats():
+    optimizeStats = {}
+    for counter in optimizeCounters:
+        optimizeStats[counter] = 0
+    return optimizeStats
+
+# Optimize one GeoPackage in place. Returns its counters (see optimizeCounters).
+def optimizeGeoPackage(gpkgFilename, createViews=False, vacuum=True):
+    optimizeStats = createOptimizeStats()
+    startTime = time.perf_counter()
+    optimizeStats['files'] = 1
+    optimizeStats['bytesBefore'] = os.path.getsize(gpkgFilename)
+    sqliteCon = sqlite3.connect(gpkgFilename, isolation_level=None)
+    try:
+        tableNames = getTableNames(sqliteCon)
+        joinKeys = getJoinKeys(sqliteCon, tableNames)
+        lookups = []
+        for tableName, keyColumn, indexColumns in joinKeys:
+            for keyValue in getSampleKeys(sqliteCon, tableName, keyColumn):
+                lookups.append((tableName, keyColumn, keyValue))
+        optimizeStats['lookups'] = len(lookups)
+        optimizeStats['lookupSecondsBefore'] = timeLookups(sqliteCon, lookups)
+
+        sqliteCon.execute("BEGIN")
+        for tableName, keyColumn, indexColumns in joinKeys:
+            if(createIndex(sqliteCon, tableName, indexColumns)):
+                optimizeStats['indexes'] += 1
+        if(createViews):
+            for featureTableName in sorted(getFeatureTableNames(sqliteCon)):
+                extendedAttrTableName = getExtendedAttrTableName(featureTableName, tableNames)
+                if(extendedAttrTableName != None and createExtendedAttrView(sqliteCon, featureTableName, extendedAttrTableName)):
+                    optimizeStats['views'] += 1
+        sqliteCon.execute("COMMIT")
+        sqliteCon.execute("ANALYZE")
+        if(vacuum):
+            sqliteCon.execute("VACUUM")
+        optimizeStats['lookupSecondsAfter'] = timeLookups(sqliteCon, lookups)
+    finally:
+        sqliteCon.close()
+    optimizeStats['bytesAfter'] = os.path.getsize(gpkgFilename)
+    optimizeStats['seconds'] = time.perf_counter() - startTime
+    return optimizeStats
+
+# Add the counters of optimizeGeoPackage to tileStats, as optimize.<counter>
+def addOptimizeCounters(tileStats, optimizeStats):
+    for counter in optimizeCounters:
+        key = 'optimize.' + counter
+        tileStats[key] = tileStats.get(key, 0) + optimizeStats[counter]
+
+def printOptimizeSummary(counters):
+    if(counters.get('optimize.files', 0) == 0):
+        return
+    lookups = counters['optimize.lookups']
+    print("GeoPackage Optimization")
+    print("  Files: " + str(counters['optimize.files']))
+    print("  Indexes Created: " + str(counters['optimize.indexes']))
+    print("  Views Created: " + str(counters['optimize.views']))
+    print("  Seconds: {:.1f}".format(counters['optimize.seconds']))
+    print("  Size: {:.1f} MB -> {:.1f} MB".format(counters['optimize.bytesBefore'] / 1e6, counters['optimize.bytesAfter'] / 1e6))
+    if(lookups > 0):
+        print("  Lookup Latency: {:.3f} ms -> {:.3f} ms over {} lookups".format(counters['optimize.lookupSecondsBefore'] * 1000 / lookups,
+            counters['optimize.lookupSecondsAfter'] * 1000 / lookups, lookups))
+
+# The GeoPackages under a directory, leaving out partly written ones
+def findGeoPackages(rootDirectory):
+    if(os.path.isfile(rootDirectory)):
+        yield rootDirectory
+        return
+    for root, dirs, files in os.walk(rootDirectory):
+        dirs.sort()
+        for filename in sorted(files):
+            if(filename.endswith('.gpkg') and not filename.endswith('.partial.gpkg')):
+                yield os.path.join(root, filename)
+
+# The worker for runConversionJobs
+def optimizeFile(gpkgFilename, createViews, vacuum):
+    optimizeStats = optimizeGeoPackage(gpkgFilename, createViews, vacuum)
+    fileStats = {'features': 0}
+    addOptimizeCounters(fileStats, optimizeStats)
+    return fileStats
+
+def optimizeTree(rootDirectory, jobs=1, createViews=False, vacuum=True):
+    groups = ((gpkgFilename, [gpkgFilename]) for gpkgFilename in findGeoPackages(rootDirectory))
+    summary = parallelConvert.runConversionJobs(groups, optimizeFile, (createViews, vacuum), jobs)
+    printOptimizeSummary(summary['counters'])
+    for gpkgFilename, error in summary['errors']:
+        print("  FAILED: " + gpkgFilename)
+    return summary
+
+def main(argv):
+    jobs = 1
+    createViews = False
+    vacuum = True
+    args = list(argv)
+    paths = []
+    while(len(args) > 0):
+        option = args.pop(0)
+        if(option == "--jobs" and len(args) > 0 and args[0].isdigit()):
+            jobs = max(1, int(args.pop(0)))
+        elif(option == "--views"):
+            createViews = True
+        elif(option == "--no-vacuum"):
+            vacuum = False
+        else:
+            paths.append(option)
+    if(len(paths) != 1 or not os.path.exists(paths[0])):
+        print("Usage: optimizeGeoPackage.py [--jobs N] [--views] [--no-vacuum] <GeoPackage directory or file>")
+        return
+    optimizeTree(paths[0], jobs, createViews, vacuum)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,272 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# One write session per output GeoPackage. The file is opened through OGR once,
+# a single transaction covers everything written to it (the feature layer, the
+# extended attributes and relationship tables and their gpkg_contents rows),
+# and it is committed and closed once at the end, instead of opening the file
+# again with sqlite3 for each attribute table, each with its own transaction
+# and fsync.
+#
+# The attribute tables are written by writeDBFTable as aspatial OGR layers of
+# the same data source: a batch of DBF records at a time through the Arrow
+# stream interface when the GDAL build supports it (see arrowCopy.py), with
+# batched INSERTs through sqlite3 otherwise (see writeRowsWithSQLite).
+
+import os
+import sys
+import sqlite3
+
+try:
+    from osgeo import ogr, gdal
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+import archiveInput
+import arrowCopy
+import converter
+import dbfarray
+import fastBuild
+import optimizeGeoPackage
+import instrumentation
+import schemaInference
+
+class OutputSessionError(Exception):
+    pass
+
+# The output field for a DBF field: the column from schemaInference if schema
+# (column name -> column) has it, otherwise the plain type of the DBF field
+def getFieldDefn(field, schema=None):
+    if(schema != None and field.name in schema):
+        return schemaInference.getOGRFieldDefn(schema[field.name])
+    if(field.type in ('F', 'O', 'N')):
+        return ogr.FieldDefn(field.name, ogr.OFTReal)
+    if(field.type == 'I'):
+        return ogr.FieldDefn(field.name, ogr.OFTInteger64)
+    return ogr.FieldDefn(field.name, ogr.OFTString)
+
+# Add fieldDefn to layer, or if layer already has a field of that name (e.g. a
+# consolidated layer another tile was written to first) widen that field to take
+# fieldDefn's values as well, so none of them are truncated or nulled.
+def addOrWidenField(layer, fieldDefn):
+    layerDefinition = layer.GetLayerDefn()
+    fieldIndex = layerDefinition.GetFieldIndex(fieldDefn.GetName())
+    if(fieldIndex < 0):
+        if(layer.CreateField(fieldDefn) != 0):
+            raise OutputSessionError("Unable to add " + fieldDefn.GetName() + " to " + layer.GetName())
+        return
+    existingColumn = schemaInference.getFieldColumn(layerDefinition.GetFieldDefn(fieldIndex))
+    column = schemaInference.getFieldColumn(fieldDefn)
+    if(existingColumn == None or column == None):
+        return
+    widenedColumn = schemaInference.widenColumn(existingColumn, column)
+    if(widenedColumn == existingColumn):
+        return
+    flags = ogr.ALTER_TYPE_FLAG | ogr.ALTER_WIDTH_PRECISION_FLAG
+    if(layer.AlterFieldDefn(fieldIndex, schemaInference.getOGRFieldDefn(widenedColumn), flags) != 0):
+        raise OutputSessionError("Unable to widen " + fieldDefn.GetName() + " of " + layer.GetName() + " to " + widenedColumn['type'])
+
+# The session's attribute table tableName, created the first time it is asked
+# for and given (or widened to) fieldDefns. Tables that aren't added
+# to gpkg_contents are written as unregistered aspatial tables. A table
+# already in the file (e.g. written before writeRowsWithSQLite opened the file
+# again) is appended to.
+def getAttributeLayer(session, tableName, description, addToGeoPackageContents, fieldDefns):
+    layer = session['attributeLayers'].get(tableName)
+    if(layer == None):
+        layer = session['dataSource'].GetLayerByName(tableName)
+        if(layer != None):
+            session['attributeLayers'][tableName] = layer
+    if(layer == None):
+        creationOptions = ['FID=ID', 'IDENTIFIER=' + tableName, 'DESCRIPTION=' + tableName + " " + description]
+        if(not addToGeoPackageContents):
+            creationOptions.append('ASPATIAL_VARIANT=NOT_REGISTERED')
+        layer = session['dataSource'].CreateLayer(tableName, None, ogr.wkbNone, creationOptions)
+        if(layer == None):
+            raise OutputSessionError("Unable to create " + tableName + " in " + session['filename'])
+        session['attributeLayers'][tableName] = layer
+    for fieldDefn in fieldDefns:
+        addOrWidenField(layer, fieldDefn)
+    return layer
+
+# Write the records of a DBF opened by dbfarray a batch at a time, each column
+# converted as a whole to the type of its output field
+def writeRowsWithArrow(layer, dbfArray, extraColumns):
+    layerDefinition = layer.GetLayerDefn()
+    columnNames = [field.name for field in dbfArray['fields']] + [name for name, value in extraColumns]
+    arrowTypes = []
+    for columnName in columnNames:
+        arrowTypes.append(arrowCopy.getArrowType(layerDefinition.GetFieldDefn(layerDefinition.GetFieldIndex(columnName))))
+    for columns in dbfarray.iterateColumnBatches(dbfArray):
+        arrays = []
+        for columnName, field in zip(dbfArray['columns'], dbfArray['fields']):
+            arrays.append(arrowCopy.getDBFColumnArray(columns[columnName], field, dbfArray['encoding']))
+        rowCount = len(arrays[0])
+        if(rowCount == 0):
+            continue
+        for name, value in extraColumns:
+            arrays.append(pyarrow.array([value] * rowCount, type=pyarrow.int64()))
+        for columnNum, arrowType in enumerate(arrowTypes):
+            if(arrowType != None and arrays[columnNum].type != arrowType):
+                arrays[columnNum] = arrays[columnNum].cast(arrowType)
+        layer.WritePyArrow(pyarrow.RecordBatch.from_arrays(arrays, names=columnNames))
+
+# Write rows to the table tableName with one bound INSERT executed for a batch
+# of rows at a time, for GDAL builds without the Arrow stream interface, where
+# OGR would write them one feature at a time. sqlite3 can't write through the
+# session's connection, so the session's transaction is committed and the file
+# closed while the rows are inserted in a transaction of their own, and then
+# the file is opened again and a new session transaction started. A tile that
+# fails after this keeps what was committed, so an output that must be all or
+# nothing is written to a partial file (see Convert.replaceOutput).
+def writeRowsWithSQLite(session, tableName, columnNames, rowBatches):
+    dataSource = session['dataSource']
+    session['dataSource'] = None
+    session['attributeLayers'] = {}
+    dataSource.CommitTransaction()
+    dataSource = None
+    sqliteCon = sqlite3.connect(session['filename'])
+    try:
+        if(session['options']['fastBuild']):
+            converter.applyBulkLoadPragmas(sqliteCon)
+        cursor = sqliteCon.cursor()
+        cursor.execute("BEGIN TRANSACTION")
+        converter.insertRows(cursor, converter.getInsertString(tableName, columnNames), rowBatches)
+        # OGR counts the features again instead of trusting a stale count
+        if(cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='gpkg_ogr_contents'").fetchone() != None):
+            cursor.execute("UPDATE gpkg_ogr_contents SET feature_count = NULL WHERE lower(table_name) = lower(?)", (tableName,))
+        cursor.execute("COMMIT TRANSACTION")
+    finally:
+        sqliteCon.close()
+    dataSource = openDataSource(session['filename'], session['options'])
+    if(dataSource == None):
+        raise OutputSessionError("Unable to open " + session['filename'] + " again after writing " + tableName)
+    session['dataSource'] = dataSource
+    dataSource.StartTransaction()
+
+# Write a DBF into the session as the attribute table tableName, appending to
+# it if the session already wrote that table (adding or widening columns).
+# extraColumns is a list of (column name, value) pairs added to every row.
+# schema, if given, is the column list from schemaInference.getDBFSchema; with
+# inferSchema it is worked out here, from the same read as the rows.
+# Returns the DBF fields written, or None for a DBF without records.
+def writeDBFTable(session, dbfFilename, tableName, description, addToGeoPackageContents=True, extraColumns=None, schema=None, inferSchema=False):
+    if(extraColumns == None):
+        extraColumns = []
+    dbfArray = None
+    if(dbfarray.isAvailable()):
+        dbfArray = archiveInput.openDBFArray(dbfFilename)
+        if(not dbfarray.canDecode(dbfArray) or len(dbfArray['fields']) == 0):
+            dbfArray = None
+    if(dbfArray != None):
+        dbfFields = dbfArray['fields']
+        recordCount = dbfArray['numrecords']
+        if(inferSchema and recordCount > 0):
+            schema = schemaInference.getDBFArraySchema(dbfArray)
+    else:
+        if(inferSchema):
+            schema = schemaInference.getDBFSchema(dbfFilename)
+        dbfFields, recordCount, rowBatches = converter.openDBFRowBatches(dbfFilename)
+    if(recordCount == 0):
+        return None
+    if(schema != None):
+        schema = schemaInference.getColumnsByName(schema)
+    fieldDefns = [getFieldDefn(field, schema) for field in dbfFields]
+    fieldDefns += [ogr.FieldDefn(name, ogr.OFTInteger) for name, value in extraColumns]
+    layer = getAttributeLayer(session, tableName, description, addToGeoPackageContents, fieldDefns)
+    if(dbfArray != None and arrowCopy.isArrowCopySupported()):
+        writeRowsWithArrow(layer, dbfArray, extraColumns)
+        return list(dbfFields)
+    if(dbfArray != None):
+        rowBatches = dbfarray.iterateRowBatches(dbfArray, converter.insertBatchSize)
+    # the layer keeps the data source open
+    layer = None
+    columnNames = [field.name for field in dbfFields] + [name for name, value in extraColumns]
+    writeRowsWithSQLite(session, tableName, columnNames, converter.addConstantColumns(rowBatches, extraColumns))
+    return list(dbfFields)
+
+# Open (or create) gpkgFilename through OGR. options are Convert.py's
+# conversion options.
+def openDataSource(gpkgFilename, options):
+    previousConfig = {}
+    if(options['fastBuild']):
+        # read by the driver when the file is opened
+        previousConfig = fastBuild.setConfigOptions(fastBuild.fastBuildConfig)
+    try:
+        if(os.path.exists(gpkgFilename)):
+            return gdal.OpenEx(gpkgFilename, gdal.OF_VECTOR | gdal.OF_UPDATE, allowed_drivers=["GPKG"])
+        return ogr.GetDriverByName("GPKG").CreateDataSource(gpkgFilename)
+    finally:
+        fastBuild.restoreConfigOptions(previousConfig)
+
+# Open (or create) gpkgFilename and start the session transaction.
+# options are Convert.py's conversion options.
+def openOutputSession(gpkgFilename, options):
+    dataSource = openDataSource(gpkgFilename, options)
+    if(dataSource == None):
+        print("Unable to open " + gpkgFilename)
+        return None
+    session = {}
+    session['filename'] = gpkgFilename
+    session['dataSource'] = dataSource
+    session['options'] = options
+    session['initialSize'] = instrumentation.getFileSize(gpkgFilename)
+    # new layers are created without a spatial index and listed in
+    # deferredIndexes, to have their R-trees built in one pass on close
+    session['deferSpatialIndex'] = options['fastBuild'] or options['consolidate'] != None
+    session['deferredIndexes'] = []
+    # attribute table name -> OGR layer, for tables appended to (see writeDBFTable)
+    session['attributeLayers'] = {}
+    dataSource.StartTransaction()
+    return session
+
+# Commit (or roll back) the session and close the file, building any deferred
+# spatial indexes first. With the fast build profile the statistics are
+# refreshed before closing. With the optimize option the closed file is then
+# indexed and compacted, and the counters of optimizeGeoPackage are returned.
+def closeOutputSession(session, commit=True):
+    dataSource = session['dataSource']
+    session['dataSource'] = None
+    session['attributeLayers'] = {}
+    if(not commit):
+        dataSource.RollbackTransaction()
+        dataSource = None
+        return
+    with instrumentation.stage('commit') as stageMetrics:
+        for layerName, geometryColumn in session['deferredIndexes']:
+            fastBuild.createSpatialIndex(dataSource, layerName, geometryColumn)
+        dataSource.CommitTransaction()
+        options = session['options']
+        # the optimizer does its own ANALYZE and VACUUM
+        if((options['fastBuild'] or options['vacuum']) and not options['optimize']):
+            fastBuild.finishGeoPackage(dataSource, options['vacuum'])
+        dataSource = None
+        stageMetrics['files'] += 1
+    optimizeStats = None
+    if(options['optimize']):
+        with instrumentation.stage('optimize') as optimizeMetrics:
+            optimizeStats = optimizeGeoPackage.optimizeGeoPackage(session['filename'], options['optimizeViews'])
+            optimizeMetrics['files'] += 1
+    stageMetrics['bytesWritten'] += max(0, instrumentation.getFileSize(session['filename']) - session['initialSize'])
+    return optimizeStats
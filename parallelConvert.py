@@ -0,0 +1,279 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+import time
+import traceback
+import collections
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+# Group shapefiles by the GeoPackage they are written into. A group is the unit
+# of work handed to a worker process, so two workers never write the same file.
+# Yields (outputPath, shapeFiles) as it goes so the whole tile list is never held
+# in memory, which means shapeFiles must be ordered so that files sharing an
+# output are next to each other.
+def groupShapeFilesByOutput(shapeFiles, getOutputPath):
+    groupOutputPath = None
+    groupShapeFiles = []
+    for shapeFile in shapeFiles:
+        outputPath = getOutputPath(shapeFile)
+        if(outputPath != groupOutputPath and len(groupShapeFiles) > 0):
+            yield groupOutputPath, groupShapeFiles
+            groupShapeFiles = []
+        groupOutputPath = outputPath
+        groupShapeFiles.append(shapeFile)
+    if(len(groupShapeFiles) > 0):
+        yield groupOutputPath, groupShapeFiles
+
+# Run workerFunction on one shapefile, catching any error so one bad tile doesn't
+# take the rest of the run down with it. workerFunction returns a feature count
+# or a dictionary of counters with at least 'features' in it.
+def convertFile(shapeFile, workerFunction, workerArgs):
+    result = {}
+    result['shapefile'] = shapeFile
+    startTime = time.time()
+    try:
+        tileStats = workerFunction(shapeFile, *workerArgs)
+        result['status'] = 'ok'
+        if(isinstance(tileStats, dict)):
+            result.update(tileStats)
+        else:
+            result['features'] = tileStats or 0
+    except Exception:
+        result['status'] = 'failed'
+        result['features'] = 0
+        result['error'] = traceback.format_exc()
+    result['seconds'] = time.time() - startTime
+    return result
+
+# Call finishFunction with workerArgs once the whole group has been through
+# workerFunction, for work that completes the output as a whole. If it fails,
+# so does every file of the group.
+def finishGroup(results, finishFunction, workerArgs):
+    if(finishFunction == None):
+        return
+    try:
+        finishFunction(*workerArgs)
+    except Exception:
+        error = traceback.format_exc()
+        for result in results:
+            if(result['status'] == 'ok'):
+                result['status'] = 'failed'
+                result['features'] = 0
+                result['error'] = error
+
+# Run workerFunction over every shapefile in the group, then finishFunction if given
+def convertGroup(shapeFiles, workerFunction, workerArgs, finishFunction=None):
+    results = []
+    for shapeFile in shapeFiles:
+        results.append(convertFile(shapeFile, workerFunction, workerArgs))
+    finishGroup(results, finishFunction, workerArgs)
+    return results
+
+# Results failing every file of a group with error
+def getFailedResults(shapeFiles, error):
+    results = []
+    for shapeFile in shapeFiles:
+        results.append({'shapefile': shapeFile, 'status': 'failed', 'features': 0, 'error': error, 'seconds': 0})
+    return results
+
+def getExceptionText(exception):
+    return ''.join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+
+def createSummary():
+    summary = {}
+    summary['groups'] = 0
+    summary['files'] = 0
+    summary['converted'] = 0
+    summary['failed'] = 0
+    summary['features'] = 0
+    summary['counters'] = {}
+    summary['errors'] = []
+    summary['startTime'] = time.time()
+    summary['elapsed'] = 0
+    return summary
+
+def addResultsToSummary(summary, results):
+    summary['groups'] += 1
+    for result in results:
+        summary['files'] += 1
+        summary['features'] += result['features']
+        for key, value in result.items():
+            if(key in ('features', 'seconds') or isinstance(value, bool) or not isinstance(value, (int, float))):
+                continue
+            summary['counters'][key] = summary['counters'].get(key, 0) + value
+        if(result['status'] == 'ok'):
+            summary['converted'] += 1
+        else:
+            summary['failed'] += 1
+            summary['errors'].append((result['shapefile'], result['error']))
+            print("Failed to convert " + result['shapefile'])
+            print(result['error'])
+
+# Add the totals of another summary (e.g. from another process) to summary
+def addSummary(summary, otherSummary):
+    for key in ('groups', 'files', 'converted', 'failed', 'features'):
+        summary[key] += otherSummary[key]
+    for key, value in otherSummary['counters'].items():
+        summary['counters'][key] = summary['counters'].get(key, 0) + value
+    summary['errors'].extend(otherSummary['errors'])
+
+# Convert the groups on a pool of worker processes. At most maxInFlight groups are
+# submitted at any time so the pending work (and its results) stays bounded no
+# matter how many tiles the CDB has.
+# resultCallback, if given, is called in this process with the results of each group.
+# finishFunction is passed on to convertGroup.
+# memoryBudget, if given, holds back the next group while the groups running
+# would, with it, need more memory than that; getGroupMemory returns what a group
+# needs (see scheduler.py). A group is always started when nothing else is running.
+# A worker process that dies (e.g. a crash inside GDAL) breaks the whole pool,
+# and every group running on it fails with it. Those groups are run again on a
+# fresh pool one at a time, so only the group that actually crashed a worker is
+# reported as failed.
+def runConversionJobs(groups, workerFunction, workerArgs, jobs, maxInFlight=None, resultCallback=None, finishFunction=None,
+        memoryBudget=None, getGroupMemory=None):
+    summary = createSummary()
+    if(maxInFlight == None):
+        maxInFlight = jobs * 4
+    if(memoryBudget != None):
+        # only the groups actually running hold memory, so don't queue any more
+        maxInFlight = min(maxInFlight, jobs)
+        summary['admission'] = {'held': 0, 'heldSeconds': 0.0, 'peakMemory': 0}
+    if(jobs <= 1):
+        for outputPath, shapeFiles in groups:
+            # one group at a time, so there is nothing to hold back; the
+            # estimate only goes into the admission stats
+            if(memoryBudget != None and getGroupMemory != None):
+                summary['admission']['peakMemory'] = max(summary['admission']['peakMemory'], getGroupMemory(shapeFiles))
+            results = convertGroup(shapeFiles, workerFunction, workerArgs, finishFunction)
+            addResultsToSummary(summary, results)
+            if(resultCallback != None):
+                resultCallback(results)
+        summary['elapsed'] = time.time() - summary['startTime']
+        return summary
+
+    groupIterator = iter(groups)
+    inFlight = {}
+    inFlightMemory = 0
+    heldGroup = None
+    heldTime = None
+    # groups that were running when the pool broke, to be run again one at a time
+    retryGroups = collections.deque()
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    try:
+        while True:
+            while(len(inFlight) < maxInFlight):
+                if(len(retryGroups) > 0):
+                    # alone, so that if it breaks the pool again it's the one that crashed
+                    if(len(inFlight) == 0):
+                        shapeFiles, groupMemory = retryGroups.popleft()
+                        future = executor.submit(convertGroup, shapeFiles, workerFunction, workerArgs, finishFunction)
+                        inFlight[future] = (shapeFiles, groupMemory)
+                        inFlightMemory += groupMemory
+                        if(memoryBudget != None):
+                            summary['admission']['peakMemory'] = max(summary['admission']['peakMemory'], inFlightMemory)
+                    break
+                if(heldGroup != None):
+                    shapeFiles, groupMemory = heldGroup
+                else:
+                    nextGroup = next(groupIterator, None)
+                    if(nextGroup == None):
+                        break
+                    outputPath, shapeFiles = nextGroup
+                    groupMemory = 0
+                    if(getGroupMemory != None):
+                        groupMemory = getGroupMemory(shapeFiles)
+                if(memoryBudget != None and len(inFlight) > 0 and inFlightMemory + groupMemory > memoryBudget):
+                    if(heldGroup == None):
+                        summary['admission']['held'] += 1
+                        heldTime = time.time()
+                    heldGroup = (shapeFiles, groupMemory)
+                    break
+                if(heldGroup != None):
+                    summary['admission']['heldSeconds'] += time.time() - heldTime
+                    heldGroup = None
+                future = executor.submit(convertGroup, shapeFiles, workerFunction, workerArgs, finishFunction)
+                inFlight[future] = (shapeFiles, groupMemory)
+                inFlightMemory += groupMemory
+                if(memoryBudget != None):
+                    summary['admission']['peakMemory'] = max(summary['admission']['peakMemory'], inFlightMemory)
+            if(len(inFlight) == 0):
+                break
+            done, notDone = concurrent.futures.wait(inFlight.keys(), return_when=concurrent.futures.FIRST_COMPLETED)
+            finished = list(done)
+            if(any(isinstance(future.exception(), BrokenProcessPool) for future in done)):
+                # the rest of the pool's groups have finished or failed with it
+                finished = list(inFlight.keys())
+                concurrent.futures.wait(finished)
+            brokenGroups = []
+            for future in finished:
+                shapeFiles, groupMemory = inFlight.pop(future)
+                inFlightMemory -= groupMemory
+                exception = future.exception()
+                if(isinstance(exception, BrokenProcessPool)):
+                    brokenGroups.append((shapeFiles, groupMemory, exception))
+                    continue
+                if(exception != None):
+                    results = getFailedResults(shapeFiles, getExceptionText(exception))
+                else:
+                    results = future.result()
+                addResultsToSummary(summary, results)
+                if(resultCallback != None):
+                    resultCallback(results)
+            if(len(brokenGroups) > 0):
+                # a dead worker breaks the whole pool; start a fresh one for the rest
+                executor.shutdown(wait=False)
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+            if(len(brokenGroups) == 1):
+                # the only group running, so the one that crashed its worker
+                shapeFiles, groupMemory, exception = brokenGroups[0]
+                results = getFailedResults(shapeFiles, getExceptionText(exception))
+                addResultsToSummary(summary, results)
+                if(resultCallback != None):
+                    resultCallback(results)
+            elif(len(brokenGroups) > 1):
+                for shapeFiles, groupMemory, exception in brokenGroups:
+                    retryGroups.append((shapeFiles, groupMemory))
+    finally:
+        executor.shutdown(wait=True)
+    summary['elapsed'] = time.time() - summary['startTime']
+    return summary
+
+def printConversionSummary(summary):
+    elapsed = summary['elapsed']
+    print("Conversion Summary")
+    print("  Output Files: " + str(summary['groups']))
+    print("  Shapefiles: " + str(summary['files']))
+    print("  Converted: " + str(summary['converted']))
+    print("  Failed: " + str(summary['failed']))
+    print("  Features: " + str(summary['features']))
+    for key in sorted(summary['counters'].keys()):
+        # dotted counters (e.g. geometry.L02.bytesIn) have reports of their own
+        if('.' in key):
+            continue
+        print("  " + key + ": " + str(summary['counters'][key]))
+    if('admission' in summary):
+        admission = summary['admission']
+        print("  Peak Estimated Memory: {:.0f} MB".format(admission['peakMemory'] / (1024 * 1024)))
+        print("  Held for Memory: {} groups, {:.1f} s".format(admission['held'], admission['heldSeconds']))
+    print("  Elapsed Seconds: {:.1f}".format(elapsed))
+    if(elapsed > 0):
+        print("  Shapefiles/sec: {:.1f}".format(summary['files'] / elapsed))
+    for shapeFile, error in summary['errors']:
+        print("  FAILED: " + shapeFile)
@@ -0,0 +1,259 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Pipelined conversion for CDBs on network file systems, where the latency of
+# every read and write costs more than the conversion itself. Three stages run
+# at the same time:
+#
+#   prefetch  a pool of threads copies the component files of the next tiles
+#             (.shp, .shx, .dbf, the feature class and extended attributes
+#             tables) into a local staging directory
+#   convert   the calling thread converts the staged tiles, in order, into
+#             GeoPackages in the staging directory
+#   flush     a writer thread copies each finished GeoPackage to the output
+#             directory and, with removeConverted, removes the original files
+#
+# Both hand-offs are bounded: at most prefetchDepth tiles (and roughly
+# prefetchBytes) are staged ahead of the converter, and at most writerDepth
+# finished GeoPackages wait for the writer, so the staging space stays capped
+# however large the CDB is. The time each stage spends waiting on its
+# neighbours is recorded, which shows where the pipeline is stalled.
+#
+# Staging is on the local file system rather than in GDAL's /vsimem/ because
+# the DBF readers (dbfread and dbfarray) need real files; put the staging
+# directory on a tmpfs to keep it in memory.
+
+import os
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import collections
+import concurrent.futures
+
+import converter
+import archiveInput
+import parallelConvert
+
+defaultPrefetchThreads = 4
+defaultPrefetchDepth = 16
+defaultPrefetchBytes = 1024 * 1024 * 1024
+defaultWriterDepth = 4
+
+shapeFileExtensions = ('.shp', '.shx', '.dbf', '.dbt', '.prj', '.cpg')
+
+def createPipelineStats():
+    pipelineStats = {}
+    pipelineStats['prefetchFiles'] = 0
+    pipelineStats['prefetchBytes'] = 0
+    pipelineStats['prefetchSeconds'] = 0.0
+    # convert waiting for a tile to be staged
+    pipelineStats['prefetchWaitSeconds'] = 0.0
+    # convert waiting for room in the writer queue
+    pipelineStats['writerWaitSeconds'] = 0.0
+    # writer waiting for a finished GeoPackage
+    pipelineStats['writerIdleSeconds'] = 0.0
+    pipelineStats['flushFiles'] = 0
+    pipelineStats['flushBytes'] = 0
+    pipelineStats['flushSeconds'] = 0.0
+    return pipelineStats
+
+# Every input file the conversion of a tile reads
+def getTileComponentFiles(shpFilename):
+    componentFiles = []
+    for ext in shapeFileExtensions:
+        componentFiles.append(shpFilename[0:-4] + ext)
+    if(converter.getSelector2(shpFilename) != "T011"):
+        for dbfFilename in (converter.getFeatureClassAttrFileName(shpFilename), converter.getExtendedAttrFileName(shpFilename)):
+            if(dbfFilename != None):
+                componentFiles.append(dbfFilename)
+                componentFiles.append(dbfFilename[0:-4] + '.dbt')
+    return componentFiles
+
+# Copy a tile into its own directory under the staging directory, keeping its
+# path relative to the CDB root. Runs on a prefetch thread.
+# existingOutput is copied to stagedOutput as well, so tiles are added to an
+# output the same way they would be without the pipeline.
+def stageTile(tileRoot, shpFilename, cdbInputDir, existingOutput=None, stagedOutput=None):
+    startTime = time.time()
+    stagedTile = {}
+    stagedTile['root'] = tileRoot
+    stagedTile['shapefile'] = os.path.join(tileRoot, os.path.relpath(shpFilename, cdbInputDir))
+    stagedTile['files'] = 0
+    stagedTile['bytes'] = 0
+    for componentFile in getTileComponentFiles(shpFilename):
+        if(not archiveInput.isFile(componentFile)):
+            continue
+        stagedTile['bytes'] += archiveInput.copyFile(componentFile, os.path.join(tileRoot, os.path.relpath(componentFile, cdbInputDir)))
+        stagedTile['files'] += 1
+    if(existingOutput != None and os.path.exists(existingOutput)):
+        stagedTile['bytes'] += archiveInput.copyFile(existingOutput, stagedOutput)
+        stagedTile['files'] += 1
+    stagedTile['seconds'] = time.time() - startTime
+    return stagedTile
+
+# The tiles of each group, with the output path of the group and whether the
+# tile is the first or last of it
+def iterateGroupTiles(groups):
+    for outputPath, shapeFiles in groups:
+        for i, shapeFile in enumerate(shapeFiles):
+            yield outputPath, shapeFile, i == 0, i == len(shapeFiles) - 1
+
+# Bytes of the tiles already staged and waiting to be converted
+def getStagedBytes(pending):
+    stagedBytes = 0
+    for outputPath, shapeFile, lastOfGroup, tileRoot, future in pending:
+        if(future.done() and future.exception() == None):
+            stagedBytes += future.result()['bytes']
+    return stagedBytes
+
+# The writer thread: flush each finished group and hand its results back
+def runWriter(writerQueue, doneQueue, pipelineStats, removeFunction):
+    while True:
+        idleStart = time.time()
+        item = writerQueue.get()
+        pipelineStats['writerIdleSeconds'] += time.time() - idleStart
+        if(item == None):
+            return
+        stagedOutput, outputPath, results = item
+        startTime = time.time()
+        converted = [result for result in results if result['status'] == 'ok']
+        try:
+            if(len(converted) > 0 and os.path.exists(stagedOutput)):
+                # a partial copy is never left under the real name
+                partialOutput = outputPath + ".partial"
+                pipelineStats['flushBytes'] += archiveInput.copyFile(stagedOutput, partialOutput)
+                os.replace(partialOutput, outputPath)
+                pipelineStats['flushFiles'] += 1
+            if(removeFunction != None):
+                for result in converted:
+                    removeFunction(result['shapefile'])
+        except Exception as e:
+            for result in converted:
+                result['status'] = 'failed'
+                result['features'] = 0
+                result['error'] = "Unable to write " + outputPath + ": " + str(e)
+        converter.removeFileIfExists(stagedOutput)
+        pipelineStats['flushSeconds'] += time.time() - startTime
+        doneQueue.put(results)
+
+def addDoneResults(summary, doneQueue, resultCallback):
+    while True:
+        try:
+            results = doneQueue.get_nowait()
+        except queue.Empty:
+            return
+        parallelConvert.addResultsToSummary(summary, results)
+        if(resultCallback != None):
+            resultCallback(results)
+
+# Convert the groups (see parallelConvert.groupShapeFilesByOutput) through the
+# pipeline. workerFunction and finishFunction are as in parallelConvert, and are
+# called with the staging directories in place of cdbInputDir and cdbOutputDir.
+# getOutputPath gives the output of an original shapefile, which must be under
+# cdbOutputDir. removeFunction, if given, removes the original files of a tile
+# once its output has been written. stageExistingOutputs copies outputs that
+# already exist into the staging directory before their group is converted.
+# Returns the summary of parallelConvert.runConversionJobs, with the stage
+# timings under 'pipeline'.
+def runPipelinedConversion(groups, workerFunction, cdbInputDir, cdbOutputDir, options, getOutputPath,
+        resultCallback=None, finishFunction=None, removeFunction=None, stageExistingOutputs=True,
+        stagingDir=None, prefetchThreads=defaultPrefetchThreads, prefetchDepth=defaultPrefetchDepth,
+        prefetchBytes=defaultPrefetchBytes, writerDepth=defaultWriterDepth):
+    summary = parallelConvert.createSummary()
+    pipelineStats = createPipelineStats()
+    summary['pipeline'] = pipelineStats
+    stagingRoot = tempfile.mkdtemp(prefix='cdbpipeline', dir=stagingDir)
+    stagingOutputDir = os.path.join(stagingRoot, 'output')
+    writerQueue = queue.Queue(maxsize=writerDepth)
+    doneQueue = queue.Queue()
+    writer = threading.Thread(target=runWriter, args=(writerQueue, doneQueue, pipelineStats, removeFunction))
+    writer.start()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=prefetchThreads)
+    try:
+        tiles = iterateGroupTiles(groups)
+        tileNumber = 0
+        # staged tiles, in order: (output path, shapefile, last of group, staging directory, future)
+        pending = collections.deque()
+        groupResults = []
+        while True:
+            pendingBytes = getStagedBytes(pending)
+            # keep the prefetch queue full, within its bounds
+            while(len(pending) < prefetchDepth and (len(pending) == 0 or pendingBytes < prefetchBytes)):
+                nextTile = next(tiles, None)
+                if(nextTile == None):
+                    break
+                outputPath, shapeFile, firstOfGroup, lastOfGroup = nextTile
+                tileNumber += 1
+                stagedOutput = os.path.join(stagingOutputDir, os.path.relpath(outputPath, cdbOutputDir))
+                existingOutput = None
+                if(firstOfGroup and stageExistingOutputs):
+                    existingOutput = outputPath
+                tileRoot = os.path.join(stagingRoot, 'input', str(tileNumber))
+                future = executor.submit(stageTile, tileRoot, shapeFile, cdbInputDir, existingOutput, stagedOutput)
+                pending.append((outputPath, shapeFile, lastOfGroup, tileRoot, future))
+            if(len(pending) == 0):
+                break
+            outputPath, shapeFile, lastOfGroup, tileRoot, future = pending.popleft()
+            waitStart = time.time()
+            try:
+                stagedTile = future.result()
+                pipelineStats['prefetchWaitSeconds'] += time.time() - waitStart
+                pipelineStats['prefetchFiles'] += stagedTile['files']
+                pipelineStats['prefetchBytes'] += stagedTile['bytes']
+                pipelineStats['prefetchSeconds'] += stagedTile['seconds']
+                result = parallelConvert.convertFile(stagedTile['shapefile'], workerFunction,
+                    (stagedTile['root'], stagingOutputDir, False, options))
+            except Exception as e:
+                result = {'status': 'failed', 'features': 0, 'seconds': 0, 'error': "Unable to read " + shapeFile + ": " + str(e)}
+            shutil.rmtree(tileRoot, ignore_errors=True)
+            result['shapefile'] = shapeFile
+            if('metrics' in result):
+                result['metrics']['shapefile'] = shapeFile
+            groupResults.append(result)
+            if(lastOfGroup):
+                stagedOutput = os.path.join(stagingOutputDir, os.path.relpath(outputPath, cdbOutputDir))
+                parallelConvert.finishGroup(groupResults, finishFunction, (stagingRoot, stagingOutputDir, False, options))
+                waitStart = time.time()
+                writerQueue.put((stagedOutput, outputPath, groupResults))
+                pipelineStats['writerWaitSeconds'] += time.time() - waitStart
+                groupResults = []
+            addDoneResults(summary, doneQueue, resultCallback)
+    finally:
+        executor.shutdown(wait=True)
+        writerQueue.put(None)
+        writer.join()
+        shutil.rmtree(stagingRoot, ignore_errors=True)
+    addDoneResults(summary, doneQueue, resultCallback)
+    summary['elapsed'] = time.time() - summary['startTime']
+    return summary
+
+def printPipelineSummary(summary):
+    pipelineStats = summary.get('pipeline')
+    if(pipelineStats == None):
+        return
+    print("Pipeline")
+    print("  Prefetched: {} files, {:.1f} MB in {:.1f} s".format(pipelineStats['prefetchFiles'],
+        pipelineStats['prefetchBytes'] / 1e6, pipelineStats['prefetchSeconds']))
+    print("  Flushed: {} files, {:.1f} MB in {:.1f} s".format(pipelineStats['flushFiles'],
+        pipelineStats['flushBytes'] / 1e6, pipelineStats['flushSeconds']))
+    print("  Convert waiting for prefetch: {:.1f} s".format(pipelineStats['prefetchWaitSeconds']))
+    print("  Convert waiting for writer: {:.1f} s".format(pipelineStats['writerWaitSeconds']))
+    print("  Writer idle: {:.1f} s".format(pipelineStats['writerIdleSeconds']))
@@ -0,0 +1,215 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# A cache of feature class (T002-T010) tables shared by the tiles a worker
+# converts. A table is held compactly: one tuple of column names, shared by every
+# table with the same fields, and a dictionary of CNAM -> tuple of values in
+# column order, instead of a dictionary per record.
+#
+# The same CNAM rows and model names repeat all over a CDB, so strings are
+# interned and identical rows are shared between cached tables through a row
+# pool. The pool only holds the rows of tables in the cache: each pooled row
+# counts the cached tables using it and is dropped with the last of them, so
+# it stays inside the cache's byte limit and is empty when caching is off.
+# Tables are kept by a hash of the DBF's bytes, not its path: every tile has a
+# feature class DBF of its own, but the tiles of a dataset often have the same
+# one, and a table read for one tile is then reused by the others. They are
+# evicted least recently used first once they hold more than the byte limit.
+
+import sys
+import hashlib
+import threading
+import collections
+
+import dbfarray
+import converter
+import archiveInput
+import schemaInference
+
+# limit on the memory held by cached tables
+defaultCacheBytes = 256 * 1024 * 1024
+
+# rough size of a row pool entry, counted against the cache's byte limit
+pooledRowBytes = 120
+
+cacheLock = threading.Lock()
+# content hash -> table, least recently used first
+cachedTables = collections.OrderedDict()
+cacheStats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+columnPool = {}
+# row -> [row, number of cached tables holding it]
+rowPool = {}
+
+# schema is the table's column list from schemaInference, in column order
+def createFeatureClassTable(columns=(), rows=None, schema=None):
+    table = {}
+    table['columns'] = columns
+    if(rows == None):
+        rows = {}
+    table['rows'] = rows
+    if(schema == None):
+        schema = []
+    table['schema'] = schema
+    return table
+
+def getColumnIndex(table, columnName):
+    try:
+        return table['columns'].index(columnName)
+    except ValueError:
+        return -1
+
+# The values of one column for every row, in the order of table['rows']
+def getColumnValues(table, columnName):
+    columnIndex = getColumnIndex(table, columnName)
+    if(columnIndex < 0):
+        return [None] * len(table['rows'])
+    return [row[columnIndex] for row in table['rows'].values()]
+
+def getSharedColumns(columnNames):
+    columns = tuple(sys.intern(columnName) for columnName in columnNames)
+    return columnPool.setdefault(columns, columns)
+
+def internValue(value):
+    if(isinstance(value, str)):
+        return sys.intern(value)
+    return value
+
+# row with its strings interned, or the same row from the pool if a cached
+# table already has it
+def internRow(row, usePool=True):
+    row = tuple(internValue(value) for value in row)
+    if(not usePool):
+        return row
+    try:
+        entry = rowPool.get(row)
+    except TypeError:
+        # a value that can't be hashed
+        return row
+    if(entry != None):
+        return entry[0]
+    return row
+
+# Count a table that was added to the cache against the pooled rows, or with
+# count -1, one that was evicted. Called with cacheLock held.
+def addPooledRows(table, count):
+    for row in table['rows'].values():
+        try:
+            entry = rowPool.get(row)
+        except TypeError:
+            continue
+        if(entry == None):
+            entry = rowPool[row] = [row, 0]
+        entry[1] += count
+        if(entry[1] <= 0):
+            del rowPool[row]
+
+# Read a feature class DBF into a table. Rows are keyed by CNAM, or by ID or row
+# number for a table without one. usePool shares rows with the cached tables.
+# The number columns are scanned as the rows are read, every row including ones
+# a later row of the same CNAM replaces, to give the table its schema.
+# dbfBytes, if given, is the content of the DBF, already read.
+def readFeatureClassTable(dbfFilename, usePool=True, dbfBytes=None):
+    dbfArray = None
+    if(dbfBytes != None and dbfarray.isAvailable()):
+        dbfArray = dbfarray.openDBFArray(dbfBytes)
+        if(not dbfarray.canDecode(dbfArray)):
+            dbfArray = None
+    if(dbfArray != None):
+        dbfFields = dbfArray['fields']
+        rowBatches = dbfarray.iterateRowBatches(dbfArray, converter.insertBatchSize)
+    else:
+        dbfFields, recordCount, rowBatches = converter.openDBFRowBatches(dbfFilename)
+    columns = getSharedColumns([field.name for field in dbfFields])
+    keyIndex = -1
+    for keyColumn in ('CNAM', 'ID'):
+        if(keyColumn in columns):
+            keyIndex = columns.index(keyColumn)
+            break
+    rows = {}
+    scannedColumns = {}
+    rowNum = 1
+    for batch in rowBatches:
+        schemaInference.scanRows(dbfFields, batch, scannedColumns)
+        for row in batch:
+            row = internRow(row, usePool)
+            if(keyIndex >= 0):
+                rows[row[keyIndex]] = row
+            else:
+                rows[str(rowNum)] = row
+            rowNum += 1
+    return createFeatureClassTable(columns, rows, schemaInference.getSchema(dbfFields, scannedColumns))
+
+# Roughly what the table holds: its rows, their values and their row pool
+# entries. Rows and values shared with other tables are counted for each of
+# them, so this errs on the high side.
+def getTableBytes(table):
+    tableBytes = sys.getsizeof(table['rows'])
+    for row in table['rows'].values():
+        tableBytes += sys.getsizeof(row) + pooledRowBytes
+        for value in row:
+            tableBytes += sys.getsizeof(value)
+    return tableBytes
+
+def getContentKey(dbfBytes):
+    return hashlib.sha1(dbfBytes).digest()
+
+# The table of dbfFilename, from the cache if a DBF with the same bytes was read
+# before. maxBytes of 0 turns caching off.
+# Returns the table and whether it came from the cache.
+def getFeatureClassTable(dbfFilename, maxBytes=defaultCacheBytes):
+    if(maxBytes <= 0):
+        with cacheLock:
+            cacheStats['misses'] += 1
+        return readFeatureClassTable(dbfFilename, False), False
+    dbfBytes = archiveInput.readFileBytes(dbfFilename)
+    contentKey = getContentKey(dbfBytes)
+    with cacheLock:
+        entry = cachedTables.get(contentKey)
+        if(entry != None):
+            cachedTables.move_to_end(contentKey)
+            cacheStats['hits'] += 1
+            return entry[0], True
+        cacheStats['misses'] += 1
+    table = readFeatureClassTable(dbfFilename, True, dbfBytes)
+    tableBytes = getTableBytes(table)
+    with cacheLock:
+        if(contentKey not in cachedTables):
+            cachedTables[contentKey] = (table, tableBytes)
+            cacheStats['bytes'] += tableBytes
+            addPooledRows(table, 1)
+        while(cacheStats['bytes'] > maxBytes and len(cachedTables) > 0):
+            evictedTable, evictedBytes = cachedTables.popitem(last=False)[1]
+            addPooledRows(evictedTable, -1)
+            cacheStats['bytes'] -= evictedBytes
+            cacheStats['evictions'] += 1
+    return table, False
+
+def clearCache():
+    with cacheLock:
+        cachedTables.clear()
+        rowPool.clear()
+        cacheStats['bytes'] = 0
+
+# Hits, misses, evictions, the bytes and tables held, and the rows in the pool
+def getCacheStats():
+    with cacheLock:
+        stats = dict(cacheStats)
+        stats['tables'] = len(cachedTables)
+        stats['pooledRows'] = len(rowPool)
+    return stats
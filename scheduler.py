@@ -0,0 +1,73 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Cost-aware ordering and memory admission for parallel conversion.
+#
+# The tile index already has the size of every component file of a tile, which
+# is a good stand-in for how long the tile takes and how much memory it needs.
+# Dispatching the costliest output GeoPackages first means the long ones start
+# while there is still plenty of other work to fill the other workers, instead
+# of a few giant polygon tiles at the end of the scan order running on their
+# own. The memory estimate lets runConversionJobs hold back a group while the
+# groups already running would take the total over the memory budget.
+#
+# Memory is estimated per tile from what the conversion keeps resident:
+#   the feature class table, read whole into a table of tuples (see recordCache.py)
+#   the features, copied in batches, so at most one batch's worth
+#   the extended attributes, inserted in batches from a memory map
+# plus a fixed allowance for the worker itself. DBFs in an archive input are
+# memory mapped from a temporary copy on disk (see archiveInput.openDBFArray),
+# not read into memory whole, so the same estimate holds for them.
+
+sizeColumns = ['shp_size', 'shx_size', 'dbf_size', 'dbt_size', 'fcattr_size', 'extattr_size']
+
+# bytes of Python objects per byte of feature class DBF
+fcAttrMemoryFactor = 10
+# upper bounds on what the batched stages keep resident
+featureMemoryLimit = 256 * 1024 * 1024
+extAttrMemoryLimit = 64 * 1024 * 1024
+workerMemory = 64 * 1024 * 1024
+
+# SQL for the cost of a tile: the bytes it reads
+tileCostExpression = "(" + " + ".join("IFNULL(" + column + ", 0)" for column in sizeColumns) + ")"
+
+def estimateTileMemory(tile):
+    memory = workerMemory
+    memory += (tile['fcattr_size'] or 0) * fcAttrMemoryFactor
+    memory += min(2 * ((tile['shp_size'] or 0) + (tile['dbf_size'] or 0)), featureMemoryLimit)
+    memory += min(tile['extattr_size'] or 0, extAttrMemoryLimit)
+    return memory
+
+# Order for tileIndex that puts the groups reading the most bytes first.
+# groupColumns are the columns shared by all tiles of an output GeoPackage,
+# tileOrder the order of the tiles within a group.
+def getLargestFirstOrder(groupColumns, tileOrder):
+    groupList = ", ".join(groupColumns)
+    return "SUM(" + tileCostExpression + ") OVER (PARTITION BY " + groupList + ") DESC, " + groupList + ", " + tileOrder
+
+# The memory a group needs, from the sizes in the tile index. Its tiles are
+# converted one at a time, so it's the largest of theirs.
+def getGroupMemory(indexCon, shapeFiles):
+    groupMemory = workerMemory
+    selectString = "SELECT " + ", ".join(sizeColumns) + " FROM tiles WHERE path = ?"
+    for shapeFile in shapeFiles:
+        tile = indexCon.execute(selectString, (shapeFile,)).fetchone()
+        if(tile != None):
+            groupMemory = max(groupMemory, estimateTileMemory(tile))
+    return groupMemory
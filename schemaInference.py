@@ -0,0 +1,266 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Output column types for the feature class (FC) and extended attributes (EA)
+# tables, worked out from whole columns rather than from the first record:
+#
+#   I             integer
+#   N, F          no decimals: integer (64 bit if the field is 10 or more digits
+#                 wide), or real if any value has a fraction or is too big for
+#                 a 64 bit integer; with decimals: real
+#   O, B          real
+#   L             boolean
+#   C, D, other   text, as wide as the DBF field
+#
+# A number field whose values don't parse is text. Blank values don't count, so
+# a column that is blank in its first rows (or in every row) keeps the type its
+# field says instead of falling back to text. With NumPy the number columns are
+# checked a batch at a time through dbfarray; without it, value by value.
+# Feature class tables are scanned as they are read into the record cache, so
+# a cached table comes with its schema (see recordCache.readFeatureClassTable),
+# and extended attribute tables are scanned from the array they are written
+# from (see outputSession.writeDBFTable), so neither is read twice.
+#
+# The schema of a table depends only on that table, so it comes out the same
+# however the tiles are spread over workers. Where several tables go into one
+# output layer (consolidated outputs), the layer's fields are widened to take
+# each table as it is appended (see outputSession.addOrWidenField); widening is
+# the same whichever order the tables come in.
+
+import sys
+import shutil
+import dbfread
+
+import dbfarray
+import archiveInput
+
+try:
+    from osgeo import ogr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# whole numbers from this size up don't fit in an integer64 column
+maxInteger64 = 2 ** 63
+
+# column types from narrowest to widest
+columnTypes = ('boolean', 'integer', 'integer64', 'real', 'text')
+
+def createColumn(name, columnType, width=0, precision=0):
+    column = {}
+    column['name'] = name
+    column['type'] = columnType
+    column['width'] = width
+    column['precision'] = precision
+    return column
+
+def isNumberField(field):
+    return field.type in ('N', 'F')
+
+# The column a DBF field gives before any of its values have been looked at
+def getDeclaredColumn(field):
+    if(field.type == 'I'):
+        return createColumn(field.name, 'integer')
+    if(isNumberField(field)):
+        if(field.decimal_count > 0):
+            return createColumn(field.name, 'real', field.length, field.decimal_count)
+        if(field.length >= 10):
+            return createColumn(field.name, 'integer64')
+        return createColumn(field.name, 'integer')
+    if(field.type in ('O', 'B')):
+        return createColumn(field.name, 'real')
+    if(field.type == 'L'):
+        return createColumn(field.name, 'boolean')
+    return createColumn(field.name, 'text', field.length)
+
+def getTextColumn(field):
+    return createColumn(field.name, 'text', field.length)
+
+def getRealColumn(field):
+    return createColumn(field.name, 'real', field.length, field.decimal_count)
+
+# The wider of two columns of the same name
+def widenColumn(column, otherColumn):
+    if(column == None):
+        return otherColumn
+    columnType = max(column['type'], otherColumn['type'], key=columnTypes.index)
+    width = max(column['width'], otherColumn['width'])
+    precision = max(column['precision'], otherColumn['precision'])
+    return createColumn(column['name'], columnType, width, precision)
+
+# The column of an output field, or None for a type widenColumn doesn't handle
+def getFieldColumn(fieldDefn):
+    fieldType = fieldDefn.GetType()
+    if(fieldType == ogr.OFTInteger and fieldDefn.GetSubType() == ogr.OFSTBoolean):
+        return createColumn(fieldDefn.GetName(), 'boolean')
+    if(fieldType == ogr.OFTInteger):
+        return createColumn(fieldDefn.GetName(), 'integer')
+    if(fieldType == ogr.OFTInteger64):
+        return createColumn(fieldDefn.GetName(), 'integer64')
+    if(fieldType == ogr.OFTReal):
+        return createColumn(fieldDefn.GetName(), 'real', fieldDefn.GetWidth(), fieldDefn.GetPrecision())
+    if(fieldType == ogr.OFTString):
+        return createColumn(fieldDefn.GetName(), 'text', fieldDefn.GetWidth())
+    return None
+
+# The column for a batch of a number field's raw values
+def scanNumberValues(field, values):
+    try:
+        values = dbfarray.decodeNumericColumn(values, field)
+    except (ValueError, OverflowError):
+        return getTextColumn(field)
+    column = getDeclaredColumn(field)
+    if(values.dtype.kind == 'f' and column['type'] != 'real'):
+        values = values[~numpy.isnan(values)]
+        if(not numpy.all(numpy.floor(values) == values)):
+            return getRealColumn(field)
+        # whole numbers that don't fit in a 64 bit integer
+        if(numpy.any(numpy.abs(values) >= maxInteger64)):
+            return getRealColumn(field)
+    return column
+
+def scanDBFArray(dbfArray, scanFields, batchSize=dbfarray.decodeBatchSize):
+    columns = {}
+    if(len(scanFields) == 0):
+        return columns
+    records = dbfArray['records']
+    for batchStart in range(0, dbfArray['numrecords'], batchSize):
+        batch = records[batchStart:batchStart + batchSize]
+        deleted = (batch['_deleted'] == b'*')
+        if(deleted.any()):
+            batch = batch[~deleted]
+        for columnName, field in scanFields:
+            if(field.name in columns and columns[field.name]['type'] in ('real', 'text')):
+                continue
+            if(batch[columnName].dtype.kind != 'S'):
+                continue
+            columns[field.name] = widenColumn(columns.get(field.name), scanNumberValues(field, batch[columnName]))
+    return columns
+
+# The column for one of a number field's values as dbfread returns it
+def scanNumberValue(field, value):
+    if(isinstance(value, int) and abs(value) >= maxInteger64):
+        return getRealColumn(field)
+    if(value == None or isinstance(value, int)):
+        return getDeclaredColumn(field)
+    if(isinstance(value, float)):
+        # whole numbers that don't fit in a 64 bit integer
+        if(field.decimal_count == 0 and value.is_integer() and abs(value) >= maxInteger64):
+            return getRealColumn(field)
+        if(field.decimal_count > 0 or value.is_integer()):
+            return getDeclaredColumn(field)
+        return getRealColumn(field)
+    return getTextColumn(field)
+
+def scanDBFTable(dbfTable, scanFields):
+    columns = {}
+    for record in dbfTable:
+        for field in scanFields:
+            columns[field.name] = widenColumn(columns.get(field.name), scanNumberValue(field, record[field.name]))
+    return columns
+
+def getScanFields(dbfArray):
+    scanFields = []
+    for columnName, field in zip(dbfArray['columns'], dbfArray['fields']):
+        if(isNumberField(field)):
+            scanFields.append((columnName, field))
+    return scanFields
+
+# Scan the number fields of dbfFilename. Returns the DBF fields and the
+# columns found by scanning.
+def scanDBF(dbfFilename):
+    isVirtual = archiveInput.isVirtualPath(dbfFilename)
+    if(dbfarray.isAvailable()):
+        dbfArray = archiveInput.openDBFArray(dbfFilename)
+        if(dbfarray.canDecode(dbfArray)):
+            return dbfArray['fields'], scanDBFArray(dbfArray, getScanFields(dbfArray))
+    localDirectory = None
+    localFilename = dbfFilename
+    if(isVirtual):
+        localDirectory, localFilename = archiveInput.getLocalDBFCopy(dbfFilename)
+    try:
+        dbfTable = dbfread.DBF(localFilename, recfactory=dict)
+        scanFields = [field for field in dbfTable.fields if isNumberField(field)]
+        columns = {}
+        if(len(scanFields) > 0):
+            columns = scanDBFTable(dbfTable, scanFields)
+        return dbfTable.fields, columns
+    finally:
+        if(localDirectory != None):
+            shutil.rmtree(localDirectory, ignore_errors=True)
+
+# Widen columns with a batch of records read as value tuples in field order
+# (see converter.openDBFRowBatches), for tables that are scanned as they are read
+def scanRows(dbfFields, rows, columns):
+    for fieldNum, field in enumerate(dbfFields):
+        if(not isNumberField(field)):
+            continue
+        column = columns.get(field.name)
+        for row in rows:
+            if(column != None and column['type'] in ('real', 'text')):
+                break
+            column = widenColumn(column, scanNumberValue(field, row[fieldNum]))
+        if(column != None):
+            columns[field.name] = column
+    return columns
+
+# The columns of dbfFields in field order, widened by scannedColumns
+def getSchema(dbfFields, scannedColumns):
+    schema = []
+    for field in dbfFields:
+        column = getDeclaredColumn(field)
+        if(field.name in scannedColumns):
+            column = widenColumn(column, scannedColumns[field.name])
+        schema.append(column)
+    return schema
+
+# The columns of a DBF opened by dbfarray, in field order
+def getDBFArraySchema(dbfArray):
+    return getSchema(dbfArray['fields'], scanDBFArray(dbfArray, getScanFields(dbfArray)))
+
+# The columns of dbfFilename in field order
+def getDBFSchema(dbfFilename):
+    dbfFields, scannedColumns = scanDBF(dbfFilename)
+    return getSchema(dbfFields, scannedColumns)
+
+def getColumnsByName(schema):
+    return dict((column['name'], column) for column in schema)
+
+def getOGRFieldDefn(column):
+    columnType = column['type']
+    if(columnType == 'boolean'):
+        fieldDefn = ogr.FieldDefn(column['name'], ogr.OFTInteger)
+        fieldDefn.SetSubType(ogr.OFSTBoolean)
+        return fieldDefn
+    if(columnType == 'integer'):
+        return ogr.FieldDefn(column['name'], ogr.OFTInteger)
+    if(columnType == 'integer64'):
+        return ogr.FieldDefn(column['name'], ogr.OFTInteger64)
+    if(columnType == 'real'):
+        fieldDefn = ogr.FieldDefn(column['name'], ogr.OFTReal)
+        fieldDefn.SetWidth(column['width'])
+        fieldDefn.SetPrecision(column['precision'])
+        return fieldDefn
+    fieldDefn = ogr.FieldDefn(column['name'], ogr.OFTString)
+    fieldDefn.SetWidth(column['width'])
+    return fieldDefn
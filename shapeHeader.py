@@ -0,0 +1,73 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Reads the fixed 100 byte header at the start of a .shp file. The header holds
+# the shape type and the bounding box of every shape in the file, so extents can
+# be had without reading (or even opening) the geometry.
+#
+# Byte 0   File code 9994 (big endian)
+# Byte 24  File length in 16-bit words (big endian)
+# Byte 28  Version 1000 (little endian)
+# Byte 32  Shape type (little endian)
+# Byte 36  Xmin, Ymin, Xmax, Ymax (little endian doubles)
+
+import math
+import struct
+
+shapeHeaderSize = 100
+shapeFileCode = 9994
+shapeFileVersion = 1000
+
+# Parse a header read from the start of a .shp file.
+# Returns None if it isn't a valid shapefile header.
+def parseShapeHeader(header, fileSize=None):
+    if(len(header) < shapeHeaderSize):
+        return None
+    fileCode, = struct.unpack('>i', header[0:4])
+    fileLengthWords, = struct.unpack('>i', header[24:28])
+    version, shapeType = struct.unpack('<ii', header[28:36])
+    if(fileCode != shapeFileCode or version != shapeFileVersion):
+        return None
+    fileLength = fileLengthWords * 2
+    # a truncated file can't be trusted to match its header
+    if(fileSize != None and fileSize < fileLength):
+        return None
+    xmin, ymin, xmax, ymax = struct.unpack('<4d', header[36:68])
+    for value in (xmin, ymin, xmax, ymax):
+        if(math.isnan(value) or math.isinf(value)):
+            return None
+    shapeHeader = {}
+    shapeHeader['shapeType'] = shapeType
+    shapeHeader['fileLength'] = fileLength
+    # a header with no records following it has no meaningful bounding box
+    shapeHeader['empty'] = (fileLength <= shapeHeaderSize or shapeType == 0)
+    shapeHeader['west'] = xmin
+    shapeHeader['south'] = ymin
+    shapeHeader['east'] = xmax
+    shapeHeader['north'] = ymax
+    return shapeHeader
+
+# openFile opens the file for binary reading (e.g. archiveInput.openFile)
+def readShapeHeader(shpFilename, fileSize=None, openFile=open):
+    try:
+        with openFile(shpFilename, 'rb') as f:
+            header = f.read(shapeHeaderSize)
+    except OSError:
+        return None
+    return parseShapeHeader(header, fileSize)
@@ -0,0 +1,248 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Writes a synthetic CDB vector tree for benchmarking and testing the converter
+# without a real CDB. Tiles are LOD 1 (four per geocell), laid out as
+#
+#   <root>/Tiles/N32/W118/101_GTFeature/L01/U0/N32W118_D101_S001_T001_L01_U0_R0.shp
+#
+# and every tile gets each kind of vector file the converter handles:
+#
+#   D101 GTFeature      T001 points, T002 feature classes, T016 extended attributes
+#   D201 RoadNetwork    T003 lineals, T004, T017
+#                       T007 lineal figure points, T008, T019
+#                       T011 relationships (an empty .shp marks the tile, as
+#                       generateMetaFiles only lists shapefiles)
+#   D100 GSFeature      T005 polygons, T006, T018
+#                       T009 polygon figure points, T010, T020
+#
+# The feature class and extended attribute tables have attributeWidth columns
+# besides CNAM. Everything comes from a seeded random generator, so the same
+# arguments give the same CDB.
+#
+# Usage: syntheticCDB.py [--tiles N] [--features N] [--width N] [--seed N] <output directory>
+
+import os
+import sys
+import random
+
+try:
+    from osgeo import ogr, osr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+import converter
+import dbfwriter
+
+# (dataset code, dataset directory, selector1, feature selector, geometry type)
+featureSets = [
+    ('D101', '101_GTFeature', 'S001', 'T001', ogr.wkbPoint),
+    ('D201', '201_RoadNetwork', 'S001', 'T003', ogr.wkbLineString),
+    ('D201', '201_RoadNetwork', 'S001', 'T007', ogr.wkbPoint),
+    ('D100', '100_GSFeature', 'S001', 'T005', ogr.wkbPolygon),
+    ('D100', '100_GSFeature', 'S001', 'T009', ogr.wkbPoint),
+]
+relationshipSet = ('D201', '201_RoadNetwork', 'S001', 'T011')
+
+lod = 'L01'
+tilesPerGeocell = 4
+geocellsPerRow = 20
+
+# feature classes (distinct CNAMs) per tile
+classesPerTile = 16
+
+def getGeocellName(lat, lon):
+    latName = ('N' if lat >= 0 else 'S') + '{:02d}'.format(abs(lat))
+    lonName = ('E' if lon >= 0 else 'W') + '{:03d}'.format(abs(lon))
+    return latName, lonName
+
+# The geocell and UREF/RREF of the tileNum'th tile, and its extents
+def getTileLocation(tileNum):
+    geocellNum = tileNum // tilesPerGeocell
+    lat = 32 + geocellNum // geocellsPerRow
+    lon = -118 + geocellNum % geocellsPerRow
+    uref = (tileNum % tilesPerGeocell) // 2
+    rref = tileNum % 2
+    extents = {}
+    extents['west'] = lon + rref * 0.5
+    extents['east'] = extents['west'] + 0.5
+    extents['south'] = lat + uref * 0.5
+    extents['north'] = extents['south'] + 0.5
+    return lat, lon, uref, rref, extents
+
+def getTileFilename(cdbRoot, tileNum, datasetCode, datasetDirectory, selector1, selector2):
+    lat, lon, uref, rref, extents = getTileLocation(tileNum)
+    latName, lonName = getGeocellName(lat, lon)
+    directory = os.path.join(cdbRoot, 'Tiles', latName, lonName, datasetDirectory, lod, 'U' + str(uref))
+    baseName = "_".join((latName + lonName, datasetCode, selector1, selector2, lod, 'U' + str(uref), 'R' + str(rref)))
+    return os.path.join(directory, baseName + '.shp')
+
+# Columns besides CNAM for the attribute tables, cycling through the DBF types
+def getAttributeFields(prefix, attributeWidth):
+    fields = []
+    for fieldNum in range(attributeWidth):
+        fieldName = prefix + '{:03d}'.format(fieldNum)
+        kind = fieldNum % 3
+        if(kind == 0):
+            fields.append((fieldName, 'N', 10, 3))
+        elif(kind == 1):
+            fields.append((fieldName, 'N', 8, 0))
+        else:
+            fields.append((fieldName, 'C', 24, 0))
+    return fields
+
+def getAttributeValues(fields, rng):
+    values = []
+    for fieldName, fieldType, length, decimalCount in fields:
+        if(fieldType == 'C'):
+            values.append('value_' + str(rng.randrange(1000)))
+        elif(decimalCount > 0):
+            values.append(round(rng.uniform(0, 10000), decimalCount))
+        else:
+            values.append(rng.randrange(100000))
+    return values
+
+def getCNAM(selector2, classNum):
+    return selector2 + '_' + str(classNum)
+
+def getRandomPoint(extents, rng):
+    return rng.uniform(extents['west'], extents['east']), rng.uniform(extents['south'], extents['north'])
+
+def createGeometry(geometryType, extents, rng):
+    if(geometryType == ogr.wkbPoint):
+        x, y = getRandomPoint(extents, rng)
+        geometry = ogr.Geometry(ogr.wkbPoint)
+        geometry.AddPoint_2D(x, y)
+        return geometry
+    size = (extents['east'] - extents['west']) / 200.0
+    x, y = getRandomPoint(extents, rng)
+    if(geometryType == ogr.wkbLineString):
+        geometry = ogr.Geometry(ogr.wkbLineString)
+        for vertexNum in range(8):
+            geometry.AddPoint_2D(x + vertexNum * size, y + rng.uniform(-size, size))
+        return geometry
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for dx, dy in ((0, 0), (size, 0), (size, size), (0, size), (0, 0)):
+        ring.AddPoint_2D(x + dx, y + dy)
+    geometry = ogr.Geometry(ogr.wkbPolygon)
+    geometry.AddGeometry(ring)
+    return geometry
+
+def writeFeatureShapeFile(shpFilename, geometryType, extents, featureCount, rng):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    selector2 = converter.getSelector2(shpFilename)
+    dataSource = ogr.GetDriverByName("ESRI Shapefile").CreateDataSource(shpFilename)
+    layer = dataSource.CreateLayer(os.path.basename(shpFilename)[0:-4], srs, geometryType)
+    layer.CreateField(ogr.FieldDefn('CNAM', ogr.OFTString))
+    layerDefinition = layer.GetLayerDefn()
+    for featureNum in range(featureCount):
+        feature = ogr.Feature(layerDefinition)
+        feature.SetField('CNAM', getCNAM(selector2, rng.randrange(classesPerTile)))
+        feature.SetGeometry(createGeometry(geometryType, extents, rng))
+        layer.CreateFeature(feature)
+    dataSource = None
+
+def writeFeatureClassDBF(dbfFilename, selector2, attributeWidth, rng):
+    fields = [('CNAM', 'C', 32, 0)] + getAttributeFields('FC', attributeWidth)
+    rows = []
+    for classNum in range(classesPerTile):
+        rows.append([getCNAM(selector2, classNum)] + getAttributeValues(fields[1:], rng))
+    return dbfwriter.writeDBF(dbfFilename, fields, rows)
+
+def writeExtendedAttrDBF(dbfFilename, selector2, rowCount, attributeWidth, rng):
+    fields = [('CNAM', 'C', 32, 0)] + getAttributeFields('EA', attributeWidth)
+    rows = ([getCNAM(selector2, rng.randrange(classesPerTile))] + getAttributeValues(fields[1:], rng) for rowNum in range(rowCount))
+    return dbfwriter.writeDBF(dbfFilename, fields, rows)
+
+def writeRelationshipDBF(dbfFilename, rowCount, rng):
+    fields = [('CNAM', 'C', 32, 0), ('PRIM_ID', 'N', 10, 0), ('SEC_ID', 'N', 10, 0), ('RELTYP', 'C', 8, 0)]
+    rows = ([getCNAM('T011', rowNum), rng.randrange(rowCount), rng.randrange(rowCount), 'CONN'] for rowNum in range(rowCount))
+    return dbfwriter.writeDBF(dbfFilename, fields, rows)
+
+def makeParentDirectory(filename):
+    directory = os.path.dirname(filename)
+    if(not os.path.exists(directory)):
+        os.makedirs(directory)
+
+# Write one tile's files. Returns the counts of what was written.
+def writeSyntheticTile(cdbRoot, tileNum, featuresPerTile, attributeWidth, rng):
+    counts = {'shapefiles': 0, 'features': 0, 'dbfRows': 0}
+    lat, lon, uref, rref, extents = getTileLocation(tileNum)
+    for datasetCode, datasetDirectory, selector1, selector2, geometryType in featureSets:
+        shpFilename = getTileFilename(cdbRoot, tileNum, datasetCode, datasetDirectory, selector1, selector2)
+        makeParentDirectory(shpFilename)
+        writeFeatureShapeFile(shpFilename, geometryType, extents, featuresPerTile, rng)
+        counts['shapefiles'] += 1
+        counts['features'] += featuresPerTile
+        counts['dbfRows'] += writeFeatureClassDBF(converter.getFeatureClassAttrFileName(shpFilename), selector2, attributeWidth, rng)
+        counts['dbfRows'] += writeExtendedAttrDBF(converter.getExtendedAttrFileName(shpFilename), selector2, featuresPerTile, attributeWidth, rng)
+
+    datasetCode, datasetDirectory, selector1, selector2 = relationshipSet
+    shpFilename = getTileFilename(cdbRoot, tileNum, datasetCode, datasetDirectory, selector1, selector2)
+    makeParentDirectory(shpFilename)
+    open(shpFilename, 'wb').close()
+    counts['shapefiles'] += 1
+    counts['dbfRows'] += writeRelationshipDBF(shpFilename[0:-3] + 'dbf', max(1, featuresPerTile // 2), rng)
+    return counts
+
+def getDirectorySize(directory):
+    totalSize = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            totalSize += os.path.getsize(os.path.join(root, file))
+    return totalSize
+
+# Write a synthetic CDB of tileCount tiles under cdbRoot.
+# Returns the totals of what was written, with the size in bytes.
+def generateSyntheticCDB(cdbRoot, tileCount, featuresPerTile=1000, attributeWidth=10, seed=0):
+    rng = random.Random(seed)
+    totals = {'tiles': tileCount, 'shapefiles': 0, 'features': 0, 'dbfRows': 0}
+    for tileNum in range(tileCount):
+        counts = writeSyntheticTile(cdbRoot, tileNum, featuresPerTile, attributeWidth, rng)
+        for key, value in counts.items():
+            totals[key] += value
+    totals['bytes'] = getDirectorySize(cdbRoot)
+    return totals
+
+if __name__ == "__main__":
+    tileCount = 16
+    featuresPerTile = 1000
+    attributeWidth = 10
+    seed = 0
+    args = sys.argv[1:]
+    while(len(args) > 1 and args[0].startswith("--") and args[1].isdigit()):
+        option = args.pop(0)
+        value = int(args.pop(0))
+        if(option == "--tiles"):
+            tileCount = value
+        elif(option == "--features"):
+            featuresPerTile = value
+        elif(option == "--width"):
+            attributeWidth = value
+        elif(option == "--seed"):
+            seed = value
+        else:
+            args = []
+    if(len(args) != 1):
+        print("Usage: syntheticCDB.py [--tiles N] [--features N] [--width N] [--seed N] <output directory>")
+        exit()
+    totals = generateSyntheticCDB(args[0], tileCount, featuresPerTile, attributeWidth, seed)
+    print("Wrote {} tiles, {} shapefiles, {} features, {} DBF rows, {:.1f} MB to {}".format(totals['tiles'],
+        totals['shapefiles'], totals['features'], totals['dbfRows'], totals['bytes'] / 1e6, args[0]))
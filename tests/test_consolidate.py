@@ -0,0 +1,61 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Consolidated outputs are named after the dataset code, selectors and LOD
+# their tiles share (and the geocell, per geocell), and every feature or row
+# records the UREF and RREF of the tile it came from.
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+hasGDAL = importlib.util.find_spec('osgeo') != None
+if(hasGDAL):
+    import consolidate
+
+shpFilename = os.path.join('Tiles', 'N32', 'W118', '100_GSFeature', 'L02', 'U3', 'N32W118_D100_S001_T001_L02_U3_R1.shp')
+
+@unittest.skipUnless(hasGDAL, 'GDAL is not installed')
+class ConsolidateTest(unittest.TestCase):
+    def testNames(self):
+        self.assertEqual(consolidate.getConsolidatedName(shpFilename, 'dataset'), 'D100_S001_T001_L02')
+        self.assertEqual(consolidate.getConsolidatedName(shpFilename, 'geocell'), 'N32W118_D100_S001_T001_L02')
+        # the extended attribute table of the feature tile
+        self.assertEqual(consolidate.getConsolidatedName(shpFilename, 'dataset', 'T016'), 'D100_S001_T016_L02')
+        self.assertEqual(consolidate.getConsolidatedGeoPackageFilePath(shpFilename, 'out', 'dataset'),
+            os.path.join('out', 'D100_S001_T001_L02.gpkg'))
+        self.assertEqual(consolidate.getConsolidatedGeoPackageFilePath(shpFilename, 'out', 'geocell'),
+            os.path.join('out', 'N32W118', 'N32W118_D100_S001_T001_L02.gpkg'))
+        self.assertTrue(consolidate.isCDBTileName(shpFilename))
+        self.assertFalse(consolidate.isCDBTileName('notes.shp'))
+
+    def testTileOrder(self):
+        self.assertEqual(consolidate.getTileOrder('dataset'), 'datasetcode, selector1, selector2, lod, id')
+        self.assertEqual(consolidate.getTileOrder('geocell'), 'geocell, datasetcode, selector1, selector2, lod, id')
+
+    def testProvenance(self):
+        self.assertEqual(consolidate.getProvenance(shpFilename), [('UREF', 3), ('RREF', 1)])
+        self.assertEqual(consolidate.getProvenance('N32W118_D100_S001_T001_LC05_U0_R12.shp'), [('UREF', 0), ('RREF', 12)])
+        self.assertEqual(consolidate.getProvenance('N32W118_D100_S001_T001_L02_Ux_R1.shp'), [('UREF', None), ('RREF', 1)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# A rerun with the conversion manifest skips a tile only when its last
+# conversion finished, its output is still there and its inputs haven't
+# changed, by signature or (with content hashes) by content.
+
+import importlib.util
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+hasGDAL = importlib.util.find_spec('osgeo') != None
+if(hasGDAL):
+    import conversionManifest
+
+tileName = 'N32W118_D100_S001_T001_L00_U0_R0'
+
+def writeFile(filename, data):
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+@unittest.skipUnless(hasGDAL, 'GDAL is not installed')
+class ConversionManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp()
+        self.inputDir = os.path.join(self.workDir, 'input')
+        self.outputDir = os.path.join(self.workDir, 'output')
+        os.makedirs(self.inputDir)
+        self.shpFilename = os.path.join(self.inputDir, tileName + '.shp')
+        for ext in ('shp', 'shx', 'dbf'):
+            writeFile(self.shpFilename[0:-3] + ext, ext.encode('ascii') * 10)
+        writeFile(os.path.join(self.inputDir, tileName.replace('T001', 'T002') + '.dbf'), b'feature classes')
+        self.outputFile = os.path.join(self.outputDir, tileName + '.gpkg')
+        self.manifestCon = conversionManifest.openManifest(self.outputDir)
+
+    def tearDown(self):
+        self.manifestCon.close()
+        shutil.rmtree(self.workDir)
+
+    def select(self, useContentHash=False):
+        selectionStats = conversionManifest.createSelectionStats()
+        selected = list(conversionManifest.selectTilesToConvert(self.manifestCon, [self.shpFilename],
+            lambda shpFilename: self.outputFile, useContentHash, selectionStats))
+        return selected, selectionStats
+
+    def finish(self, status='ok'):
+        conversionManifest.recordResults(self.manifestCon, [{'shapefile': self.shpFilename, 'status': status, 'features': 3}])
+        writeFile(self.outputFile, b'gpkg')
+
+    def getStatus(self):
+        return self.manifestCon.execute("SELECT status FROM tiles WHERE shapefile=?", (self.shpFilename,)).fetchone()[0]
+
+    def testSignature(self):
+        signature = conversionManifest.parseTileSignature(conversionManifest.getTileSignature(self.shpFilename))
+        self.assertEqual([entry[0] for entry in signature],
+            [tileName + '.shp', tileName + '.shx', tileName + '.dbf', tileName.replace('T001', 'T002') + '.dbf'])
+        self.assertEqual(signature[0][1], 30)
+
+    def testFinishedTileIsSkipped(self):
+        self.assertEqual(self.select(), ([self.shpFilename], {'skipped': 0, 'selected': 1}))
+        self.assertEqual(self.getStatus(), 'pending')
+        self.finish()
+        self.assertEqual(self.getStatus(), 'done')
+        self.assertEqual(self.select(), ([], {'skipped': 1, 'selected': 0}))
+
+    def testFailedOrMissingOutputIsSelected(self):
+        self.select()
+        self.finish('failed')
+        self.assertEqual(self.select()[0], [self.shpFilename])
+        self.finish()
+        os.remove(self.outputFile)
+        self.assertEqual(self.select()[0], [self.shpFilename])
+
+    def testChangedInputIsSelected(self):
+        self.select()
+        self.finish()
+        writeFile(self.shpFilename, b'changed')
+        self.assertEqual(self.select()[0], [self.shpFilename])
+
+    def testTouchedInputWithContentHash(self):
+        self.select(True)
+        self.finish()
+        fileStat = os.stat(self.shpFilename)
+        os.utime(self.shpFilename, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 1000000000))
+        # same content, so skipped, and the new signature is remembered
+        self.assertEqual(self.select(True), ([], {'skipped': 1, 'selected': 0}))
+        self.assertEqual(self.select(), ([], {'skipped': 1, 'selected': 0}))
+        os.utime(self.shpFilename, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns + 2000000000))
+        self.assertEqual(self.select()[0], [self.shpFilename])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+
+# Number columns that don't fit the int64 fast path of dbfarray.decodeNumericColumn
+# fall back to float64, and schemaInference makes them real columns.
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dbfarray
+
+hasGDAL = importlib.util.find_spec('osgeo') != None
+if(hasGDAL):
+    import schemaInference
+
+if(dbfarray.isAvailable()):
+    import numpy
+
+outOfRangeValues = [b'  99999999999999999999', b'                    12', b'                      ']
+
+@unittest.skipUnless(dbfarray.isAvailable(), 'NumPy is not installed')
+class DecodeNumericColumnTest(unittest.TestCase):
+    def testWholeNumbers(self):
+        field = dbfarray.DBFField('HGT', 'N', 10, 0)
+        values = dbfarray.decodeNumericColumn(numpy.array([b'        12', b'       -34']), field)
+        self.assertEqual(values.dtype, numpy.int64)
+        self.assertEqual(values.tolist(), [12, -34])
+
+    def testOutOfRangeWholeNumbers(self):
+        field = dbfarray.DBFField('HGT', 'N', 22, 0)
+        values = dbfarray.decodeNumericColumn(numpy.array(outOfRangeValues), field)
+        self.assertEqual(values.dtype, numpy.float64)
+        self.assertEqual(values[0], 1e20 - 1)
+        self.assertEqual(values[1], 12.0)
+        self.assertTrue(numpy.isnan(values[2]))
+
+@unittest.skipUnless(dbfarray.isAvailable() and hasGDAL, 'NumPy or GDAL is not installed')
+class ScanNumberValuesTest(unittest.TestCase):
+    def testOutOfRangeWholeNumbersAreReal(self):
+        field = dbfarray.DBFField('HGT', 'N', 22, 0)
+        column = schemaInference.scanNumberValues(field, numpy.array(outOfRangeValues))
+        self.assertEqual(column['type'], 'real')
+        self.assertEqual(schemaInference.scanNumberValue(field, 10 ** 20)['type'], 'real')
+
+if __name__ == '__main__':
+    unittest.main()
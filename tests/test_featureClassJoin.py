@@ -0,0 +1,126 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# The per-feature join (featureClassJoin.py) and the Arrow copy (arrowCopy.py)
+# must write the same features: the same precedence between feature class and
+# shapefile values, and the same handling of an empty feature class table.
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+hasGDAL = importlib.util.find_spec('osgeo') != None
+if(hasGDAL):
+    from osgeo import ogr
+    import arrowCopy
+    import featureClassJoin
+    import recordCache
+
+def createInputLayer(dataSource):
+    layer = dataSource.CreateLayer('input', geom_type=ogr.wkbPoint)
+    layer.CreateField(ogr.FieldDefn('CNAM', ogr.OFTString))
+    layer.CreateField(ogr.FieldDefn('HGT', ogr.OFTReal))
+    for featureNum, cnamValue in enumerate(['A', 'B', 'Z']):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField('CNAM', cnamValue)
+        feature.SetField('HGT', 1.0)
+        feature.SetGeometry(ogr.CreateGeometryFromWkt('POINT (' + str(featureNum) + ' 0)'))
+        layer.CreateFeature(feature)
+    return layer
+
+def createOutputLayer(dataSource, name, inputLayer, fClassTable):
+    layer = dataSource.CreateLayer(name, geom_type=ogr.wkbPoint)
+    fieldIndexes = {}
+    inputLayerDefinition = inputLayer.GetLayerDefn()
+    for i in range(inputLayerDefinition.GetFieldCount()):
+        layer.CreateField(inputLayerDefinition.GetFieldDefn(i))
+        fieldIndexes[inputLayerDefinition.GetFieldDefn(i).GetName()] = i
+    for columnName in fClassTable['columns']:
+        if(columnName in fieldIndexes):
+            continue
+        layer.CreateField(ogr.FieldDefn(columnName, ogr.OFTString))
+        fieldIndexes[columnName] = len(fieldIndexes)
+    return layer, fieldIndexes
+
+def copyPerFeature(inputLayer, outLayer, fieldIndexes, fClassTable, policy):
+    joinPlan = featureClassJoin.buildJoinPlan(fClassTable, fieldIndexes, outLayer.GetLayerDefn(), inputLayer.GetLayerDefn(), policy)
+    featureCount = 0
+    inputLayer.ResetReading()
+    for inFeature in inputLayer:
+        outFeature = featureClassJoin.createJoinedFeature(joinPlan, inFeature)
+        if(outFeature != None):
+            outLayer.CreateFeature(outFeature)
+            featureCount += 1
+    return featureCount, joinPlan['missing']
+
+def copyWithArrow(inputLayer, outLayer, fieldIndexes, fClassTable, policy):
+    inputLayer.ResetReading()
+    return arrowCopy.copyFeaturesWithArrow(inputLayer, outLayer, fClassTable, True, policy)
+
+def getRows(layer):
+    rows = []
+    layer.ResetReading()
+    for feature in layer:
+        rows.append(tuple(feature.GetField(i) for i in range(feature.GetFieldCount())))
+    return rows
+
+@unittest.skipUnless(hasGDAL, 'GDAL is not installed')
+class FeatureClassJoinTest(unittest.TestCase):
+    def setUp(self):
+        self.dataSource = ogr.GetDriverByName('Memory').CreateDataSource('join')
+        self.inputLayer = createInputLayer(self.dataSource)
+
+    def copyBothWays(self, fClassTable, policy):
+        results = []
+        copyFunctions = [copyPerFeature]
+        if(arrowCopy.isArrowCopySupported()):
+            copyFunctions.append(copyWithArrow)
+        for copyNum, copyFunction in enumerate(copyFunctions):
+            outLayer, fieldIndexes = createOutputLayer(self.dataSource, 'output' + str(copyNum), self.inputLayer, fClassTable)
+            counts = copyFunction(self.inputLayer, outLayer, fieldIndexes, fClassTable, policy)
+            results.append((counts, getRows(outLayer)))
+        return results
+
+    def testEmptyFeatureClassTableKeepsEveryFeature(self):
+        fClassTable = recordCache.createFeatureClassTable()
+        for policy in featureClassJoin.missingCNAMPolicies:
+            for counts, rows in self.copyBothWays(fClassTable, policy):
+                self.assertEqual(counts, (3, 0))
+                self.assertEqual([row[0] for row in rows], ['A', 'B', 'Z'])
+
+    def testFeatureClassValuesTakePrecedence(self):
+        fClassTable = {'columns': ('CNAM', 'HGT', 'FACC'), 'rows': {'A': ('A', 5.0, 'AL015'), 'B': ('B', None, 'AP030')}}
+        results = self.copyBothWays(fClassTable, 'null')
+        for counts, rows in results:
+            self.assertEqual(counts, (3, 1))
+            self.assertEqual(rows, [('A', 5.0, 'AL015'), ('B', None, 'AP030'), ('Z', 1.0, None)])
+
+    def testMissingPolicies(self):
+        fClassTable = {'columns': ('CNAM', 'FACC'), 'rows': {'A': ('A', 'AL015')}}
+        for counts, rows in self.copyBothWays(fClassTable, 'skip'):
+            self.assertEqual(counts, (1, 2))
+            self.assertEqual(rows, [('A', 1.0, 'AL015')])
+        with self.assertRaises(featureClassJoin.MissingCNAMError):
+            self.copyBothWays(fClassTable, 'error')
+
+if __name__ == '__main__':
+    unittest.main()
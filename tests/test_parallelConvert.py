@@ -0,0 +1,61 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# A worker process that dies takes the whole pool down with it; only the group
+# that crashed it may be reported as failed, the others running at the time
+# are run again.
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parallelConvert
+
+def convertOrCrash(shapeFile):
+    if(shapeFile.startswith('crash')):
+        # the other groups are still running when it dies
+        time.sleep(0.1)
+        os._exit(1)
+    time.sleep(0.3)
+    return 1
+
+class BrokenPoolTest(unittest.TestCase):
+    def runGroups(self, groups):
+        results = []
+        summary = parallelConvert.runConversionJobs(groups, convertOrCrash, (), 4, resultCallback=results.extend)
+        return summary, dict((result['shapefile'], result['status']) for result in results)
+
+    def testOnlyTheCrashingGroupFails(self):
+        groups = [('a', ['a1', 'a2']), ('crash', ['crash1']), ('b', ['b1']), ('c', ['c1'])]
+        summary, statuses = self.runGroups(groups)
+        self.assertEqual(statuses, {'a1': 'ok', 'a2': 'ok', 'crash1': 'failed', 'b1': 'ok', 'c1': 'ok'})
+        self.assertEqual((summary['groups'], summary['converted'], summary['failed']), (4, 4, 1))
+
+    def testGroupsAfterTheCrashStillRun(self):
+        groups = [('crash', ['crash1']), ('crashAgain', ['crash2'])] + [(str(n), [str(n)]) for n in range(6)]
+        summary, statuses = self.runGroups(groups)
+        self.assertEqual(statuses['crash1'], 'failed')
+        self.assertEqual(statuses['crash2'], 'failed')
+        self.assertEqual(summary['converted'], 6)
+
+if __name__ == '__main__':
+    unittest.main()
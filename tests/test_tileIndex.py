@@ -0,0 +1,81 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# The tile index streams tiles in scan order or the order asked for, and its
+# bbox filter keeps the tiles that intersect the box and the ones whose
+# extents aren't known.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tileIndex
+
+def createTile(path, lod, extents):
+    tile = dict((column, None) for column in tileIndex.tileColumns)
+    tile['path'] = path
+    tile['datasetcode'] = 'D100'
+    tile['lod'] = lod
+    tile['shp_size'] = 0 if extents == None else 1000
+    tile['extents'] = extents
+    return tile
+
+def getExtents(west, south, east, north):
+    return {'west': west, 'south': south, 'east': east, 'north': north}
+
+class TileIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp()
+        indexFilename = os.path.join(self.workDir, tileIndex.tileIndexFileName)
+        indexCon = tileIndex.createTileIndex(indexFilename)
+        tileIndex.addTiles(indexCon, [
+            createTile('a.shp', 'L01', getExtents(-118.0, 32.0, -117.5, 32.5)),
+            createTile('b.shp', 'L00', getExtents(-117.5, 32.0, -117.0, 32.5)),
+            createTile('c.dbf', 'L01', None),
+            createTile('d.shp', 'L00', getExtents(-116.0, 33.0, -115.0, 34.0))])
+        tileIndex.finishTileIndex(indexCon)
+        self.indexCon = tileIndex.openTileIndex(indexFilename)
+
+    def tearDown(self):
+        self.indexCon.close()
+        shutil.rmtree(self.workDir)
+
+    def testOrder(self):
+        self.assertEqual(tileIndex.getTileCount(self.indexCon), 4)
+        self.assertEqual(list(tileIndex.iterateTilePaths(self.indexCon)), ['a.shp', 'b.shp', 'c.dbf', 'd.shp'])
+        self.assertEqual(list(tileIndex.iterateTilePaths(self.indexCon, 'lod, id')), ['b.shp', 'd.shp', 'a.shp', 'c.dbf'])
+        tiles = list(tileIndex.iterateTiles(self.indexCon, 'path DESC'))
+        self.assertEqual([tile['path'] for tile in tiles], ['d.shp', 'c.dbf', 'b.shp', 'a.shp'])
+        self.assertEqual(tiles[0]['west'], -116.0)
+        self.assertEqual(tiles[1]['west'], None)
+
+    def testBBox(self):
+        # touches b, not a or d; c has no extents and is kept
+        bbox = (-117.25, 32.25, -116.5, 32.75)
+        self.assertEqual(list(tileIndex.iterateTilePaths(self.indexCon, None, bbox)), ['b.shp', 'c.dbf'])
+        rows = tileIndex.iterateTileColumns(self.indexCon, ['path', 'lod'], 'lod DESC, id', (-118.0, 32.0, -115.0, 34.0))
+        self.assertEqual([tuple(row) for row in rows], [('a.shp', 'L01'), ('c.dbf', 'L01'), ('b.shp', 'L00'), ('d.shp', 'L00')])
+        self.assertEqual(list(tileIndex.iterateTilePaths(self.indexCon, None, (0.0, 0.0, 1.0, 1.0))), ['c.dbf'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Subset filters choose tiles from their names and the directories they are in:
+# by LOD (with the coarse LC levels below 0), by dataset and by selector, and
+# by the bounds a tile's geocell, LOD and UREF/RREF imply.
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+hasGDAL = importlib.util.find_spec('osgeo') != None
+if(hasGDAL):
+    import tileSubset
+
+def getTilePath(tileName):
+    return os.path.join('Tiles', 'N32', 'W118', '100_GSFeature', 'L02', 'U3', tileName)
+
+@unittest.skipUnless(hasGDAL, 'GDAL is not installed')
+class TileSubsetTest(unittest.TestCase):
+    def testParse(self):
+        self.assertEqual(tileSubset.parseLOD('L03'), 3)
+        self.assertEqual(tileSubset.parseLOD('LC05'), -5)
+        self.assertEqual(tileSubset.parseLODRange('L01:L03'), (1, 3))
+        self.assertEqual(tileSubset.parseLODRange('2'), (2, 2))
+        self.assertEqual(tileSubset.parseLODRange(':L04'), (-10, 4))
+        self.assertEqual(tileSubset.parseLODRange('L05:L01'), None)
+        self.assertEqual(tileSubset.getDatasetCode('100_GSFeature'), 'D100')
+        self.assertEqual(tileSubset.getDatasetCode('d101'), 'D101')
+        self.assertEqual(tileSubset.parseBBox('-118,32,-117,33'), (-118.0, 32.0, -117.0, 33.0))
+        self.assertEqual(tileSubset.parseBBox('-117,32,-118,33'), None)
+
+    def testLOD(self):
+        tileFilter = tileSubset.createTileFilter(lodRange=(1, 2))
+        self.assertTrue(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L02_U3_R1.shp')))
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L03_U3_R1.shp')))
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_LC05_U0_R0.shp')))
+        self.assertFalse(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W118', '100_GSFeature', 'LC']))
+        self.assertFalse(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W118', '100_GSFeature', 'L03']))
+        self.assertTrue(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W118', '100_GSFeature', 'L01']))
+        coarseFilter = tileSubset.createTileFilter(lodRange=(-10, 0))
+        self.assertTrue(tileSubset.acceptDirectory(coarseFilter, ['Tiles', 'N32', 'W118', '100_GSFeature', 'LC']))
+
+    def testDatasets(self):
+        tileFilter = tileSubset.createTileFilter(datasets=['100_GSFeature', 'D102'])
+        self.assertTrue(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L02_U3_R1.shp')))
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D101_S001_T001_L02_U3_R1.shp')))
+        self.assertFalse(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W118', '101_GTFeature']))
+        self.assertTrue(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W118', '102_GeoPolitical']))
+        # names that aren't CDB tiles only pass an empty filter
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, 'notes.shp'))
+        self.assertTrue(tileSubset.acceptTileName(tileSubset.createTileFilter(), 'notes.shp'))
+
+    def testSelectors(self):
+        tileFilter = tileSubset.createTileFilter(selectors=['t005', 'S002_T001'])
+        self.assertTrue(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T005_L02_U3_R1.shp')))
+        self.assertTrue(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S002_T001_L02_U3_R1.shp')))
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L02_U3_R1.shp')))
+
+    def testBBox(self):
+        # N32W118 at LOD 2 is a 4x4 grid of quarter degree tiles
+        self.assertEqual(tileSubset.getTileBounds(32, -118, 2, 3, 1), (-117.75, 32.75, -117.5, 33.0))
+        tileFilter = tileSubset.createTileFilter(bbox=(-117.7, 32.8, -117.6, 32.9))
+        self.assertTrue(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L02_U3_R1.shp')))
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L02_U3_R3.shp')))
+        self.assertFalse(tileSubset.acceptTileName(tileFilter, getTilePath('N32W118_D100_S001_T001_L02_U0_R1.shp')))
+        self.assertFalse(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N33']))
+        self.assertFalse(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W117']))
+        self.assertFalse(tileSubset.acceptDirectory(tileFilter, ['Tiles', 'N32', 'W118', '100_GSFeature', 'L02', 'U0']))
+        dirs = ['W119', 'W118', 'W117']
+        tileSubset.pruneDirectories(tileFilter, 'cdb', os.path.join('cdb', 'Tiles', 'N32'), dirs)
+        self.assertEqual(dirs, ['W118'])
+
+if __name__ == '__main__':
+    unittest.main()
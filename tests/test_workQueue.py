@@ -0,0 +1,103 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Leases on the work queue: two workers never hold the same group, renewing
+# only extends the worker's own leases, and a lease that runs out goes to the
+# next worker to claim, which is then the only one that may finish the group.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workQueue
+
+def getLeaseExpiry(queueCon, workId):
+    return queueCon.execute("SELECT lease_expires FROM work WHERE id=?", (workId,)).fetchone()[0]
+
+def getWork(queueCon, workId):
+    return queueCon.execute("SELECT status, worker, attempts, features FROM work WHERE id=?", (workId,)).fetchone()
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp()
+        queueFilename = os.path.join(self.workDir, workQueue.queueFileName)
+        groups = [('out' + str(groupNum) + '.gpkg', ['tile' + str(groupNum) + '.shp']) for groupNum in range(5)]
+        self.assertEqual(workQueue.createWorkQueue(queueFilename, {'jobs': 2}, groups), 5)
+        self.queueCon = workQueue.openWorkQueue(queueFilename)
+
+    def tearDown(self):
+        self.queueCon.close()
+        shutil.rmtree(self.workDir)
+
+    def testClaimsDontOverlap(self):
+        self.assertEqual(workQueue.getSettings(self.queueCon), {'jobs': 2})
+        first = workQueue.claimWork(self.queueCon, 'a', 2)
+        second = workQueue.claimWork(self.queueCon, 'b', 2)
+        third = workQueue.claimWork(self.queueCon, 'c', 2)
+        self.assertEqual([work[0] for work in first], [1, 2])
+        self.assertEqual([work[0] for work in second], [3, 4])
+        self.assertEqual(third, [(5, 'out4.gpkg', ['tile4.shp'])])
+        self.assertEqual(workQueue.claimWork(self.queueCon, 'd', 2), [])
+        self.assertEqual(workQueue.getQueueStatus(self.queueCon), {'leased': (5, 0)})
+
+    def testRenewOnlyOwnLeases(self):
+        workId = workQueue.claimWork(self.queueCon, 'a', 1, 60)[0][0]
+        leaseExpiry = getLeaseExpiry(self.queueCon, workId)
+        workQueue.renewLeases(self.queueCon, 'b', [workId], 600)
+        self.assertEqual(getLeaseExpiry(self.queueCon, workId), leaseExpiry)
+        workQueue.renewLeases(self.queueCon, 'a', [workId], 600)
+        self.assertGreater(getLeaseExpiry(self.queueCon, workId), leaseExpiry + 500)
+        self.assertTrue(workQueue.holdsLease(self.queueCon, 'a', workId))
+        self.assertFalse(workQueue.holdsLease(self.queueCon, 'b', workId))
+
+    def testStaleLeaseIsReclaimed(self):
+        # a lease that has already run out, as if worker a had hung
+        workId = workQueue.claimWork(self.queueCon, 'a', 1, -1)[0][0]
+        self.assertFalse(workQueue.holdsLease(self.queueCon, 'a', workId))
+        reclaimed = workQueue.claimWork(self.queueCon, 'b', 1)
+        self.assertEqual(reclaimed[0][0], workId)
+        self.assertEqual(getWork(self.queueCon, workId), ('leased', 'b', 2, 0))
+        self.assertTrue(workQueue.holdsLease(self.queueCon, 'b', workId))
+        # worker a coming back late can neither renew nor finish the group
+        workQueue.renewLeases(self.queueCon, 'a', [workId])
+        workQueue.completeWork(self.queueCon, 'a', workId, [{'shapefile': 'tile0.shp', 'status': 'ok', 'features': 7}])
+        self.assertEqual(getWork(self.queueCon, workId), ('leased', 'b', 2, 0))
+        workQueue.completeWork(self.queueCon, 'b', workId, [{'shapefile': 'tile0.shp', 'status': 'ok', 'features': 9}])
+        self.assertEqual(getWork(self.queueCon, workId), ('done', 'b', 2, 9))
+        self.assertFalse(workQueue.holdsLease(self.queueCon, 'b', workId))
+
+    def testLeaseRunsOutTooOften(self):
+        workId = workQueue.claimWork(self.queueCon, 'a', 1, -1, 2)[0][0]
+        self.assertEqual(workQueue.claimWork(self.queueCon, 'b', 1, -1, 2)[0][0], workId)
+        # the second expiry is the last one allowed
+        self.assertNotIn(workId, [work[0] for work in workQueue.claimWork(self.queueCon, 'c', 5, 60, 2)])
+        self.assertEqual(getWork(self.queueCon, workId)[0], 'failed')
+
+    def testReleasedWorkIsPendingAgain(self):
+        workId = workQueue.claimWork(self.queueCon, 'a', 1)[0][0]
+        workQueue.releaseWork(self.queueCon, 'a', [workId])
+        self.assertEqual(getWork(self.queueCon, workId), ('pending', None, 0, 0))
+        self.assertEqual(workQueue.claimWork(self.queueCon, 'b', 1)[0][0], workId)
+
+if __name__ == '__main__':
+    unittest.main()
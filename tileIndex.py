@@ -0,0 +1,120 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# The tile index is a SQLite file in the CDB root listing every shapefile found
+# by generateMetaFiles, with its filename components, the sizes of its component
+# files and its extents. The extents are kept in an R-tree so spatial queries
+# don't need to look at every tile, and all of the queries return cursors, so
+# callers can stream through millions of tiles without loading them all.
+
+import os
+import sqlite3
+import urllib.request
+
+tileIndexFileName = 'shapeindex.sqlite'
+
+tileColumns = ['path', 'dataset', 'geocell', 'datasetcode', 'selector1', 'selector2', 'lod', 'uref', 'rref',
+    'shp_size', 'shx_size', 'dbf_size', 'dbt_size', 'fcattr_size', 'extattr_size', 'shp_mtime']
+
+def getTileIndexPath(cDBRoot):
+    return os.path.join(cDBRoot, tileIndexFileName)
+
+# Create a new, empty index, replacing any previous one
+def createTileIndex(indexFilename):
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if(os.path.exists(indexFilename + suffix)):
+            os.remove(indexFilename + suffix)
+    indexCon = sqlite3.connect(indexFilename)
+    indexCon.execute("PRAGMA journal_mode=OFF")
+    indexCon.execute("PRAGMA synchronous=OFF")
+    createString = "CREATE TABLE tiles (id INTEGER PRIMARY KEY, path TEXT UNIQUE"
+    for column in tileColumns[1:9]:
+        createString += ", " + column + " TEXT"
+    for column in tileColumns[9:15]:
+        createString += ", " + column + " INTEGER"
+    # 0 for a tile with no extents in tile_extents (see iterateTileColumns)
+    createString += ", shp_mtime REAL, has_extents INTEGER)"
+    indexCon.execute(createString)
+    indexCon.execute("CREATE VIRTUAL TABLE tile_extents USING rtree(id, west, east, south, north)")
+    indexCon.execute("BEGIN TRANSACTION")
+    return indexCon
+
+# Add a list of tile dictionaries (keys from tileColumns, plus extents, which is
+# None or a dictionary of north/south/east/west)
+def addTiles(indexCon, tiles):
+    cursor = indexCon.cursor()
+    insertString = ("INSERT INTO tiles (" + ",".join(tileColumns) + ", has_extents) VALUES ("
+        + ",".join(["?"] * (len(tileColumns) + 1)) + ")")
+    for tile in tiles:
+        extents = tile['extents']
+        cursor.execute(insertString, tuple(tile[column] for column in tileColumns) + (int(extents != None),))
+        if(extents != None):
+            cursor.execute("INSERT INTO tile_extents (id, west, east, south, north) VALUES (?,?,?,?,?)",
+                (cursor.lastrowid, extents['west'], extents['east'], extents['south'], extents['north']))
+
+def finishTileIndex(indexCon):
+    indexCon.execute("CREATE INDEX tiles_dataset ON tiles (datasetcode, selector1, selector2, lod)")
+    indexCon.execute("CREATE INDEX tiles_without_extents ON tiles (id) WHERE has_extents = 0")
+    indexCon.execute("COMMIT TRANSACTION")
+    indexCon.execute("ANALYZE")
+    indexCon.close()
+
+def openTileIndex(indexFilename):
+    if(not os.path.exists(indexFilename)):
+        print("Unable to open tile index " + indexFilename)
+        return None
+    indexCon = sqlite3.connect("file:" + urllib.request.pathname2url(os.path.abspath(indexFilename)) + "?mode=ro", uri=True)
+    indexCon.row_factory = sqlite3.Row
+    return indexCon
+
+def getTileCount(indexCon):
+    return indexCon.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+tileSelectString = ("SELECT tiles.*, tile_extents.west, tile_extents.east, tile_extents.south, tile_extents.north "
+    "FROM tiles LEFT JOIN tile_extents ON tile_extents.id = tiles.id")
+
+# Stream every tile in the index, in scan order unless orderBy is given
+def iterateTiles(indexCon, orderBy=None):
+    selectString = tileSelectString
+    if(orderBy != None):
+        selectString += " ORDER BY " + orderBy
+    return indexCon.execute(selectString)
+
+# Stream the given columns of the tiles, in scan order unless orderBy is given.
+# bbox (west, south, east, north) leaves out tiles whose extents are known and
+# don't intersect it; tiles without extents are kept. The tiles that intersect
+# it come from a range query on the R-tree and the ones without extents from
+# their own index, so neither half looks at every tile.
+def iterateTileColumns(indexCon, columns, orderBy=None, bbox=None):
+    if(orderBy == None):
+        orderBy = "id"
+    fromString = " FROM tiles"
+    parameters = ()
+    if(bbox != None):
+        west, south, east, north = bbox
+        fromString = (" FROM (SELECT tiles.* FROM tile_extents JOIN tiles ON tiles.id = tile_extents.id "
+            "WHERE tile_extents.west <= ? AND tile_extents.east >= ? AND tile_extents.south <= ? AND tile_extents.north >= ? "
+            "UNION ALL SELECT * FROM tiles WHERE has_extents = 0) AS tiles")
+        parameters = (east, west, north, south)
+    return indexCon.execute("SELECT " + ", ".join(columns) + fromString + " ORDER BY " + orderBy, parameters)
+
+# Stream the tile paths (see iterateTileColumns)
+def iterateTilePaths(indexCon, orderBy=None, bbox=None):
+    for row in iterateTileColumns(indexCon, ["path"], orderBy, bbox):
+        yield row[0]
@@ -0,0 +1,249 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Subset conversion: which tiles of a CDB to convert, by area, dataset, LOD and
+# selector. Most of the choice is made from names alone, before any file is
+# opened. The CDB tile tree is
+#
+#   Tiles/N32/W118/100_GSFeature/L02/U3/N32W118_D100_S001_T001_L02_U3_R1.shp
+#
+# so while generateMetaFiles walks it, whole latitude, longitude, dataset, LOD
+# and UREF directories are skipped when they can't hold a wanted tile, and the
+# remaining shapefiles are checked against their filename components and the
+# tile bounds those imply. The extents in the tile index then only refine the
+# area choice (see tileIndex.iterateTilePaths).
+
+import os
+
+import converter
+
+# Geocell widths in degrees of longitude by latitude zone (CDB specification)
+geocellZones = [(50, 1), (70, 2), (75, 3), (80, 4), (89, 6), (90, 12)]
+
+def getGeocellWidth(lat):
+    # the zone is set by the edge of the geocell nearest the equator
+    edge = lat if lat >= 0 else -(lat + 1)
+    for zoneLimit, width in geocellZones:
+        if(edge < zoneLimit):
+            return width
+    return 12
+
+# 'N32' -> 32, 'S05' -> -5
+def parseLatitudeName(name):
+    if(len(name) != 3 or name[0] not in 'NS' or not name[1:].isdigit()):
+        return None
+    lat = int(name[1:])
+    return lat if name[0] == 'N' else -lat
+
+# The latitude of the geocell of a tile file name, e.g. 32 for
+# N32W118_D100_S001_T001_L00_U0_R0.shp, or None for other names
+def getTileLatitude(shpFilename):
+    return parseLatitudeName(os.path.basename(shpFilename)[0:3])
+
+# 'W118' -> -118, 'E005' -> 5
+def parseLongitudeName(name):
+    if(len(name) != 4 or name[0] not in 'EW' or not name[1:].isdigit()):
+        return None
+    lon = int(name[1:])
+    return lon if name[0] == 'E' else -lon
+
+# 'L03' -> 3, 'LC05' -> -5 (the coarse LODs), also plain numbers
+def parseLOD(name):
+    name = name.strip().upper()
+    try:
+        if(name.startswith('LC')):
+            return -int(name[2:])
+        if(name.startswith('L')):
+            return int(name[1:])
+        return int(name)
+    except ValueError:
+        return None
+
+# '100_GSFeature', 'D100' or '100' -> 'D100'
+def getDatasetCode(name):
+    name = name.strip()
+    if(name.upper().startswith('D') and name[1:].isdigit()):
+        return name.upper()
+    prefix = name.split('_')[0]
+    if(prefix.isdigit()):
+        return 'D' + prefix
+    return None
+
+def parseFloat(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def parseBBox(text):
+    try:
+        west, south, east, north = [float(value) for value in text.split(',')]
+    except ValueError:
+        return None
+    if(west > east or south > north):
+        return None
+    return (west, south, east, north)
+
+def parseLODRange(text):
+    parts = text.split(':')
+    if(len(parts) == 1):
+        parts = parts * 2
+    if(len(parts) != 2):
+        return None
+    minLOD = parseLOD(parts[0]) if parts[0] != '' else -10
+    maxLOD = parseLOD(parts[1]) if parts[1] != '' else 23
+    if(minLOD == None or maxLOD == None or minLOD > maxLOD):
+        return None
+    return (minLOD, maxLOD)
+
+def parseList(text):
+    return [item.strip() for item in text.split(',') if item.strip() != '']
+
+# bbox is (west, south, east, north) in degrees, datasets a list of dataset
+# names or codes, lodRange a (min, max) pair of LOD numbers (negative for the
+# coarse LC levels), selectors a list of selector1, selector2 or
+# selector1_selector2 values (e.g. S001, T005, S001_T001). None means any.
+def createTileFilter(bbox=None, datasets=None, lodRange=None, selectors=None):
+    tileFilter = {}
+    tileFilter['bbox'] = bbox
+    tileFilter['datasets'] = None
+    if(datasets != None):
+        tileFilter['datasets'] = set(getDatasetCode(dataset) for dataset in datasets)
+    tileFilter['lodRange'] = lodRange
+    tileFilter['selectors'] = None
+    if(selectors != None):
+        tileFilter['selectors'] = set(selector.upper() for selector in selectors)
+    return tileFilter
+
+def isEmpty(tileFilter):
+    return (tileFilter == None or (tileFilter['bbox'] == None and tileFilter['datasets'] == None and
+        tileFilter['lodRange'] == None and tileFilter['selectors'] == None))
+
+def overlapsBBox(tileFilter, west, south, east, north):
+    bbox = tileFilter['bbox']
+    if(bbox == None):
+        return True
+    return west <= bbox[2] and east >= bbox[0] and south <= bbox[3] and north >= bbox[1]
+
+def acceptLOD(tileFilter, lod):
+    if(tileFilter['lodRange'] == None or lod == None):
+        return True
+    return tileFilter['lodRange'][0] <= lod <= tileFilter['lodRange'][1]
+
+# The bounds of a tile, from its geocell, LOD and UREF/RREF
+def getTileBounds(lat, lon, lod, uref=None, rref=None):
+    width = getGeocellWidth(lat)
+    south = lat
+    west = lon
+    height = 1.0
+    if(lod != None and lod > 0):
+        divisions = 2 ** lod
+        height = 1.0 / divisions
+        width = float(width) / divisions
+        if(uref != None):
+            south = lat + uref * height
+        if(rref != None):
+            west = lon + rref * width
+        if(uref == None):
+            height = 1.0
+        if(rref == None):
+            width = getGeocellWidth(lat)
+    return west, south, west + width, south + height
+
+# Whether a directory under the CDB root (given as its path components below the
+# root) can hold wanted tiles. Anything that isn't recognisably part of the tile
+# tree is walked as before.
+def acceptDirectory(tileFilter, directoryParts):
+    if(len(directoryParts) < 2 or directoryParts[0] != 'Tiles'):
+        return True
+    lat = parseLatitudeName(directoryParts[1])
+    if(lat == None):
+        return True
+    if(not overlapsBBox(tileFilter, -180, lat, 180, lat + 1)):
+        return False
+    if(len(directoryParts) < 3):
+        return True
+    lon = parseLongitudeName(directoryParts[2])
+    if(lon == None):
+        return True
+    if(not overlapsBBox(tileFilter, lon, lat, lon + getGeocellWidth(lat), lat + 1)):
+        return False
+    if(len(directoryParts) < 4):
+        return True
+    datasetCode = getDatasetCode(directoryParts[3])
+    if(tileFilter['datasets'] != None and datasetCode != None and datasetCode not in tileFilter['datasets']):
+        return False
+    if(len(directoryParts) < 5):
+        return True
+    # LC holds all of the coarse levels
+    lod = -1 if directoryParts[4].upper() == 'LC' else parseLOD(directoryParts[4])
+    if(lod == None):
+        return True
+    if(lod < 0):
+        if(tileFilter['lodRange'] != None and tileFilter['lodRange'][0] >= 0):
+            return False
+    elif(not acceptLOD(tileFilter, lod)):
+        return False
+    if(len(directoryParts) < 6 or lod <= 0 or not directoryParts[5].startswith('U') or not directoryParts[5][1:].isdigit()):
+        return True
+    west, south, east, north = getTileBounds(lat, lon, lod, int(directoryParts[5][1:]))
+    return overlapsBBox(tileFilter, west, south, east, north)
+
+def acceptSelectors(tileFilter, components):
+    selectors = tileFilter['selectors']
+    if(selectors == None):
+        return True
+    return (components['selector1'] in selectors or components['selector2'] in selectors or
+        components['selector1'] + '_' + components['selector2'] in selectors)
+
+# Whether a shapefile is wanted, from its name alone. Files without CDB tile
+# names only pass an empty filter.
+def acceptTileName(tileFilter, shpFilename):
+    if(isEmpty(tileFilter)):
+        return True
+    try:
+        components = converter.getFilenameComponents(shpFilename)
+    except IndexError:
+        return False
+    if(tileFilter['datasets'] != None and components['datasetcode'] not in tileFilter['datasets']):
+        return False
+    if(not acceptSelectors(tileFilter, components)):
+        return False
+    lod = parseLOD(components['lod'])
+    if(not acceptLOD(tileFilter, lod)):
+        return False
+    if(tileFilter['bbox'] == None):
+        return True
+    geocell = os.path.basename(shpFilename)[0:7]
+    lat = parseLatitudeName(geocell[0:3])
+    lon = parseLongitudeName(geocell[3:7])
+    if(lat == None or lon == None):
+        return True
+    uref = parseLOD(components['uref'][1:]) if components['uref'].startswith('U') else None
+    rref = parseLOD(components['rref'][1:]) if components['rref'].startswith('R') else None
+    west, south, east, north = getTileBounds(lat, lon, lod, uref, rref)
+    return overlapsBBox(tileFilter, west, south, east, north)
+
+# Prune the directories os.walk is about to visit below root, in place
+def pruneDirectories(tileFilter, cDBRoot, root, dirs):
+    if(isEmpty(tileFilter)):
+        return
+    relativeRoot = os.path.relpath(root, cDBRoot)
+    rootParts = [] if relativeRoot == '.' else relativeRoot.split(os.sep)
+    dirs[:] = [directory for directory in dirs if acceptDirectory(tileFilter, rootParts + [directory])]
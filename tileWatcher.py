@@ -0,0 +1,137 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Change detection for watch mode (see watchCDB in Convert.py). The CDB is
+# polled rather than walked: every directory is remembered with its
+# modification time, and only a directory whose time has changed (a file was
+# added, removed or renamed into it) is listed again, so a poll costs one stat
+# per directory. The shapefiles of a relisted directory get their signature
+# (the sizes and times of their component files, see conversionManifest)
+# checked, and a tile is reported once its signature is the same on two polls
+# in a row, so a tile still being copied in isn't picked up half written.
+#
+# A file rewritten in place doesn't change its directory, so every
+# rescanInterval seconds all of the tiles are checked as well. That signs every
+# tile of the CDB, so on a large CDB the interval wants to be long; 0 or None
+# turns it off.
+
+import os
+import time
+
+import tileSubset
+import conversionManifest
+
+defaultPollInterval = 0.25
+defaultRescanInterval = 60
+
+def createWatchIndex(cDBRoot, tileFilter=None, rescanInterval=defaultRescanInterval):
+    watchIndex = {}
+    watchIndex['root'] = cDBRoot
+    watchIndex['tileFilter'] = tileFilter
+    watchIndex['rescanInterval'] = rescanInterval
+    # directory -> (modification time, subdirectories, shapefiles)
+    watchIndex['directories'] = {}
+    # shapefile -> signature it was last reported with
+    watchIndex['signatures'] = {}
+    # shapefile -> signature seen on the last poll, waiting to settle
+    watchIndex['candidates'] = {}
+    watchIndex['lastRescan'] = 0
+    return watchIndex
+
+def listDirectory(watchIndex, directory):
+    subdirectories = []
+    shapeFiles = []
+    for entry in os.scandir(directory):
+        if(entry.is_dir()):
+            subdirectories.append(entry.name)
+        elif(entry.name.endswith('.shp') and tileSubset.acceptTileName(watchIndex['tileFilter'], entry.path)):
+            shapeFiles.append(entry.path)
+    tileSubset.pruneDirectories(watchIndex['tileFilter'], watchIndex['root'], directory, subdirectories)
+    return subdirectories, shapeFiles
+
+# The shapefiles in directories that changed since the last poll (all of them on
+# a full rescan). Tiles that disappeared are forgotten.
+def pollDirectories(watchIndex, fullRescan):
+    directories = watchIndex['directories']
+    changedShapeFiles = []
+    visited = set()
+    pending = [watchIndex['root']]
+    while(len(pending) > 0):
+        directory = pending.pop()
+        try:
+            modifiedTime = os.stat(directory).st_mtime_ns
+        except OSError:
+            continue
+        visited.add(directory)
+        cached = directories.get(directory)
+        if(cached == None or cached[0] != modifiedTime):
+            try:
+                subdirectories, shapeFiles = listDirectory(watchIndex, directory)
+            except OSError:
+                continue
+            if(cached != None):
+                for shapeFile in set(cached[2]) - set(shapeFiles):
+                    watchIndex['signatures'].pop(shapeFile, None)
+                    watchIndex['candidates'].pop(shapeFile, None)
+            cached = (modifiedTime, subdirectories, shapeFiles)
+            directories[directory] = cached
+            changedShapeFiles.extend(shapeFiles)
+        elif(fullRescan):
+            changedShapeFiles.extend(cached[2])
+        for subdirectory in cached[1]:
+            pending.append(os.path.join(directory, subdirectory))
+    for directory in list(directories.keys()):
+        if(directory not in visited):
+            for shapeFile in directories.pop(directory)[2]:
+                watchIndex['signatures'].pop(shapeFile, None)
+                watchIndex['candidates'].pop(shapeFile, None)
+    return changedShapeFiles
+
+# Poll once. Returns the shapefiles that are new or changed and have settled.
+def pollChanges(watchIndex):
+    rescanInterval = watchIndex['rescanInterval']
+    fullRescan = (rescanInterval != None and rescanInterval > 0 and time.time() - watchIndex['lastRescan'] >= rescanInterval)
+    if(fullRescan):
+        watchIndex['lastRescan'] = time.time()
+    signatures = watchIndex['signatures']
+    candidates = watchIndex['candidates']
+    shapeFiles = set(pollDirectories(watchIndex, fullRescan))
+    shapeFiles.update(candidates.keys())
+    readyShapeFiles = []
+    for shapeFile in sorted(shapeFiles):
+        signature = conversionManifest.getTileSignature(shapeFile)
+        if(signature == signatures.get(shapeFile)):
+            candidates.pop(shapeFile, None)
+        elif(candidates.get(shapeFile) == signature):
+            candidates.pop(shapeFile)
+            signatures[shapeFile] = signature
+            readyShapeFiles.append(shapeFile)
+        else:
+            candidates[shapeFile] = signature
+    return readyShapeFiles
+
+# When the tile last changed: the newest modification time of its component files
+def getChangeTime(watchIndex, shapeFile):
+    changeTime = 0
+    signature = watchIndex['signatures'].get(shapeFile)
+    if(signature == None):
+        return None
+    for fileName, fileSize, modifiedTime in conversionManifest.parseTileSignature(signature):
+        changeTime = max(changeTime, modifiedTime / 1e9)
+    return changeTime
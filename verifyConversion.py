@@ -0,0 +1,500 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# Checks the GeoPackages of a conversion against the CDB they came from. For
+# each tile:
+#
+#   features                 the feature count, the extent, and a hash of the
+#                            geometry WKB and flattened attributes of every feature
+#   extended attributes and  the row count and a hash of every row, against
+#   relationships            the DBF
+#
+# Both sides are read a batch at a time, the shapefiles and GeoPackages through
+# the GDAL Arrow stream interface and the DBFs through dbfarray, and each column
+# is hashed as whole arrays, so nothing is done per feature in Python. Values
+# are compared by kind rather than exact type: numbers and booleans as doubles,
+# geometries as WKB and everything else as text. Without Arrow support (GDAL
+# 3.8+ with pyarrow and NumPy) only the counts and extents are checked.
+#
+# Mismatches are written as JSON lines:
+#
+#   {"shapefile": ..., "output": ..., "table": ..., "check": ..., "expected": ..., "actual": ...}
+#
+# where check is missingOutput, missingTable, missingColumns, count, extent,
+# hash (with the "columns" that differ) or error.
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+
+import archiveInput
+import arrowCopy
+import consolidate
+import converter
+import dbfarray
+import geometryTransform
+import optimizeGeoPackage
+import recordCache
+import tileSubset
+
+try:
+    from osgeo import ogr
+except:
+    sys.exit('ERROR: cannot find GDAL/OGR modules')
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.compute
+except ImportError:
+    pyarrow = None
+
+reportFileName = 'verify_report.jsonl'
+
+# rows read from a layer or DBF at a time
+verifyBatchSize = 65536
+
+# extents must agree to within this many degrees, or to the sample spacing of
+# the tile's LOD (in longitude and in latitude) when the geometries were
+# quantized or simplified
+extentTolerance = 1e-9
+
+# the name the geometry column is hashed under on both sides
+geometryKey = '<geometry>'
+
+verifyCounters = ('features', 'rows', 'tables', 'hashedTables', 'mismatches')
+
+def isHashSupported():
+    return numpy != None and arrowCopy.isArrowCopySupported()
+
+#Counters for one verified tile, with its mismatches in 'report'
+def createVerifyStats():
+    tileStats = {}
+    for counter in verifyCounters:
+        tileStats[counter] = 0
+    tileStats['report'] = []
+    return tileStats
+
+def addMismatch(tileStats, shpFilename, outputPath, tableName, check, expected=None, actual=None, columns=None):
+    mismatch = {}
+    mismatch['shapefile'] = shpFilename
+    mismatch['output'] = outputPath
+    mismatch['table'] = tableName
+    mismatch['check'] = check
+    mismatch['expected'] = expected
+    mismatch['actual'] = actual
+    if(columns != None):
+        mismatch['columns'] = columns
+    tileStats['report'].append(mismatch)
+    tileStats['mismatches'] += 1
+
+# A streaming hash of a table. Each column has three hashes, of its null mask,
+# its value lengths and its value bytes, each fed a whole batch at a time, so
+# the digests only depend on the values and their order, not on the batching.
+def createTableHash(columnNames):
+    tableHash = {}
+    tableHash['rows'] = 0
+    tableHash['columns'] = {}
+    for columnName in columnNames:
+        tableHash['columns'][columnName] = (hashlib.blake2b(digest_size=16), hashlib.blake2b(digest_size=16), hashlib.blake2b(digest_size=16))
+    return tableHash
+
+def isNumericType(arrowType):
+    return (pyarrow.types.is_integer(arrowType) or pyarrow.types.is_floating(arrowType) or
+        pyarrow.types.is_boolean(arrowType) or pyarrow.types.is_decimal(arrowType))
+
+def addColumnToHash(tableHash, columnName, column):
+    nullHash, lengthHash, valueHash = tableHash['columns'][columnName]
+    if(isinstance(column, pyarrow.ChunkedArray)):
+        column = column.combine_chunks()
+    nullHash.update(column.is_null().to_numpy(zero_copy_only=False).tobytes())
+    if(isNumericType(column.type)):
+        values = pyarrow.compute.fill_null(column.cast(pyarrow.float64()), 0.0)
+        valueHash.update(values.to_numpy(zero_copy_only=False).tobytes())
+        return
+    if(not (pyarrow.types.is_binary(column.type) or pyarrow.types.is_large_binary(column.type))):
+        column = column.cast(pyarrow.string())
+    column = pyarrow.compute.fill_null(column.cast(pyarrow.large_binary()), pyarrow.scalar(b'', pyarrow.large_binary()))
+    lengthHash.update(pyarrow.compute.binary_length(column).to_numpy(zero_copy_only=False).astype(numpy.int64).tobytes())
+    if(len(column) == 0):
+        return
+    # the values of a binary array sit end to end in its data buffer
+    offsets = numpy.frombuffer(column.buffers()[1], dtype=numpy.int64)[column.offset:column.offset + len(column) + 1]
+    if(offsets[-1] > offsets[0]):
+        valueHash.update(memoryview(column.buffers()[2])[offsets[0]:offsets[-1]])
+
+def addBatchToHash(tableHash, columnNames, columns):
+    for columnName, column in zip(columnNames, columns):
+        addColumnToHash(tableHash, columnName, column)
+    if(len(columns) > 0):
+        tableHash['rows'] += len(columns[0])
+
+def getColumnDigest(tableHash, columnName):
+    return "".join([columnHash.hexdigest() for columnHash in tableHash['columns'][columnName]])
+
+# The columns of expectedHash whose values differ in actualHash
+def getDifferentColumns(expectedHash, actualHash):
+    columns = []
+    for columnName in sorted(expectedHash['columns'].keys()):
+        if(columnName in actualHash['columns'] and getColumnDigest(expectedHash, columnName) != getColumnDigest(actualHash, columnName)):
+            columns.append(columnName)
+    return columns
+
+# The column names of a GDAL Arrow stream, with the geometry as geometryKey
+def getStreamColumnNames(schema):
+    columnNames = list(schema.names)
+    geometryIndex = arrowCopy.getGeometryColumnIndex(schema)
+    if(geometryIndex >= 0):
+        columnNames[geometryIndex] = geometryKey
+    return columnNames
+
+def getLayerStream(layer):
+    return layer.GetArrowStreamAsPyArrow(["INCLUDE_FID=NO", "MAX_FEATURES_IN_BATCH=" + str(verifyBatchSize)])
+
+# Hash the features of a shapefile as they were written to the GeoPackage:
+# the feature class fields that outputLayerDefinition has are joined on CNAM
+# (see arrowCopy.copyFeaturesWithArrow) and, under the skip policy, features
+# without a feature class record are left out. The geometry is only hashed if
+# hashGeometry is set. Returns the hash and the number of features whose CNAM
+# isn't in the feature class table.
+def hashShapeFile(layer, fClassTable, outputLayerDefinition, missingCNAMPolicy, hashGeometry=True):
+    stream = getLayerStream(layer)
+    inputSchema = stream.schema
+    columnNames = getStreamColumnNames(inputSchema)
+
+    outputFieldNames = set()
+    for i in range(outputLayerDefinition.GetFieldCount()):
+        outputFieldNames.add(outputLayerDefinition.GetFieldDefn(i).GetName())
+    joinFieldNames = []
+    cnamIndex = inputSchema.get_field_index('CNAM')
+    if(cnamIndex >= 0 and len(fClassTable['rows']) > 0):
+        for fieldName in fClassTable['columns']:
+            if(fieldName in outputFieldNames and inputSchema.get_field_index(fieldName) < 0 and fieldName not in joinFieldNames):
+                joinFieldNames.append(fieldName)
+    if(len(joinFieldNames) > 0):
+        joinFieldDefns = [outputLayerDefinition.GetFieldDefn(outputLayerDefinition.GetFieldIndex(fieldName)) for fieldName in joinFieldNames]
+        cnamKeys, fieldArrays = arrowCopy.getFeatureClassArrays(fClassTable, joinFieldNames, inputSchema.field(cnamIndex).type, joinFieldDefns)
+
+    hashColumns = [columnNum for columnNum, columnName in enumerate(columnNames) if hashGeometry or columnName != geometryKey]
+    tableHash = createTableHash([columnNames[columnNum] for columnNum in hashColumns] + joinFieldNames)
+    hashNames = list(tableHash['columns'].keys())
+    missingCount = 0
+    for batch in stream:
+        columns = [batch.column(columnNum) for columnNum in hashColumns]
+        if(len(joinFieldNames) > 0):
+            rowIndexes = pyarrow.compute.index_in(batch.column(cnamIndex), value_set=cnamKeys)
+            missingCount += rowIndexes.null_count
+            for fieldArray in fieldArrays:
+                columns.append(fieldArray.take(rowIndexes))
+            if(rowIndexes.null_count > 0 and missingCNAMPolicy == 'skip'):
+                keepRows = pyarrow.compute.is_valid(rowIndexes)
+                columns = [column.filter(keepRows) for column in columns]
+        addBatchToHash(tableHash, hashNames, columns)
+    return tableHash, missingCount
+
+# Hash the rows a query on a GeoPackage returns, with its geometry column, if
+# it has one, as geometryKey
+def hashQuery(dataSource, sql):
+    resultLayer = dataSource.ExecuteSQL(sql)
+    try:
+        stream = getLayerStream(resultLayer)
+        columnNames = getStreamColumnNames(stream.schema)
+        tableHash = createTableHash(columnNames)
+        for batch in stream:
+            addBatchToHash(tableHash, columnNames, batch.columns)
+    finally:
+        dataSource.ReleaseResultSet(resultLayer)
+    return tableHash
+
+# Hash the records of a DBF opened with archiveInput.openDBFArray, leaving out deleted ones
+def hashDBFArray(dbfArray):
+    fieldNames = [field.name for field in dbfArray['fields']]
+    tableHash = createTableHash(fieldNames)
+    for columns in dbfarray.iterateColumnBatches(dbfArray, verifyBatchSize):
+        arrays = []
+        for columnName, field in zip(dbfArray['columns'], dbfArray['fields']):
+            arrays.append(arrowCopy.getDBFColumnArray(columns[columnName], field, dbfArray['encoding']))
+        addBatchToHash(tableHash, fieldNames, arrays)
+    return tableHash
+
+# The WHERE clause that picks a tile's rows out of a consolidated layer or
+# table, given its provenance (see consolidate.getProvenance), or '' for none
+def getProvenanceClause(provenance):
+    if(provenance == None):
+        return ""
+    conditions = []
+    for columnName, value in provenance:
+        if(value == None):
+            conditions.append(optimizeGeoPackage.quoteIdentifier(columnName) + " IS NULL")
+        else:
+            conditions.append(optimizeGeoPackage.quoteIdentifier(columnName) + " = " + str(int(value)))
+    return " WHERE " + " AND ".join(conditions)
+
+def getSelectString(tableName, columnNames, whereClause, orderColumn):
+    return ("SELECT " + ", ".join([optimizeGeoPackage.quoteIdentifier(columnName) for columnName in columnNames]) +
+        " FROM " + optimizeGeoPackage.quoteIdentifier(tableName) + whereClause + " ORDER BY " + optimizeGeoPackage.quoteIdentifier(orderColumn))
+
+def getRowCount(sqliteCon, tableName, whereClause):
+    return sqliteCon.execute("SELECT COUNT(*) FROM " + optimizeGeoPackage.quoteIdentifier(tableName) + whereClause).fetchone()[0]
+
+def getGeometryColumn(sqliteCon, tableName):
+    row = sqliteCon.execute("SELECT column_name FROM gpkg_geometry_columns WHERE table_name = ?", (tableName,)).fetchone()
+    if(row == None):
+        return None
+    return row[0]
+
+def getPrimaryKeyColumn(sqliteCon, tableName):
+    for row in sqliteCon.execute("PRAGMA table_info(" + optimizeGeoPackage.quoteIdentifier(tableName) + ")"):
+        if(row[5] == 1):
+            return row[1]
+    return None
+
+# (minX, maxX, minY, maxY) of the geometries the clause picks, in the order
+# ogr.Layer.GetExtent returns them, or None if there are none
+def getOutputExtent(dataSource, tableName, geometryColumn, whereClause):
+    geometry = optimizeGeoPackage.quoteIdentifier(geometryColumn)
+    resultLayer = dataSource.ExecuteSQL("SELECT MIN(ST_MinX(" + geometry + ")), MAX(ST_MaxX(" + geometry + ")), MIN(ST_MinY(" + geometry + ")), MAX(ST_MaxY(" + geometry + ")) FROM " +
+        optimizeGeoPackage.quoteIdentifier(tableName) + whereClause)
+    try:
+        feature = resultLayer.GetNextFeature()
+        extent = tuple([feature.GetField(i) for i in range(4)])
+    finally:
+        dataSource.ReleaseResultSet(resultLayer)
+    if(None in extent):
+        return None
+    return extent
+
+# The (x, y) tolerance for the extent of a tile
+def getExtentTolerance(shpFilename, options):
+    if((options['quantize'] or options['simplify']) and consolidate.isCDBTileName(shpFilename)):
+        lod = tileSubset.parseLOD(converter.getFilenameComponents(shpFilename)['lod'])
+        if(lod != None):
+            return geometryTransform.getLODSpacing(lod, tileSubset.getTileLatitude(shpFilename))
+    return extentTolerance, extentTolerance
+
+def extentsMatch(expected, actual, tolerance):
+    xTolerance, yTolerance = tolerance
+    for expectedValue, actualValue, valueTolerance in zip(expected, actual, (xTolerance, xTolerance, yTolerance, yTolerance)):
+        if(abs(expectedValue - actualValue) > valueTolerance):
+            return False
+    return True
+
+def verifyFeatures(tileStats, shpFilename, outputPath, dataSource, sqliteCon, tableName, provenance, options):
+    tileStats['tables'] += 1
+    outLayer = dataSource.GetLayerByName(tableName)
+    if(outLayer == None):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'missingTable')
+        return
+    inDataSource = ogr.Open(shpFilename)
+    if(inDataSource == None):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'error', actual="Unable to open " + shpFilename)
+        return
+    layer = inDataSource.GetLayer(0)
+    sourceCount = layer.GetFeatureCount()
+    tileStats['features'] += sourceCount
+    whereClause = getProvenanceClause(provenance)
+    outputCount = getRowCount(sqliteCon, tableName, whereClause)
+    geometryColumn = getGeometryColumn(sqliteCon, tableName)
+    # quantized or simplified geometries are only checked by their extent
+    hashGeometry = not (options['quantize'] or options['simplify'])
+
+    sourceHash = None
+    expectedCount = sourceCount
+    missingCount = 0
+    if(isHashSupported()):
+        fClassTable = recordCache.createFeatureClassTable()
+        dbfFCFilename = converter.getFeatureClassAttrFileName(shpFilename)
+        if(layer.GetLayerDefn().GetFieldIndex('CNAM') >= 0 and archiveInput.isFile(dbfFCFilename)):
+            fClassTable, cached = recordCache.getFeatureClassTable(dbfFCFilename, options['recordCacheBytes'])
+        sourceHash, missingCount = hashShapeFile(layer, fClassTable, outLayer.GetLayerDefn(), options['missingCNAMPolicy'], hashGeometry)
+        expectedCount = sourceHash['rows']
+
+    if(sourceHash == None and options['missingCNAMPolicy'] == 'skip'):
+        # without the join there's no telling how many features were left out
+        countMatches = (outputCount <= sourceCount)
+    else:
+        countMatches = (outputCount == expectedCount)
+    if(not countMatches):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'count', expectedCount, outputCount)
+
+    # the shapefile's extent includes any features that were left out
+    if(geometryColumn != None and outputCount == sourceCount and sourceCount > 0):
+        sourceExtent = layer.GetExtent()
+        outputExtent = getOutputExtent(dataSource, tableName, geometryColumn, whereClause)
+        if(outputExtent == None or not extentsMatch(sourceExtent, outputExtent, getExtentTolerance(shpFilename, options))):
+            addMismatch(tileStats, shpFilename, outputPath, tableName, 'extent', list(sourceExtent), outputExtent and list(outputExtent))
+
+    if(sourceHash == None):
+        return
+    outputColumns = optimizeGeoPackage.getColumnNames(sqliteCon, tableName)
+    columnNames = [columnName for columnName in sourceHash['columns'].keys() if columnName != geometryKey]
+    missingColumns = [columnName for columnName in columnNames if columnName not in outputColumns]
+    if(len(missingColumns) > 0):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'missingColumns', columns=missingColumns)
+    selectColumns = [columnName for columnName in columnNames if columnName in outputColumns]
+    if(hashGeometry and geometryColumn != None):
+        selectColumns = [geometryColumn] + selectColumns
+    if(len(selectColumns) == 0):
+        return
+    outputHash = hashQuery(dataSource, getSelectString(tableName, selectColumns, whereClause, getPrimaryKeyColumn(sqliteCon, tableName)))
+    compareHashes(tileStats, shpFilename, outputPath, tableName, sourceHash, outputHash)
+
+def compareHashes(tileStats, shpFilename, outputPath, tableName, expectedHash, actualHash):
+    tileStats['hashedTables'] += 1
+    differentColumns = getDifferentColumns(expectedHash, actualHash)
+    if(len(differentColumns) > 0):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'hash', expectedHash['rows'], actualHash['rows'], differentColumns)
+
+# Check an extended attribute or relationship table against its DBF
+def verifyTable(tileStats, shpFilename, outputPath, dataSource, sqliteCon, tableName, dbfFilename, provenance):
+    tileStats['tables'] += 1
+    outputColumns = optimizeGeoPackage.getColumnNames(sqliteCon, tableName)
+    if(len(outputColumns) == 0):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'missingTable')
+        return
+    whereClause = getProvenanceClause(provenance)
+    outputCount = getRowCount(sqliteCon, tableName, whereClause)
+
+    dbfArray = None
+    if(isHashSupported()):
+        dbfArray = archiveInput.openDBFArray(dbfFilename)
+        if(not dbfarray.canDecode(dbfArray)):
+            dbfArray = None
+    if(dbfArray == None):
+        # deleted records are in the header count, so this may be off by those
+        expectedCount = converter.getDBFRecordCount(dbfFilename)
+        tileStats['rows'] += expectedCount
+        if(outputCount != expectedCount):
+            addMismatch(tileStats, shpFilename, outputPath, tableName, 'count', expectedCount, outputCount)
+        return
+
+    sourceHash = hashDBFArray(dbfArray)
+    tileStats['rows'] += sourceHash['rows']
+    if(outputCount != sourceHash['rows']):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'count', sourceHash['rows'], outputCount)
+    columnNames = list(sourceHash['columns'].keys())
+    missingColumns = [columnName for columnName in columnNames if columnName not in outputColumns]
+    if(len(missingColumns) > 0):
+        addMismatch(tileStats, shpFilename, outputPath, tableName, 'missingColumns', columns=missingColumns)
+    selectColumns = [columnName for columnName in columnNames if columnName in outputColumns]
+    if(len(selectColumns) == 0):
+        return
+    outputHash = hashQuery(dataSource, getSelectString(tableName, selectColumns, whereClause, 'ID'))
+    compareHashes(tileStats, shpFilename, outputPath, tableName, sourceHash, outputHash)
+
+# A DBF writeDBFTable would make a table from
+def hasDBFRows(dbfFilename):
+    if(dbfFilename == None or not archiveInput.isFile(dbfFilename)):
+        return False
+    return archiveInput.getFileSize(dbfFilename) != 0 and converter.getDBFRecordCount(dbfFilename) > 0
+
+# The name of a tile's layer or table, in consolidateMode if it isn't None.
+# selector2 is as in consolidate.getConsolidatedName.
+def getTableName(filename, shpFilename, consolidateMode, selector2=None):
+    if(consolidateMode == None):
+        return converter.getFeatureAttrTableName(filename)
+    return consolidate.getConsolidatedName(shpFilename, consolidateMode, selector2)
+
+# What a tile was converted into, as (kind, table name, DBF filename) with
+# kind one of features, extendedAttributes or relationships
+def getExpectedTables(shpFilename, consolidateMode):
+    tables = []
+    if(converter.getSelector2(shpFilename) == "T011"):
+        dbfFilename = shpFilename[0:-3] + "dbf"
+        if(hasDBFRows(dbfFilename)):
+            tables.append(('relationships', getTableName(dbfFilename, shpFilename, consolidateMode), dbfFilename))
+        return tables
+    dbfFCFilename = converter.getFeatureClassAttrFileName(shpFilename)
+    dbfEAFilename = converter.getExtendedAttrFileName(shpFilename)
+    if(dbfFCFilename == None or shpFilename in (dbfFCFilename, dbfEAFilename)):
+        return tables
+    tables.append(('features', getTableName(shpFilename, shpFilename, consolidateMode), None))
+    if(hasDBFRows(dbfEAFilename)):
+        tables.append(('extendedAttributes', getTableName(dbfEAFilename, shpFilename, consolidateMode, converter.getSelector2(dbfEAFilename)), dbfEAFilename))
+    return tables
+
+#The worker function verifyCDB runs for each tile; options are the ones the
+#CDB was converted with. Returns the counters for the tile (see createVerifyStats)
+def verifyTile(shpFilename, cdbInputDir, cdbOutputDir, options):
+    tileStats = createVerifyStats()
+    consolidateMode = options['consolidate']
+    if(consolidateMode != None and not consolidate.isCDBTileName(shpFilename)):
+        consolidateMode = None
+    provenance = None
+    if(consolidateMode == None):
+        outputPath = converter.getOutputGeoPackageFilePath(shpFilename, cdbInputDir, cdbOutputDir)
+    else:
+        outputPath = consolidate.getConsolidatedGeoPackageFilePath(shpFilename, cdbOutputDir, consolidateMode)
+        provenance = consolidate.getProvenance(shpFilename)
+
+    tables = getExpectedTables(shpFilename, consolidateMode)
+    if(len(tables) == 0):
+        return tileStats
+    if(not os.path.isfile(outputPath)):
+        addMismatch(tileStats, shpFilename, outputPath, None, 'missingOutput')
+        return tileStats
+    dataSource = ogr.Open(outputPath)
+    if(dataSource == None):
+        addMismatch(tileStats, shpFilename, outputPath, None, 'error', actual="Unable to open " + outputPath)
+        return tileStats
+    sqliteCon = sqlite3.connect(outputPath)
+    try:
+        for kind, tableName, dbfFilename in tables:
+            if(kind == 'features'):
+                verifyFeatures(tileStats, shpFilename, outputPath, dataSource, sqliteCon, tableName, provenance, options)
+            else:
+                verifyTable(tileStats, shpFilename, outputPath, dataSource, sqliteCon, tableName, dbfFilename, provenance)
+    finally:
+        sqliteCon.close()
+        dataSource = None
+    return tileStats
+
+#The resultCallback for parallelConvert.runConversionJobs that writes the
+#mismatches of each tile, and the tiles that couldn't be verified, to reportFile
+def writeReport(reportFile, results):
+    for result in results:
+        if(result['status'] != 'ok'):
+            mismatch = {'shapefile': result['shapefile'], 'output': None, 'table': None, 'check': 'error',
+                'expected': None, 'actual': result['error']}
+            reportFile.write(json.dumps(mismatch) + "\n")
+        for mismatch in result.get('report', []):
+            reportFile.write(json.dumps(mismatch) + "\n")
+    reportFile.flush()
+
+def printVerifySummary(summary, reportFilename):
+    counters = summary['counters']
+    elapsed = summary['elapsed']
+    print("Verification Summary")
+    print("  Shapefiles: " + str(summary['files']))
+    print("  Features: " + str(summary['features']))
+    print("  Attribute Rows: " + str(counters.get('rows', 0)))
+    print("  Tables: " + str(counters.get('tables', 0)) + " (" + str(counters.get('hashedTables', 0)) + " hashed)")
+    print("  Failed: " + str(summary['failed']))
+    print("  Mismatches: " + str(counters.get('mismatches', 0)))
+    print("  Elapsed Seconds: {:.1f}".format(elapsed))
+    if(elapsed > 0):
+        print("  Shapefiles/sec: {:.1f}".format(summary['files'] / elapsed))
+    if(counters.get('mismatches', 0) > 0 or summary['failed'] > 0):
+        print("  Report: " + reportFilename)
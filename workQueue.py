@@ -0,0 +1,207 @@
+'''
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to use,
+copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the
+Software, and to permit persons to whom the Software is furnished to do so, subject
+to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+
+# A work queue for converting one CDB on many hosts. The coordinator writes the
+# output groups (see parallelConvert.groupShapeFilesByOutput) into a SQLite
+# file on storage every host can reach, along with the settings of the run.
+# Workers claim a few groups at a time by taking a lease on them, renew their
+# leases while they make progress, and record the result of each group. A lease
+# that runs out (the worker crashed, hung or lost the storage) makes its group
+# claimable again, up to maxAttempts times. A worker that is alive but hasn't
+# finished a tile in stallSeconds stops renewing, so a hung conversion doesn't
+# keep its groups forever.
+#
+# Every claim is a single BEGIN IMMEDIATE transaction, so two workers never get
+# the same group. The database uses a rollback journal rather than WAL, which
+# needs shared memory that network file systems don't provide.
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+queueFileName = 'work_queue.sqlite'
+
+defaultLeaseSeconds = 300
+defaultBatchSize = 4
+defaultMaxAttempts = 3
+defaultStallSeconds = 3600
+
+def getQueuePath(cdbOutputDir):
+    return os.path.join(cdbOutputDir, queueFileName)
+
+def getWorkerName():
+    return socket.gethostname() + ":" + str(os.getpid())
+
+def openWorkQueue(queueFilename):
+    # a long timeout: with many workers the lock is often briefly held
+    queueCon = sqlite3.connect(queueFilename, timeout=120, isolation_level=None)
+    queueCon.execute("PRAGMA journal_mode=DELETE")
+    queueCon.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)")
+    queueCon.execute("CREATE TABLE IF NOT EXISTS work ("
+        "id INTEGER PRIMARY KEY, "
+        "output TEXT, "
+        "shapefiles TEXT, "
+        "status TEXT, "
+        "worker TEXT, "
+        "lease_expires REAL, "
+        "attempts INTEGER, "
+        "features INTEGER, "
+        "error TEXT, "
+        "updated REAL)")
+    queueCon.execute("CREATE INDEX IF NOT EXISTS work_status ON work (status, id)")
+    return queueCon
+
+# Create the queue, replacing any previous one. settings is a dictionary of
+# JSON values handed to every worker; groups yields (output path, shapefiles).
+# Returns the number of groups queued.
+def createWorkQueue(queueFilename, settings, groups):
+    for suffix in ('', '-journal'):
+        if(os.path.exists(queueFilename + suffix)):
+            os.remove(queueFilename + suffix)
+    queueCon = openWorkQueue(queueFilename)
+    queueCon.execute("BEGIN IMMEDIATE")
+    for name, value in settings.items():
+        queueCon.execute("INSERT INTO settings (name, value) VALUES (?,?)", (name, json.dumps(value)))
+    groupCount = 0
+    for outputPath, shapeFiles in groups:
+        queueCon.execute("INSERT INTO work (output, shapefiles, status, attempts, features, updated) VALUES (?,?,'pending',0,0,?)",
+            (outputPath, json.dumps(shapeFiles), time.time()))
+        groupCount += 1
+    queueCon.execute("COMMIT")
+    queueCon.close()
+    return groupCount
+
+def getSettings(queueCon):
+    settings = {}
+    for name, value in queueCon.execute("SELECT name, value FROM settings"):
+        settings[name] = json.loads(value)
+    return settings
+
+# Lease up to batchSize groups to workerName, taking back expired leases first.
+# Returns a list of (id, output path, shapefiles); empty when nothing is left.
+def claimWork(queueCon, workerName, batchSize=defaultBatchSize, leaseSeconds=defaultLeaseSeconds, maxAttempts=defaultMaxAttempts):
+    now = time.time()
+    queueCon.execute("BEGIN IMMEDIATE")
+    try:
+        queueCon.execute("UPDATE work SET status='failed', error='lease expired ' || attempts || ' times', updated=? "
+            "WHERE status='leased' AND lease_expires < ? AND attempts >= ?", (now, now, maxAttempts))
+        rows = queueCon.execute("SELECT id, output, shapefiles FROM work "
+            "WHERE status='pending' OR (status='leased' AND lease_expires < ?) ORDER BY id LIMIT ?", (now, batchSize)).fetchall()
+        for row in rows:
+            queueCon.execute("UPDATE work SET status='leased', worker=?, lease_expires=?, attempts=attempts + 1, updated=? WHERE id=?",
+                (workerName, now + leaseSeconds, now, row[0]))
+        queueCon.execute("COMMIT")
+    except:
+        queueCon.execute("ROLLBACK")
+        raise
+    return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+def renewLeases(queueCon, workerName, workIds, leaseSeconds=defaultLeaseSeconds):
+    now = time.time()
+    for workId in workIds:
+        queueCon.execute("UPDATE work SET lease_expires=? WHERE id=? AND worker=? AND status='leased'",
+            (now + leaseSeconds, workId, workerName))
+
+# Record the results (see parallelConvert.convertGroup) of a group. Ignored if
+# the lease was lost and the group has gone to another worker.
+def completeWork(queueCon, workerName, workId, results):
+    status = 'done'
+    features = 0
+    errors = []
+    for result in results:
+        features += result['features']
+        if(result['status'] != 'ok'):
+            status = 'failed'
+            errors.append(result['shapefile'] + "\n" + result.get('error', ''))
+    queueCon.execute("UPDATE work SET status=?, features=?, error=?, lease_expires=NULL, updated=? WHERE id=? AND worker=? AND status='leased'",
+        (status, features, "\n".join(errors) or None, time.time(), workId, workerName))
+
+# Whether workerName still holds an unexpired lease on workId. Once a lease has
+# run out another worker may have claimed the group, so the worker must not
+# write its output any more.
+def holdsLease(queueCon, workerName, workId):
+    row = queueCon.execute("SELECT 1 FROM work WHERE id=? AND worker=? AND status='leased' AND lease_expires >= ?",
+        (workId, workerName, time.time())).fetchone()
+    return row != None
+
+# Hand unfinished groups back, e.g. when a worker is stopped
+def releaseWork(queueCon, workerName, workIds):
+    for workId in workIds:
+        queueCon.execute("UPDATE work SET status='pending', worker=NULL, lease_expires=NULL, attempts=attempts - 1, updated=? "
+            "WHERE id=? AND worker=? AND status='leased'", (time.time(), workId, workerName))
+
+# Number of groups and features by status
+def getQueueStatus(queueCon):
+    queueStatus = {}
+    for status, groupCount, features in queueCon.execute("SELECT status, COUNT(*), SUM(features) FROM work GROUP BY status"):
+        queueStatus[status] = (groupCount, features or 0)
+    return queueStatus
+
+# Renew the leases held by a worker on a thread of its own, so a long group
+# doesn't lose its lease. workIds is shared with the worker: it adds the groups
+# it claims and removes the ones it finishes. The worker calls recordProgress
+# as it goes; once it hasn't for stallSeconds the leases are left to run out.
+def startLeaseKeeper(queueFilename, workerName, leaseSeconds=defaultLeaseSeconds, stallSeconds=defaultStallSeconds):
+    leaseKeeper = {}
+    leaseKeeper['workIds'] = set()
+    leaseKeeper['lock'] = threading.Lock()
+    leaseKeeper['stop'] = threading.Event()
+    leaseKeeper['progress'] = time.time()
+
+    def renew():
+        queueCon = openWorkQueue(queueFilename)
+        stalled = False
+        while(not leaseKeeper['stop'].wait(leaseSeconds / 3.0)):
+            with leaseKeeper['lock']:
+                workIds = list(leaseKeeper['workIds'])
+                idleSeconds = time.time() - leaseKeeper['progress']
+            if(idleSeconds >= stallSeconds):
+                if(not stalled and len(workIds) > 0):
+                    print("No progress for " + str(int(idleSeconds)) + " seconds, letting the leases on " + str(len(workIds)) + " groups run out")
+                stalled = True
+                continue
+            stalled = False
+            try:
+                renewLeases(queueCon, workerName, workIds, leaseSeconds)
+            except sqlite3.Error as e:
+                print("Unable to renew leases: " + str(e))
+        queueCon.close()
+
+    leaseKeeper['thread'] = threading.Thread(target=renew)
+    leaseKeeper['thread'].daemon = True
+    leaseKeeper['thread'].start()
+    return leaseKeeper
+
+# Called by the worker each time it finishes a tile or claims more work
+def recordProgress(leaseKeeper):
+    with leaseKeeper['lock']:
+        leaseKeeper['progress'] = time.time()
+
+def stopLeaseKeeper(leaseKeeper):
+    leaseKeeper['stop'].set()
+    leaseKeeper['thread'].join()
+
+def printQueueStatus(queueStatus):
+    print("Work Queue")
+    for status in ('pending', 'leased', 'done', 'failed'):
+        groupCount, features = queueStatus.get(status, (0, 0))
+        print("  " + status + ": " + str(groupCount) + " groups, " + str(features) + " features")